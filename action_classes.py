@@ -29,6 +29,8 @@ from abc import ABC, abstractmethod
 
 from dataclasses import dataclass
 
+from typing import NamedTuple
+
 import random
 
 @dataclass
@@ -76,6 +78,59 @@ class Noun:
 
 
 
+# Order of the thematic role fields on Verb, and of the aspect/mood flags in set_aspect_mood.
+# Event frames and aspect flag integers use these orders.
+ROLES = ('agent', 'patient', 'undergoer', 'experiencer', 'instrument', 'location', 'manner', 'purpose', 'cause')
+ASPECTS = ('perfective', 'causative', 'passive', 'potential', 'volitional', 'conditional', 'imperative')
+
+def aspect_flags(aspect)->int:
+    # Aspect/mood -> 7-bit integer, bit i set for ASPECTS[i]. Takes the flags themselves or an old-style dict.
+    if isinstance(aspect, int):
+        return aspect
+    flags = 0
+    for bit, name in enumerate(ASPECTS):
+        if aspect and aspect.get(name):
+            flags |= 1 << bit
+    return flags
+
+def aspect_mood(flags: int)->dict:
+    # The flags spelled out, for reading
+    return {name: bool(flags >> bit & 1) for bit, name in enumerate(ASPECTS)}
+
+
+class Event(NamedTuple):
+    """
+    Compact record of one verb event: the verb's lexeme id, aspect/mood flags (see ASPECTS), and
+    the id of the entity in each thematic role, -1 when the role is empty. Every field is an int,
+    so a battle can keep millions of these instead of Verb objects holding Nouns and dicts.
+
+    Role ids are entity ids, not words: Noun ids from Verb.event(), EntityStore rows from
+    world_updater, spell_engine and event_log. frame() maps them to the lexemes that name them.
+    """
+    verb: int
+    flags: int = 0
+    agent: int = -1
+    patient: int = -1
+    undergoer: int = -1
+    experiencer: int = -1
+    instrument: int = -1
+    location: int = -1
+    manner: int = -1
+    purpose: int = -1
+    cause: int = -1
+
+    @property
+    def roles(self)->tuple:
+        return self[2:]
+
+    def frame(self, lexemes)->tuple:
+        """
+        (verb id, aspect flags, role lexeme ids), what wizard_realizer renders. lexemes maps each
+        entity id to the lexeme id naming it, a dict or anything indexable (store['id'] for store rows).
+        """
+        return (self.verb, self.flags, tuple(-1 if entity < 0 else int(lexemes[entity]) for entity in self[2:]))
+
+
 @dataclass
 class Verb:
     # Thematic roles are the frame of the verb.
@@ -93,25 +148,24 @@ class Verb:
     purpose: Noun
     cause: Noun
     pronunciation: dict
-    aspect: dict
+    aspect: int # aspect/mood bit flags in ASPECTS order, see aspect_mood() to read them
         
     def set_aspect_mood(self,
-                        perfective: bool, 
-                        causative: bool,
-                        passive: bool,
-                        potential: bool,
-                        volitional: bool,
-                        conditional: bool,
-                        imperative: bool):
-        speck = {}
-        speck['perfective'] = perfective
-        speck['causative'] = causative
-        speck['passive'] = passive
-        speck['potential'] = potential
-        speck['volitional'] = volitional
-        speck['conditional'] = conditional
-        speck['imperative'] = imperative
-        self.aspect = speck
+                        perfective: bool = False, 
+                        causative: bool = False,
+                        passive: bool = False,
+                        potential: bool = False,
+                        volitional: bool = False,
+                        conditional: bool = False,
+                        imperative: bool = False)->int:
+        # Packed into one int instead of a new dict per call
+        self.aspect = (perfective
+                       | causative << 1
+                       | passive << 2
+                       | potential << 3
+                       | volitional << 4
+                       | conditional << 5
+                       | imperative << 6)
         return self.aspect
         
     def do(self):
@@ -125,68 +179,85 @@ class Verb:
             lex['class'] = 'verb'
             return lex
         # consume action
-        lex = create_lexeme()
+        lex = create_lexeme(self)
         print("Used word: ", lex['en'], "(", lex['jp'], " , ", lex['wz'], ")", lex['class'], lex['id'])
         print(lex)
-        # Run internal method when using do()
-        self.set_aspect_mood()
         return lex
 
-        
-        
+    def event(self)->Event:
+        # Compact record of this verb, with each role as its Noun's id
+        roles = [getattr(self, role) for role in ROLES]
+        return Event(self.id, aspect_flags(self.aspect), *(-1 if noun is None else noun.id for noun in roles))
+
+    def frame(self)->tuple:
+        # (verb id, aspect flags, role lexeme ids) for the realizer, -1 for an empty role.
+        # A Noun's id is its lexeme id, so the event's roles are already words here.
+        return (self.id, aspect_flags(self.aspect), self.event().roles)
+
+
+def benchmark_event_memory(count=100000)->dict:
+    """Bytes per event held as Verb objects against Event records."""
+    import sys
+    import tracemalloc
+
+    thing = Noun('thing', 0, 1.0, 0.0, 0.0, True, {})
+    people = [Noun(f'wizard{i}', 1000 + i, 1.0, 0.0, 1.0, True, {}) for i in range(1000)]
+    pronunciation = {'en': 'do', 'jp': 'suru', 'wz': 'pekang'}
+
+    tracemalloc.start()
+    verbs = []
+    for i in range(count):
+        verb = Verb('do', 1, 1.0, 0.0, people[i % 1000], thing, people[(i * 7) % 1000],
+                    None, None, None, None, None, None, dict(pronunciation), {})
+        # The old set_aspect_mood built a dict for every event
+        verb.aspect = {name: bool(i >> bit & 1) for bit, name in enumerate(ASPECTS)}
+        verbs.append(verb)
+    verb_bytes = tracemalloc.get_traced_memory()[0] / count
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    events = [Event(1, aspect_flags(v.aspect), v.agent.id, v.patient.id, v.undergoer.id) for v in verbs]
+    event_bytes = tracemalloc.get_traced_memory()[0] / count
+    tracemalloc.stop()
+    assert events[5].roles[:3] == verbs[5].frame()[2][:3]
+    print(f"{count:,} events: Verb objects {verb_bytes:.0f} bytes each, Event records {event_bytes:.0f} bytes each",
+          f"({sys.getsizeof(events[0])} for the tuple itself)")
+    return {'verb_bytes': verb_bytes, 'event_bytes': event_bytes}
+
+
+# Particle table for case tagging: particle -> (case, category of the phrase it closes)
+CASES = ('neutral', 'topic', 'locative', 'subject', 'object', 'possessive', 'conjunct')
+CATEGORIES = ('noun', 'verb', 'particle', 'modifier')
+
+PARTICLE_CASES = {
+    'w4': ('topic', 'noun'), # verbal topics are arguably zero-derivation nominalizing for real, unlike "Verb の" or "Verb か"
+    'w0': ('object', 'noun'),
+    'g4': ('subject', 'noun'),
+    'n1': ('locative', 'modifier'), # here modifier is a concept including locative expressions, adverbs, and adjectives
+    'd3': ('locative', 'modifier'),
+    'h3': ('locative', 'modifier'),
+    'm0': ('conjunct', 'modifier'), # using 'q4' for nominal 'or [interogative]', and 'k4' for verbal question formation, todo: eventual verbal 'n3' if certainty < 0.5
+    'y4': ('conjunct', 'modifier'),
+    't0': ('conjunct', 'modifier'),
+    'n3': ('conjunct', 'modifier'),
+    'q4': ('conjunct', 'modifier'),
+    't3': ('conjunct', 'verb'), # replaces the -(t)te conjunct suffix
+    'n0': ('possessive', 'modifier'),
+    'k4': ('neutral', 'verb'), # か is still used with nouns in Japanese but for Battle Wizard world modeling statements on a computer maybe it can be verbs only
+}
+
+
 @dataclass
 class Syntagm:
     category: str
     case: str
     def set_case(self, phrase):
-        particles = ['w4', 'g4', 'w0', 'n0', 'n1', 'n3', 'q4', 'd3', 'h3', 'y4', 'm0', 't0', 'y4', 'k4']
-        cases = ['neutral', 'topic', 'locative', 'subject', 'object', 'possessive', 'conjunct']
-        categories = ['noun', 'verb', 'particle', 'modifier']
-        words = phrase.split(' ')
-        last_word = words[-1:]
-        if last_word in particles:
-            if last_word == 'w4':
-                self.case = 'topic'
-                self.category = 'noun' # verbal topics are arguably zero-derivation nominalizing for real, unlike "Verb の" or "Verb か" 
-            elif last_word == 'w0':
-                self.case = 'object'
-                self.category = 'noun'
-            elif last_word in ['n1', 'd3', 'h3']:
-                self.case = 'locative'
-                self.category = 'modifier' # here modifier is a concept including locative expressions, adverbs, and adjectives
-            elif last_word == "g4":
-                self.case = 'subject'
-                self.category = 'noun'
-            elif last_word in ['m0' 'y4', 't0', 'n3', 'q4']: # using 'q4' for nominal 'or [interogative]', and 'k4' for verbal question formation, todo: eventual verbal 'n3' if certainty < 0.5
-                self.case = 'conjunct'
-                self.category = 'modifier'
-            elif last_word == 'n0':
-                self.case = 'possessive'
-                self.category = 'modifier'
-            elif last_word == 'k4':
-                self.case = 'neutral'
-                self.category = 'verb' # か is still used with nouns in Japanese but for Battle Wizard world modeling statements on a computer maybe it can be verbs only
-        else:
-            self.case = 'neutral'
-            self.category = 'noun'
-        
-        return self.category, self.case
-
-
-class Syntagm(Noun):
-    def __init__(self, case: str):
-        self.category = 'noun'
-        self.case = case
+        # The phrase's last word decides its case; a phrase with no particle is a neutral noun
+        words = phrase.split() if isinstance(phrase, str) else phrase
+        last_word = words[-1] if words else None
+        self.case, self.category = PARTICLE_CASES.get(last_word, ('neutral', 'noun'))
         return self.category, self.case
 
-        
- 
-class Syntagm(Verb):
-    def __init__(self, case: str):
-        self.category = 'verb'
-        self.case = case # Verbs can be 'possessive' in Japanese, why would it switch word class to a noun just because that's more normal in Latin
-        return self.category, self.case
-    
 
 
 @dataclass
@@ -262,10 +333,10 @@ class Wizard(Person):
     
         
     def kill(self, action: "Verb", target: "Wizard")->"Wizard":
-        # need to write lexicon item generators that consume and genreate objects
-        global nouns, verbs
-        kill_action = verbs[action.name]
-        target = kill_action(target)
+        # The kill is the action verb with this wizard as agent and the target as patient.
+        # Battles with many wizards go through world_updater.Updater, which checks and applies kills in batches.
+        action.agent = self
+        action.patient = target
         target.alive = False
         target.health = 0.0
         return target
@@ -360,23 +431,28 @@ class Spell(Verb):
                  damage: float, 
                  reach: float, 
                  radius: float, 
-                 category: str, 
-                 attributes: list[str]):
-        self.name = name
+                 category: str,
+                 attributes: list[str],
+                 id: int = -1,
+                 certainty: float = 1.0,
+                 rudeness: float = 0.0,
+                 pronunciation: dict = None):
+        # A spell is a verb with no roles filled until it's cast
+        super().__init__(name, id, certainty, rudeness, *([None] * len(ROLES)), pronunciation or {}, 0)
         self.damage = damage
         self.reach = reach
         self.radius = radius
         self.category = category
         self.attributes = attributes
-    
+
     #@abstractmethod
-    def use(self):
-        print("Used spell ", self.name, self.id)
+    def use(self)->Event:
+        # Casting a batch of spells on the battlefield goes through spell_engine.SpellEngine
+        return self.event()
         
         
         
 # Let's try to define a Wizard named Ziploc 
-wizards = []
 def make_wizard():
     w = Wizard(name = "Ziploc",
                id = random.randint(0,1000),
@@ -400,11 +476,21 @@ def make_wizard():
                rank = 1,
                spells = ['zip', 'lock'])
     return w
-wizards.append(make_wizard())
-[print('Name: ', w.name, 'Spells: ', w.spells, 'Mortal?', w.mortal) for w in wizards]
 
 
 
 
 def get_nouns(vocab: list["Syntagm"])->list["Noun"]:
-    return [vocab[n.name] for n in nouns]
\ No newline at end of file
+    return [vocab[n.name] for n in nouns]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Ziploc the wizard, or --benchmark for Event record memory")
+    parser.add_argument('--benchmark', action='store_true', help="measure Event records against Verb objects")
+    if parser.parse_args().benchmark:
+        benchmark_event_memory()
+    else:
+        wizards = []
+        wizards.append(make_wizard())
+        [print('Name: ', w.name, 'Spells: ', w.spells, 'Mortal?', w.mortal) for w in wizards]
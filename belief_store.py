@@ -0,0 +1,317 @@
+"""
+Belief store for Battle Wizard Simulator
+
+Lying, miscommunication and identity confusion (README goals) all need each wizard to hold
+beliefs about the world that can differ from it. A dict of everything per wizard is
+wizards x entities x fields, 10k wizards would be about 6 * 10^8 entries. Most of what a wizard
+believes is just the truth, so only the differences are stored:
+
+* FactTable is the ground truth with version stamps. A fact is one field of one entity in an
+  entity_store.EntityStore (health, mana, alive, ...). advance() is called once per tick; it diffs
+  the store against the last snapshot and stamps what changed with the new version, keeping the
+  old value (copy-on-write: only changed facts are copied).
+* Each wizard has an epoch, the world version they last caught up with (by looking around).
+  Without anything else, a wizard believes the world as it was at their epoch.
+* A wizard's own beliefs that differ from that (a lie they were told, something they misheard,
+  or something they saw after their epoch) are deltas in one shared open-addressing hash table
+  of NumPy arrays, keyed by (believer, fact), with the version the belief was formed at. A delta
+  formed before the wizard's epoch has been superseded by what they have seen since and is
+  ignored, so catching up is O(1) and never has to touch the table.
+
+belief(a, b, 'health') is a hash probe plus a couple of array reads; beliefs() does the same for
+whole arrays of queries at once.
+"""
+
+import sys
+import time
+
+from bisect import bisect_right
+
+import numpy as np
+
+from entity_store import EntityStore
+
+FIELDS = ('health', 'mana', 'power', 'alive', 'conscious', 'visible')
+FIELD = {name: i for i, name in enumerate(FIELDS)}
+
+EMPTY = -1
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15) # Fibonacci hashing
+MASK64 = (1 << 64) - 1
+
+
+class FactTable:
+    def __init__(self, store: EntityStore):
+        self.store = store
+        self.version = 0
+        self.values = self._read()
+        self.changed_at = np.zeros(self.values.shape, dtype=np.uint32)
+        # The value before the latest change, for the usual case of a wizard one change behind
+        self.previous = self.values.copy()
+        self.previous_changed_at = np.zeros(self.values.shape, dtype=np.uint32)
+        self.history = {} # fact -> [(changed_at, value)] for values older than previous
+
+    def _read(self)->np.ndarray:
+        store = self.store
+        values = np.empty((len(store), len(FIELDS)), dtype=np.float32)
+        for i, name in enumerate(FIELDS):
+            values[:, i] = store[name]
+        return values
+
+    def fact(self, row, field: str):
+        return np.asarray(row) * len(FIELDS) + FIELD[field]
+
+    def advance(self)->int:
+        """Stamps every fact that changed in the store since the last call with a new version."""
+        self.version += 1
+        current = self._read()
+        if len(current) > len(self.values):
+            # New entities start out known at this version
+            grow = len(current) - len(self.values)
+            self.values = np.vstack((self.values, current[len(self.values):]))
+            self.previous = np.vstack((self.previous, current[-grow:]))
+            stamps = np.full((grow, len(FIELDS)), self.version, dtype=np.uint32)
+            self.changed_at = np.vstack((self.changed_at, stamps))
+            self.previous_changed_at = np.vstack((self.previous_changed_at, stamps))
+        changed = np.flatnonzero((current != self.values).ravel())
+        if len(changed):
+            values, previous = self.values.reshape(-1), self.previous.reshape(-1)
+            changed_at, previous_changed_at = self.changed_at.reshape(-1), self.previous_changed_at.reshape(-1)
+            # Only facts changing a second time push an older value into the history
+            for fact, at, value in zip(changed.tolist(), previous_changed_at[changed].tolist(), previous[changed].tolist()):
+                if changed_at[fact] != at:
+                    self.history.setdefault(fact, []).append((at, value))
+            previous[changed] = values[changed]
+            previous_changed_at[changed] = changed_at[changed]
+            values[changed] = current.reshape(-1)[changed]
+            changed_at[changed] = self.version
+        return self.version
+
+    def value(self, fact: int, version: int)->float:
+        """Value of one fact as of a version."""
+        if self.changed_at.item(fact) <= version:
+            return self.values.item(fact)
+        if self.previous_changed_at.item(fact) <= version:
+            return self.previous.item(fact)
+        return float(self.value_at([fact], [version])[0])
+
+    def value_at(self, facts, versions)->np.ndarray:
+        """Value of each fact as of a version."""
+        facts = np.asarray(facts, dtype=np.int64)
+        versions = np.asarray(versions, dtype=np.uint32)
+        out = self.values.reshape(-1)[facts].copy()
+        older = self.changed_at.reshape(-1)[facts] > versions
+        out[older] = self.previous.reshape(-1)[facts[older]]
+        oldest = older & (self.previous_changed_at.reshape(-1)[facts] > versions)
+        for i in np.flatnonzero(oldest).tolist():
+            # Rare: the fact changed more than once since that version
+            history = self.history.get(int(facts[i]), [])
+            j = bisect_right([at for at, _ in history], int(versions[i])) - 1
+            out[i] = history[max(j, 0)][1] if history else out[i]
+        return out
+
+
+class DeltaTable:
+    """Open-addressing hash table of int64 key -> (float32 value, uint32 version), in NumPy arrays."""
+    def __init__(self, capacity: int = 1024):
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.versions = np.zeros(capacity, dtype=np.uint32)
+        self.size = 0
+
+    def __len__(self)->int:
+        return self.size
+
+    @property
+    def nbytes(self)->int:
+        return self.keys.nbytes + self.values.nbytes + self.versions.nbytes
+
+    def _slots(self, keys: np.ndarray)->np.ndarray:
+        bits = len(self.keys).bit_length() - 1
+        return ((keys.astype(np.uint64) * HASH_MULTIPLIER) >> np.uint64(64 - bits)).astype(np.int64)
+
+    def get(self, key: int):
+        """(value, version) for one key, or None."""
+        keys = self.keys
+        mask = len(keys) - 1
+        slot = ((key * 0x9E3779B97F4A7C15) & MASK64) >> (65 - len(keys).bit_length())
+        while True:
+            held = keys.item(slot)
+            if held == key:
+                return self.values.item(slot), self.versions.item(slot)
+            if held == EMPTY:
+                return None
+            slot = (slot + 1) & mask
+
+    def find(self, keys)->np.ndarray:
+        """Slot of each key, -1 where it isn't in the table."""
+        keys = np.asarray(keys, dtype=np.int64)
+        mask = len(self.keys) - 1
+        slots = self._slots(keys)
+        found = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            held = self.keys[slots[pending]]
+            hit = held == keys[pending]
+            found[pending[hit]] = slots[pending[hit]]
+            pending = pending[~hit & (held != EMPTY)]
+            slots[pending] = (slots[pending] + 1) & mask
+        return found
+
+    def put(self, keys, values, versions)->None:
+        keys = np.asarray(keys, dtype=np.int64)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float32), keys.shape)
+        versions = np.broadcast_to(np.asarray(versions, dtype=np.uint32), keys.shape)
+        # The last write to a key wins
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last
+        keys, values, versions = keys[keep], values[keep], versions[keep]
+        if (self.size + len(keys)) * 2 > len(self.keys):
+            self._grow(self.size + len(keys))
+        mask = len(self.keys) - 1
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        while len(pending):
+            s = slots[pending]
+            held = self.keys[s]
+            hit = held == keys[pending]
+            empty = held == EMPTY
+            # Of the new keys landing on the same empty slot, the first takes it and the rest probe on
+            empty_at = np.flatnonzero(empty)
+            _, first = np.unique(s[empty_at], return_index=True)
+            claim = np.zeros(len(pending), dtype=bool)
+            claim[empty_at[first]] = True
+            write = hit | claim
+            w = pending[write]
+            self.keys[slots[w]] = keys[w]
+            self.values[slots[w]] = values[w]
+            self.versions[slots[w]] = versions[w]
+            self.size += int(claim.sum())
+            advance = ~write & ~empty
+            slots[pending[advance]] = (slots[pending[advance]] + 1) & mask
+            pending = pending[~write]
+
+    def _grow(self, needed: int)->None:
+        live = self.keys != EMPTY
+        keys, values, versions = self.keys[live], self.values[live], self.versions[live]
+        capacity = 1 << (2 * needed - 1).bit_length()
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.versions = np.zeros(capacity, dtype=np.uint32)
+        self.size = 0
+        self.put(keys, values, versions)
+
+
+class BeliefStore:
+    def __init__(self, facts: FactTable, wizards: int = None):
+        self.facts = facts
+        wizards = len(facts.store) if wizards is None else wizards
+        self.epoch = np.zeros(wizards, dtype=np.uint32)
+        self.deltas = DeltaTable()
+
+    def _keys(self, believers, facts)->np.ndarray:
+        return (np.asarray(believers, dtype=np.int64) << 32) | np.asarray(facts, dtype=np.int64)
+
+    def catch_up(self, wizards=None)->None:
+        """Wizards look around and now believe the world as it is."""
+        if wizards is None:
+            self.epoch[:] = self.facts.version
+        else:
+            self.epoch[wizards] = self.facts.version
+
+    def believe(self, believers, subjects, field: str, values)->None:
+        """Believers now hold that subjects' field has these values, whatever the truth is."""
+        believers = np.atleast_1d(believers)
+        facts = self.facts.fact(np.atleast_1d(subjects), field)
+        keys = self._keys(*np.broadcast_arrays(believers, facts))
+        self.deltas.put(keys.reshape(-1), np.broadcast_to(values, keys.shape).reshape(-1), self.facts.version)
+
+    def beliefs(self, believers, subjects, field: str)->np.ndarray:
+        believers, subjects = np.broadcast_arrays(np.atleast_1d(believers), np.atleast_1d(subjects))
+        facts = self.facts.fact(subjects, field).astype(np.int64)
+        epochs = self.epoch[believers]
+        out = self.facts.value_at(facts, epochs)
+        slots = self.deltas.find(self._keys(believers, facts))
+        has = slots >= 0
+        # Deltas formed before the believer last caught up have been replaced by what they saw
+        current = np.zeros(len(slots), dtype=bool)
+        current[has] = self.deltas.versions[slots[has]] >= epochs[has]
+        out[current] = self.deltas.values[slots[current]]
+        return out
+
+    def belief(self, believer: int, subject: int, field: str)->float:
+        """What one wizard believes about one field of one entity."""
+        fact = subject * len(FIELDS) + FIELD[field]
+        epoch = self.epoch.item(believer)
+        delta = self.deltas.get((believer << 32) | fact)
+        if delta is not None and delta[1] >= epoch:
+            return delta[0]
+        return self.facts.value(fact, epoch)
+
+    def wrong(self, believers, subjects, field: str)->np.ndarray:
+        """Whether each belief differs from the current truth."""
+        truth = self.facts.values[np.atleast_1d(subjects), FIELD[field]]
+        return self.beliefs(believers, subjects, field) != truth
+
+    def nbytes(self)->int:
+        facts = self.facts
+        fact_bytes = (facts.values.nbytes + facts.changed_at.nbytes + facts.previous.nbytes
+                      + facts.previous_changed_at.nbytes + sys.getsizeof(facts.history))
+        return fact_bytes + self.epoch.nbytes + self.deltas.nbytes
+
+
+def benchmark_beliefs(wizards=10000, ticks=20, heard_per_tick=10000, queries=100000, seed=123)->dict:
+    import tracemalloc
+    import world_updater
+    rng = np.random.default_rng(seed)
+    store = world_updater.battle_store(wizards, seed)
+    updater = world_updater.Updater(store)
+
+    tracemalloc.start()
+    facts = FactTable(store)
+    beliefs = BeliefStore(facts)
+    snapshot = None
+    for tick in range(ticks):
+        updater.submit_many(*world_updater.random_acts(store, wizards // 10, seed=seed + tick))
+        updater.tick()
+        if facts.advance() == ticks // 2:
+            snapshot = facts.values.copy()
+        # Some wizards look around, the rest hear rumours about who's dead, true or not
+        beliefs.catch_up(rng.choice(wizards, wizards // 5, replace=False))
+        listeners = rng.integers(0, wizards, heard_per_tick)
+        beliefs.believe(listeners, rng.integers(0, wizards, heard_per_tick), 'alive', rng.random(heard_per_tick) < 0.5)
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # A dict per wizard with every fact about every entity, measured for one wizard
+    sample = {(b, f): 0.0 for b in range(wizards) for f in FIELDS[:1]}
+    dict_bytes = (sys.getsizeof(sample) / len(sample) + 24) * len(FIELDS) * wizards * wizards
+
+    a = rng.integers(0, wizards, queries)
+    b = rng.integers(0, wizards, queries)
+    started = time.perf_counter()
+    batch = beliefs.beliefs(a, b, 'alive')
+    batch_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(1000):
+        beliefs.belief(int(a[i]), int(b[i]), 'alive')
+    single_seconds = (time.perf_counter() - started) / 1000
+    wrong = beliefs.wrong(a, b, 'alive').mean()
+    assert np.array_equal(batch[:1000], [beliefs.belief(int(x), int(y), 'alive') for x, y in zip(a[:1000], b[:1000])])
+    # A wizard who stopped looking halfway through still sees the world as it was then
+    stale = BeliefStore(facts)
+    stale.epoch[:] = ticks // 2
+    for field in ('health', 'alive', 'mana'):
+        assert np.array_equal(stale.beliefs(a, b, field), snapshot[b, FIELD[field]])
+
+    result = {'wizards': wizards, 'deltas': len(beliefs.deltas), 'bytes': beliefs.nbytes(), 'traced_bytes': traced,
+              'dict_bytes': dict_bytes, 'batch_query_ns': batch_seconds / queries * 1e9, 'single_query_us': single_seconds * 1e6}
+    print(f"{wizards:,} wizards after {ticks} ticks: {len(beliefs.deltas):,} belief deltas, {result['bytes'] / 2 ** 20:.1f} MiB",
+          f"(~{dict_bytes / 2 ** 30:.0f} GiB as per-wizard dicts)")
+    print(f"queries: {result['batch_query_ns']:.0f} ns each batched, {result['single_query_us']:.1f} us one at a time;",
+          f"{wrong:.1%} of sampled beliefs are wrong")
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_beliefs()
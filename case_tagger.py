@@ -0,0 +1,97 @@
+"""
+Case tagging for Wizard Language token streams
+
+Every utterance in a battle passes through case tagging, so this does it for whole token arrays
+at once instead of one phrase at a time like Syntagm.set_case. Tokens are integer IDs; a lookup
+table indexed by token ID gives each particle's case and category (from
+action_classes.PARTICLE_CASES), a phrase ends at each particle, and the phrase's case is the
+case of the particle closing it. A trailing phrase with no particle is a neutral noun, the same
+as Syntagm.set_case.
+
+The results are compact arrays: int32 phrase end offsets plus int8 case and category codes that
+index action_classes.CASES and CATEGORIES.
+"""
+
+import time
+
+import numpy as np
+
+from action_classes import CASES, CATEGORIES, PARTICLE_CASES
+
+
+class CaseTagger:
+    def __init__(self, vocabulary: dict = None):
+        """
+        vocabulary maps token strings to integer IDs, e.g. lexicon IDs. Particles missing from it
+        are given new IDs after the largest one.
+        """
+        vocabulary = dict(vocabulary or {})
+        next_id = max(vocabulary.values(), default=-1) + 1
+        for particle in PARTICLE_CASES:
+            if particle not in vocabulary:
+                vocabulary[particle] = next_id
+                next_id += 1
+        self.vocabulary = vocabulary
+        size = max(vocabulary.values()) + 1
+        # -1 marks tokens that aren't particles
+        self.case_table = np.full(size, -1, dtype=np.int8)
+        self.category_table = np.full(size, -1, dtype=np.int8)
+        for particle, (case, category) in PARTICLE_CASES.items():
+            token = vocabulary[particle]
+            self.case_table[token] = CASES.index(case)
+            self.category_table[token] = CATEGORIES.index(category)
+
+    def encode(self, tokens: list[str])->np.ndarray:
+        # Unknown words get an ID past the table, which is never a particle
+        unknown = len(self.case_table)
+        return np.fromiter((self.vocabulary.get(t, unknown) for t in tokens), dtype=np.int32, count=len(tokens))
+
+    def tag(self, token_ids: np.ndarray)->tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Tags a whole token array in one pass.
+        Returns (ends, cases, categories): phrase i is token_ids[ends[i-1]:ends[i]] (from 0 for the first).
+        """
+        token_ids = np.asarray(token_ids)
+        in_table = token_ids < len(self.case_table)
+        cases = np.full(len(token_ids), -1, dtype=np.int8)
+        cases[in_table] = self.case_table[token_ids[in_table]]
+        particle_at = np.flatnonzero(cases >= 0)
+        ends = particle_at + 1
+        phrase_cases = cases[particle_at]
+        phrase_categories = self.category_table[token_ids[particle_at]]
+        if len(token_ids) and (len(ends) == 0 or ends[-1] != len(token_ids)):
+            ends = np.append(ends, len(token_ids))
+            phrase_cases = np.append(phrase_cases, np.int8(CASES.index('neutral')))
+            phrase_categories = np.append(phrase_categories, np.int8(CATEGORIES.index('noun')))
+        return ends.astype(np.int32), phrase_cases, phrase_categories
+
+    def tag_tokens(self, tokens: list[str])->list[tuple[list[str], str, str]]:
+        """Readable version for a single utterance: (phrase, case, category) per phrase."""
+        ends, cases, categories = self.tag(self.encode(tokens))
+        out = []
+        start = 0
+        for end, case, category in zip(ends.tolist(), cases.tolist(), categories.tolist()):
+            out.append((tokens[start:end], CASES[case], CATEGORIES[category]))
+            start = end
+        return out
+
+
+def benchmark_tagger(sizes=(1_000_000, 5_000_000), vocabulary_size=50000, particle_share=0.3, seed=123)->list[dict]:
+    rng = np.random.default_rng(seed)
+    tagger = CaseTagger({f'word{i}': i for i in range(vocabulary_size)})
+    particles = np.array([tagger.vocabulary[p] for p in PARTICLE_CASES], dtype=np.int32)
+    results = []
+    for size in sizes:
+        tokens = rng.integers(0, vocabulary_size, size, dtype=np.int32)
+        is_particle = rng.random(size) < particle_share
+        tokens[is_particle] = rng.choice(particles, int(is_particle.sum()))
+        started = time.perf_counter()
+        ends, cases, categories = tagger.tag(tokens)
+        seconds = time.perf_counter() - started
+        results.append({'tokens': size, 'phrases': len(ends), 'seconds': seconds, 'tokens_per_second': size / seconds})
+        print(f"{size:,} tokens -> {len(ends):,} phrases in {seconds * 1000:.1f} ms ({size / seconds / 1e6:.0f}M tokens/s)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_tagger()
@@ -7,45 +7,58 @@ TAKEMITSU, Zeami [birth name]
 __outside_sources__ = """
 """
 
-import pygame
-from pygame.locals import *
-import pymunk
-import pylab
-
 import random
 import io
 import base64
 
-# https://www.pygame.org/wiki/MatplotlibPygame
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.backends.backend_agg as agg
-
-fig = pylab.figure(figsize=[8,8], dpi=100,)
-fig.patch.set_alpha(0.1)
-ax = fig.gca()
-
-canvas = agg.FigureCanvasAgg(fig)
-canvas.draw()
-renderer = canvas.get_renderer()
-raw_data = renderer.tostring_rgb()
-
-pygame.init()
-
-display = pygame.display.set_mode((800, 800))
-screen = pygame.display.get_surface()
-size = canvas.get_width_height()
-surf = pygame.image.fromstring(raw_data, size, "RGB")
-screen.blit(surf, (0,0))
-pygame.display.flip()
-clock = pygame.time.Clock()
-space = pymunk.Space()
+# pygame, pymunk and matplotlib are heavy, and setting them up opens a window,
+# so they are imported and initialized by setup() rather than on import.
+pygame = None
+pymunk = None
+
+fig = None
+ax = None
+display = None
+clock = None
+space = None
 FPS = 90
 
 population = 300
 
 recovery_time = 300 # depends on framerate FPS
 
+
+def setup():
+    global pygame, pymunk, fig, ax, display, clock, space
+    import pygame
+    import pymunk
+    import pylab
+
+    # https://www.pygame.org/wiki/MatplotlibPygame
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.backends.backend_agg as agg
+
+    fig = pylab.figure(figsize=[8,8], dpi=100,)
+    fig.patch.set_alpha(0.1)
+    ax = fig.gca()
+
+    canvas = agg.FigureCanvasAgg(fig)
+    canvas.draw()
+    renderer = canvas.get_renderer()
+    raw_data = renderer.tostring_rgb()
+
+    pygame.init()
+
+    display = pygame.display.set_mode((800, 800))
+    screen = pygame.display.get_surface()
+    size = canvas.get_width_height()
+    surf = pygame.image.fromstring(raw_data, size, "RGB")
+    screen.blit(surf, (0,0))
+    pygame.display.flip()
+    clock = pygame.time.Clock()
+    space = pymunk.Space()
+
 class Ball():
     def __init__(self, x, y, r=10):
         self.x = x
@@ -138,8 +151,10 @@ def game():
         clock.tick(FPS)
         space.step(1/FPS)
 
-game()
+if __name__ == "__main__":
+    setup()
+    game()
 
-#plt.plot(range(0, len(infected_count), 1), infected_count)
+    #plt.plot(range(0, len(infected_count), 1), infected_count)
 
-pygame.quit()
\ No newline at end of file
+    pygame.quit()
@@ -0,0 +1,323 @@
+"""
+Entity store for Battle Wizard Simulator
+
+The agents in action_classes.py are dataclasses several levels deep (Noun -> Person -> Wizard),
+each instance carrying about twenty fields plus a dict and a couple of lists. At 100k agents
+the Python object overhead is most of the memory, and a battle-wide update like "everyone in
+the blast dies" is a Python loop over objects.
+
+EntityStore keeps the agents as a struct of arrays, ECS style: one row per entity.
+
+    float32  health, vitality, strength, agility, intelligence, power, mana, certainty, rudeness, age,
+             x, y, heading (position and facing in radians on the battlefield, which the dataclasses don't have)
+    int32    id, rank
+    uint8    kind (index into KINDS), flags (ALIVE | CONSCIOUS | MORTAL | REAL | VISIBLE | INFECTIOUS)
+
+Names, faces, pronunciations and spell lists are not numbers, so they stay in plain per-row
+lists next to the columns.
+
+Batch updates take an index array or boolean mask of rows and work on whole columns: die(),
+pass_out(), wake_up() and so on follow the same rules as the per-class methods, including the
+kind-specific ones (wizards and apparitions don't die, a ninja dies without passing out).
+
+view(row) returns a thin view over one row that is an instance of the original class
+(isinstance(store.view(row), Wizard) holds). Its fields are properties reading and writing the
+columns, so the existing methods in action_classes work on it unchanged.
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from action_classes import Person, Wizard, Zombie, Apparition, MortalNinja
+
+KINDS = ('person', 'wizard', 'zombie', 'apparition', 'ninja')
+KIND_CLASSES = {'person': Person, 'wizard': Wizard, 'zombie': Zombie, 'apparition': Apparition, 'ninja': MortalNinja}
+KIND = {name: i for i, name in enumerate(KINDS)}
+
+FLOAT_FIELDS = ('health', 'vitality', 'strength', 'agility', 'intelligence', 'power', 'mana', 'certainty', 'rudeness', 'age',
+                'x', 'y', 'heading')
+INT_FIELDS = ('id', 'rank')
+OBJECT_FIELDS = ('name', 'face', 'pronunciation', 'spells', 'category')
+
+# Bit flags
+ALIVE = 1
+CONSCIOUS = 2
+MORTAL = 4
+REAL = 8
+VISIBLE = 16
+INFECTIOUS = 32
+FLAGS = {'alive': ALIVE, 'conscious': CONSCIOUS, 'mortal': MORTAL, 'real': REAL, 'visible': VISIBLE, 'infectious': INFECTIOUS}
+
+# Starting flags per kind, the class-level defaults in action_classes
+KIND_FLAGS = {
+    'person': ALIVE | CONSCIOUS | MORTAL | REAL | VISIBLE,
+    'wizard': ALIVE | CONSCIOUS | REAL | VISIBLE,
+    'zombie': CONSCIOUS | MORTAL | REAL | VISIBLE,
+    'apparition': CONSCIOUS | VISIBLE,
+    'ninja': ALIVE | CONSCIOUS | MORTAL | REAL | VISIBLE,
+}
+
+
+class EntityStore:
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=np.float32) for name in FLOAT_FIELDS}
+        self.columns.update({name: np.zeros(capacity, dtype=np.int32) for name in INT_FIELDS})
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.objects = {name: [] for name in OBJECT_FIELDS}
+
+    def __len__(self)->int:
+        return self.size
+
+    @property
+    def capacity(self)->int:
+        return len(self.kind)
+
+    def _reserve(self, count: int)->None:
+        needed = self.size + count
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity)
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+        for name in ('kind', 'flags'):
+            grown = np.zeros(capacity, dtype=np.uint8)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+
+    def __getitem__(self, field: str)->np.ndarray:
+        """The live part of a column, e.g. store['health']. Writes go straight to the store."""
+        if field in FLAGS:
+            return (self.flags[:self.size] & FLAGS[field]) != 0
+        if field == 'kind':
+            return self.kind[:self.size]
+        return self.columns[field][:self.size]
+
+    def spawn(self, kind: str, count: int = 1, **values)->np.ndarray:
+        """
+        Adds count entities of one kind and returns their rows. values sets columns and flags,
+        each a scalar or one value per entity, and object fields, shared by all of them except
+        name and category, which can also be lists with one per entity. Columns default to 0,
+        flags to the kind's defaults.
+        """
+        if kind not in KIND:
+            raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}.")
+        self._reserve(count)
+        rows = np.arange(self.size, self.size + count)
+        start, end = self.size, self.size + count
+        self.kind[start:end] = KIND[kind]
+        flags = np.full(count, KIND_FLAGS[kind], dtype=np.uint8)
+        for name, value in values.items():
+            if name in FLAGS:
+                value = np.broadcast_to(np.asarray(value, dtype=bool), (count,))
+                flags = np.where(value, flags | FLAGS[name], flags & ~np.uint8(FLAGS[name])).astype(np.uint8)
+            elif name in self.columns:
+                self.columns[name][start:end] = value
+            elif name not in OBJECT_FIELDS:
+                raise ValueError(f"Entities have no field {name!r}.")
+        self.flags[start:end] = flags
+        for name in OBJECT_FIELDS:
+            value = values.get(name)
+            if isinstance(value, (list, tuple)) and len(value) == count and name in ('name', 'category'):
+                self.objects[name].extend(value)
+            else:
+                self.objects[name].extend([value] * count)
+        self.size = end
+        return rows
+
+    def add(self, entity: Person)->int:
+        """Copies a dataclass entity into the store and returns its row."""
+        kind = next(k for k, cls in reversed(KIND_CLASSES.items()) if isinstance(entity, cls))
+        values = {name: getattr(entity, name) for name in FLOAT_FIELDS + INT_FIELDS + OBJECT_FIELDS
+                  if hasattr(entity, name)}
+        values.update({name: bool(getattr(entity, name)) for name in FLAGS if hasattr(entity, name)})
+        return int(self.spawn(kind, 1, **values)[0])
+
+    # Batch updates. rows is an index array or a boolean mask over the live rows.
+
+    def _rows(self, rows)->np.ndarray:
+        if rows is None:
+            return np.arange(self.size)
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            return np.flatnonzero(rows)
+        return rows
+
+    def set_flag(self, rows, flag: int, value: bool)->None:
+        rows = self._rows(rows)
+        if value:
+            self.flags[rows] |= flag
+        else:
+            self.flags[rows] &= ~np.uint8(flag)
+
+    def mask(self, flag: int, rows=None)->np.ndarray:
+        return (self.flags[self._rows(rows)] & flag) != 0
+
+    def of_kind(self, kind: str)->np.ndarray:
+        return np.flatnonzero(self.kind[:self.size] == KIND[kind])
+
+    def die(self, rows=None)->np.ndarray:
+        """
+        Kills every mortal entity among rows and returns a boolean array of who died.
+        Zombies and ninjas always die; a ninja dies without passing out, like MortalNinja.die().
+        """
+        rows = self._rows(rows)
+        kind = self.kind[rows]
+        dies = ((self.flags[rows] & MORTAL) != 0) | (kind == KIND['zombie']) | (kind == KIND['ninja'])
+        dead = rows[dies]
+        self.columns['health'][dead] = 0.0
+        self.flags[dead] &= ~np.uint8(ALIVE)
+        passes_out = dead[self.kind[dead] != KIND['ninja']]
+        self.flags[passes_out] &= ~np.uint8(CONSCIOUS)
+        return dies
+
+    def pass_out(self, rows=None)->None:
+        self.set_flag(rows, CONSCIOUS, False)
+
+    def wake_up(self, rows=None)->None:
+        self.set_flag(rows, CONSCIOUS, True)
+
+    def birth(self, rows=None)->None:
+        # Zombies are born conscious but not alive
+        rows = self._rows(rows)
+        self.flags[rows] |= CONSCIOUS
+        zombie = self.kind[rows] == KIND['zombie']
+        self.flags[rows[~zombie]] |= ALIVE
+        self.flags[rows[zombie]] &= ~np.uint8(ALIVE)
+
+    def vanish(self, rows=None)->None:
+        # Apparitions fade out completely, ninjas just hide, wide awake
+        rows = self._rows(rows)
+        self.flags[rows] &= ~np.uint8(VISIBLE)
+        apparitions = rows[self.kind[rows] == KIND['apparition']]
+        self.flags[apparitions] &= ~np.uint8(CONSCIOUS)
+        self.columns['health'][apparitions] = 0.0
+        self.flags[rows[self.kind[rows] == KIND['ninja']]] |= CONSCIOUS
+
+    # Views
+
+    def view(self, row: int)->Person:
+        """A thin view of one row as its action_classes type."""
+        if not 0 <= row < self.size:
+            raise IndexError(row)
+        cls = view_class(KINDS[self.kind[row]])
+        return cls(self, int(row))
+
+    def views(self, rows=None)->list:
+        return [self.view(row) for row in self._rows(rows).tolist()]
+
+    def nbytes(self)->int:
+        arrays = sum(column.nbytes for column in self.columns.values()) + self.kind.nbytes + self.flags.nbytes
+        return arrays + sum(sys.getsizeof(values) for values in self.objects.values())
+
+
+class EntityView:
+    """Base of the row views. Subclasses also inherit the action_classes type of the row."""
+    __slots__ = ()
+
+    def __init__(self, store: EntityStore, row: int):
+        object.__setattr__(self, '_store', store)
+        object.__setattr__(self, '_row', row)
+
+    @property
+    def row(self)->int:
+        return self._row
+
+
+def _column_property(name: str):
+    def get(self):
+        return self._store.columns[name][self._row].item()
+    def set(self, value):
+        self._store.columns[name][self._row] = value
+    return property(get, set)
+
+
+def _flag_property(flag: int):
+    def get(self):
+        return bool(self._store.flags[self._row] & flag)
+    def set(self, value):
+        if value:
+            self._store.flags[self._row] |= flag
+        else:
+            self._store.flags[self._row] &= ~np.uint8(flag)
+    return property(get, set)
+
+
+def _object_property(name: str):
+    def get(self):
+        return self._store.objects[name][self._row]
+    def set(self, value):
+        self._store.objects[name][self._row] = value
+    return property(get, set)
+
+
+_view_classes = {}
+
+def view_class(kind: str)->type:
+    """View class for a kind, a subclass of both EntityView and the kind's dataclass, built once."""
+    cls = _view_classes.get(kind)
+    if cls is None:
+        base = KIND_CLASSES[kind]
+        namespace = {'__slots__': ()}
+        namespace.update({name: _column_property(name) for name in FLOAT_FIELDS + INT_FIELDS})
+        namespace.update({name: _flag_property(flag) for name, flag in FLAGS.items()})
+        namespace.update({name: _object_property(name) for name in OBJECT_FIELDS})
+        cls = _view_classes[kind] = type(f"{base.__name__}View", (EntityView, base), namespace)
+    return cls
+
+
+def benchmark_entity_store(count=100000, seed=123)->dict:
+    rng = np.random.default_rng(seed)
+    kinds = ('wizard', 'zombie', 'ninja', 'person')
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    store = EntityStore()
+    for kind in kinds:
+        n = count // len(kinds)
+        store.spawn(kind, n, health=rng.random(n), strength=rng.random(n), power=rng.random(n),
+                    rank=np.arange(n), name=[f"{kind}{i}" for i in range(n)])
+    build_seconds = time.perf_counter() - started
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # The same agents as dataclasses, measured on a sample and scaled up
+    sample = min(count, 10000)
+    tracemalloc.start()
+    objects = [store.view(row) for row in range(0, count, count // sample)]
+    objects = [KIND_CLASSES[KINDS[store.kind[v.row]]](**{f: getattr(v, f) for f in v.__dataclass_fields__})
+               for v in objects]
+    object_bytes = tracemalloc.get_traced_memory()[0] * count / len(objects)
+    tracemalloc.stop()
+
+    blast = store['health'] < 0.5
+    started = time.perf_counter()
+    died = store.die(blast)
+    batch_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for entity in objects:
+        if entity.health < 0.5:
+            entity.die()
+    loop_seconds = (time.perf_counter() - started) * count / len(objects)
+
+    # A view and the batch update agree
+    view = store.view(int(np.flatnonzero(blast)[died][0]))
+    assert isinstance(view, KIND_CLASSES[KINDS[store.kind[view.row]]]) and view.health == 0.0 and not view.alive
+
+    result = {'entities': count, 'store_bytes': store_bytes, 'object_bytes': object_bytes,
+              'build_seconds': build_seconds, 'die_batch_seconds': batch_seconds, 'die_loop_seconds': loop_seconds,
+              'died': int(died.sum())}
+    print(f"{count:,} entities: store {store_bytes / 2 ** 20:.1f} MiB vs ~{object_bytes / 2 ** 20:.1f} MiB of dataclasses,",
+          f"built in {build_seconds * 1000:.0f} ms")
+    print(f"die() on {int(blast.sum()):,} rows: {batch_seconds * 1000:.2f} ms batched vs ~{loop_seconds * 1000:.0f} ms looping over objects")
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_entity_store()
@@ -0,0 +1,246 @@
+"""
+Event Kernel for Battle Wizard Simulator
+
+A purpose-built discrete event kernel for queueing lots of agents at once.
+
+SimPy runs every agent as a generator process, and every `yield` through a Resource costs
+several Python generator switches and Event objects. That is fine for a theater of moviegoers,
+but power-up and mana queueing has to handle thousands of wizards. Here an event is just a
+compact tuple on a binary heap:
+
+    (time, seq, callback, entity)
+
+The callback is a plain function taking (kernel, entity), and entity is usually an integer row
+index into whatever arrays the model keeps. The seq counter keeps events at equal times in FIFO
+order, which is the same tie-breaking SimPy uses.
+
+ServerPool has the same semantics as simpy.Resource: a fixed number of identical servers and a
+FIFO queue of waiting requests. Give it a sim_stats.ResourceMonitor to track queue length and
+utilization over time. The other pools mirror the rest of SimPy's resources:
+
+* Container is a level of some stuff (mana) that requests draw amounts from, like simpy.Container.
+* PriorityPool serves the waiting queue lowest priority value first, like simpy.PriorityResource.
+* PreemptivePool lets a better priority kick out the worst current user, like simpy.PreemptiveResource.
+"""
+
+import heapq
+
+from collections import deque
+
+from typing import Callable
+
+EventCallback = Callable[["EventKernel", int], None]
+
+
+class EventKernel:
+    def __init__(self, start: float = 0.0):
+        self.now = start
+        self._queue = []
+        self._seq = 0
+        self._cancelled = set()
+
+    def schedule(self, delay: float, callback: EventCallback, entity: int = 0)->int:
+        """Schedule callback(kernel, entity) after delay. Returns the event's seq, which cancel() takes."""
+        seq = self._seq
+        heapq.heappush(self._queue, (self.now + delay, seq, callback, entity))
+        self._seq += 1
+        return seq
+
+    def schedule_at(self, time: float, callback: EventCallback, entity: int = 0)->int:
+        seq = self._seq
+        heapq.heappush(self._queue, (time, seq, callback, entity))
+        self._seq += 1
+        return seq
+
+    def cancel(self, seq: int)->None:
+        # Lazy deletion: the event stays on the heap and is skipped when it comes up
+        self._cancelled.add(seq)
+
+    def peek(self)->float:
+        """Time of the next event, or infinity when nothing is scheduled."""
+        return self._queue[0][0] if self._queue else float('inf')
+
+    def run(self, until: float = None)->None:
+        """
+        Pop and fire events in time order. Like simpy.Environment.run(until=...),
+        events scheduled exactly at `until` are left on the queue.
+        """
+        queue = self._queue
+        cancelled = self._cancelled
+        pop = heapq.heappop
+        if until is None:
+            until = float('inf')
+        while queue and queue[0][0] < until:
+            time, seq, callback, entity = pop(queue)
+            if cancelled and seq in cancelled:
+                cancelled.discard(seq)
+                continue
+            self.now = time
+            callback(self, entity)
+        if until != float('inf'):
+            self.now = until
+
+
+class ServerPool:
+    """
+    FIFO pool of identical servers, the kernel's version of simpy.Resource.
+    A granted request fires its callback as a zero-delay event, the same as a triggered SimPy Request.
+    """
+    __slots__ = ('capacity', 'busy', 'waiting', 'monitor')
+
+    def __init__(self, capacity: int, monitor=None):
+        if capacity < 1:
+            raise ValueError("ServerPool capacity must be at least 1.")
+        self.capacity = capacity
+        self.busy = 0
+        self.waiting = deque()
+        self.monitor = monitor
+
+    def request(self, kernel: EventKernel, callback: EventCallback, entity: int)->bool:
+        """Ask for a server. Returns True if one was free, otherwise the entity joins the queue."""
+        if self.busy < self.capacity:
+            self.busy += 1
+            kernel.schedule(0.0, callback, entity)
+            granted = True
+        else:
+            self.waiting.append((callback, entity))
+            granted = False
+        if self.monitor is not None:
+            self.monitor.update(kernel.now, len(self.waiting), self.busy)
+        return granted
+
+    def release(self, kernel: EventKernel)->None:
+        """Free a server, handing it straight to the head of the queue if anyone is waiting."""
+        if self.waiting:
+            callback, entity = self.waiting.popleft()
+            kernel.schedule(0.0, callback, entity)
+        else:
+            self.busy -= 1
+        if self.monitor is not None:
+            self.monitor.update(kernel.now, len(self.waiting), self.busy)
+
+    @property
+    def queue_length(self)->int:
+        return len(self.waiting)
+
+
+class Container:
+    """
+    A level of some continuous stuff, like a mana pool.
+    get() waits in FIFO order until the level covers the amount. put() tops the level up to
+    capacity and hands it out to waiting requests; anything over capacity is lost.
+    """
+    __slots__ = ('capacity', 'level', 'waiting')
+
+    def __init__(self, capacity: float, level: float = 0.0):
+        if level > capacity:
+            raise ValueError("Container level cannot start above its capacity.")
+        self.capacity = capacity
+        self.level = level
+        self.waiting = deque()
+
+    def get(self, kernel: EventKernel, amount: float, callback: EventCallback, entity: int)->bool:
+        if amount > self.capacity:
+            raise ValueError("Cannot get more than the Container's capacity.")
+        if not self.waiting and self.level >= amount:
+            self.level -= amount
+            kernel.schedule(0.0, callback, entity)
+            return True
+        self.waiting.append((amount, callback, entity))
+        return False
+
+    def put(self, kernel: EventKernel, amount: float)->None:
+        self.level = min(self.capacity, self.level + amount)
+        waiting = self.waiting
+        while waiting and self.level >= waiting[0][0]:
+            amount, callback, entity = waiting.popleft()
+            self.level -= amount
+            kernel.schedule(0.0, callback, entity)
+
+
+class PriorityPool:
+    """ServerPool whose waiting queue is served lowest priority value first, FIFO among equals."""
+    __slots__ = ('capacity', 'busy', 'waiting', '_seq')
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("PriorityPool capacity must be at least 1.")
+        self.capacity = capacity
+        self.busy = 0
+        self.waiting = []
+        self._seq = 0
+
+    def request(self, kernel: EventKernel, callback: EventCallback, entity: int, priority: int = 0)->bool:
+        if self.busy < self.capacity:
+            self.busy += 1
+            kernel.schedule(0.0, callback, entity)
+            return True
+        heapq.heappush(self.waiting, (priority, self._seq, callback, entity))
+        self._seq += 1
+        return False
+
+    def release(self, kernel: EventKernel)->None:
+        if self.waiting:
+            _, _, callback, entity = heapq.heappop(self.waiting)
+            kernel.schedule(0.0, callback, entity)
+        else:
+            self.busy -= 1
+
+    @property
+    def queue_length(self)->int:
+        return len(self.waiting)
+
+
+class PreemptivePool:
+    """
+    PriorityPool where a request can kick out the current user with the worst priority,
+    if its own priority value is strictly lower. The kicked-out entity gets its on_preempt
+    callback as a zero-delay event; it is up to the model to cancel whatever it had scheduled
+    and decide whether to queue again.
+    """
+    __slots__ = ('capacity', 'users', 'waiting', '_seq')
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("PreemptivePool capacity must be at least 1.")
+        self.capacity = capacity
+        self.users = {} # entity -> (priority, seq, on_preempt)
+        self.waiting = []
+        self._seq = 0
+
+    def request(self,
+                kernel: EventKernel,
+                callback: EventCallback,
+                entity: int,
+                priority: int = 0,
+                on_preempt: EventCallback = None)->bool:
+        seq = self._seq
+        self._seq += 1
+        users = self.users
+        if len(users) >= self.capacity:
+            # The worst user is the highest priority value, latest arrival among equals
+            worst = max(users, key=users.__getitem__)
+            worst_priority, _, worst_on_preempt = users[worst]
+            if priority >= worst_priority:
+                heapq.heappush(self.waiting, (priority, seq, callback, entity, on_preempt))
+                return False
+            del users[worst]
+            if worst_on_preempt is not None:
+                kernel.schedule(0.0, worst_on_preempt, worst)
+        users[entity] = (priority, seq, on_preempt)
+        kernel.schedule(0.0, callback, entity)
+        return True
+
+    def holds(self, entity: int)->bool:
+        return entity in self.users
+
+    def release(self, kernel: EventKernel, entity: int)->None:
+        del self.users[entity]
+        if self.waiting:
+            priority, seq, callback, waiter, on_preempt = heapq.heappop(self.waiting)
+            self.users[waiter] = (priority, seq, on_preempt)
+            kernel.schedule(0.0, callback, waiter)
+
+    @property
+    def queue_length(self)->int:
+        return len(self.waiting)
@@ -0,0 +1,349 @@
+"""
+Binary event log for Battle Wizard Simulator
+
+Battles are meant to be narrated in Wizard Language and used as training data, so everything
+that happens is written to an append-only log of fixed-width records, one per event:
+
+    tick u4, batch u4, verb i4, roles 9 x i4 (store rows in ROLES order, -1 empty),
+    flags u1 (aspect/mood bits), source u1, certainty f4, amount f4
+
+58 bytes an event. source says what produced it (SOURCES): a world_updater tick, a spell_engine
+cast, or a statement, which changes nothing. amount is what replay needs besides the roles:
+damage done for a spell hit, health restored for a heal, and 1 or 0 for whether a statement was
+true. batch numbers every logged batch (one updater tick, one cast() call) so replay can apply
+them exactly as they were applied live. Ticks never go down through the file: EventWriter refuses
+a record older than the last one logged, so reading by tick can binary search.
+
+EventWriter keeps records in a NumPy buffer and writes it out in one write() when it fills, and
+every snapshot_every ticks saves a snapshot of the entity store next to the log
+(<log>.snapshots/<tick>.npz). EventLog memory-maps the file as a NumPy record array, so
+analytics over millions of events are array operations on the page cache with nothing copied.
+
+EventLog.replay(tick) rebuilds the world as it was at the start of a tick: the newest snapshot
+at or before it, then every logged batch up to it, applied with the same operations in the same
+order as live, so the result is bit-for-bit the live state. What isn't an event (movement, for
+now) is only as fresh as the last snapshot.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import spell_engine
+
+from action_classes import ASPECTS, Event, ROLES
+from entity_store import FLOAT_FIELDS, INT_FIELDS, OBJECT_FIELDS, ALIVE, INFECTIOUS, VISIBLE, EntityStore
+from world_updater import DEFAULT_VERB_IDS, HEAL_PER_POWER, STATEMENT, WORLD_VERBS, TickResult, Updater
+
+MAGIC = b'WZEVLOG1'
+RECORD = np.dtype([
+    ('tick', '<u4'), ('batch', '<u4'), ('verb', '<i4'), ('roles', '<i4', (len(ROLES),)),
+    ('flags', 'u1'), ('source', 'u1'), ('certainty', '<f4'), ('amount', '<f4'),
+])
+HEADER = np.dtype([('magic', 'S8'), ('record_size', '<u4'), ('roles', '<u4')])
+
+SOURCES = ('world', 'spell', 'statement')
+WORLD, SPELL, SAID = range(len(SOURCES))
+
+PERFECTIVE = 1 << ASPECTS.index('perfective')
+AGENT = ROLES.index('agent')
+PATIENT = ROLES.index('patient')
+
+
+def store_arrays(store: EntityStore)->dict:
+    """The numeric state of a store, trimmed to its live rows."""
+    n = len(store)
+    arrays = {f"column_{name}": column[:n] for name, column in store.columns.items()}
+    arrays.update(kind=store.kind[:n], flags=store.flags[:n])
+    return arrays
+
+def restore_store(arrays)->EntityStore:
+    n = len(arrays['kind'])
+    store = EntityStore(max(n, 1))
+    for name in FLOAT_FIELDS + INT_FIELDS:
+        store.columns[name][:n] = arrays[f"column_{name}"]
+    store.kind[:n] = arrays['kind']
+    store.flags[:n] = arrays['flags']
+    store.objects = {name: [None] * n for name in OBJECT_FIELDS} # names and faces aren't in snapshots
+    store.size = n
+    return store
+
+
+class EventWriter:
+    def __init__(self, path: str, buffer_records: int = 65536, snapshot_every: int = 100):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.buffer = np.zeros(buffer_records, dtype=RECORD)
+        self.count = 0
+        self.batch = 0
+        self.tick = 0 # the last tick logged
+        self.written = 0
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            # Carry on numbering batches after the ones already in the file
+            existing = EventLog(path)
+            count = len(existing)
+            self.batch = int(existing.records['batch'][-1]) + 1 if count else 0
+            self.tick = int(existing.records['tick'][-1]) if count else 0
+            del existing
+            # A crash mid-write can leave part of a record at the end, which would shift every record after it
+            os.truncate(path, HEADER.itemsize + count * RECORD.itemsize)
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(np.array([(MAGIC, RECORD.itemsize, len(ROLES))], dtype=HEADER).tobytes())
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    @property
+    def snapshot_dir(self)->str:
+        return self.path + '.snapshots'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, records: np.ndarray)->None:
+        """Appends a batch of RECORD rows; the batch field is filled in here. Ticks must not go down."""
+        ticks = records['tick']
+        if len(ticks) and (ticks[0] < self.tick or (np.diff(ticks.astype(np.int64)) < 0).any()):
+            raise ValueError(f"Ticks must not go down: got {ticks.min()} after tick {self.tick}")
+        records = records.copy()
+        if len(ticks):
+            self.tick = int(ticks[-1])
+        records['batch'] = self.batch
+        self.batch += 1
+        if self.count + len(records) > len(self.buffer):
+            self.flush()
+        if len(records) > len(self.buffer):
+            self.file.write(records.tobytes())
+        else:
+            self.buffer[self.count:self.count + len(records)] = records
+            self.count += len(records)
+        self.written += len(records)
+
+    def flush(self)->None:
+        if self.count:
+            self.file.write(memoryview(self.buffer[:self.count]).cast('B'))
+            self.count = 0
+        self.file.flush()
+
+    def close(self)->None:
+        self.flush()
+        self.file.close()
+
+    @staticmethod
+    def records(tick: int, events: np.ndarray, source: int, certainty=1.0, amount=0.0)->np.ndarray:
+        """RECORD rows from (n, len(Event._fields)) Event rows."""
+        out = np.zeros(len(events), dtype=RECORD)
+        out['tick'] = tick
+        out['verb'] = events[:, 0]
+        out['flags'] = events[:, 1]
+        out['roles'] = events[:, 2:]
+        out['source'] = source
+        out['certainty'] = certainty
+        out['amount'] = amount
+        return out
+
+    def log_tick(self, tick: int, result: TickResult, store: EntityStore, verb_ids: dict = None)->None:
+        """What a world_updater tick did: the accepted spells in commit order, then the statements."""
+        verb_ids = DEFAULT_VERB_IDS if verb_ids is None else verb_ids
+        ids = np.array([verb_ids[v] for v in WORLD_VERBS] + [-1], dtype=np.int32) # index -1 -> -1
+        acts = result.acts
+        def events(rows):
+            e = np.full((len(rows), len(Event._fields)), -1, dtype=np.int32)
+            e[:, 0] = ids[acts[rows, 1]]
+            e[:, 1] = PERFECTIVE
+            e[:, 2 + AGENT] = acts[rows, 2]
+            e[:, 2 + PATIENT] = acts[rows, 3]
+            return e
+        applied = result.applied
+        heal = acts[applied, 1] == WORLD_VERBS.index('heal')
+        amount = np.where(heal, HEAL_PER_POWER * store['power'][acts[applied, 2]], 0.0)
+        self.append(self.records(tick, events(applied), WORLD, store['certainty'][acts[applied, 0]], amount))
+        said = np.flatnonzero(result.outcome == STATEMENT)
+        if len(said):
+            self.append(self.records(tick, events(said), SAID, store['certainty'][acts[said, 0]], result.true[said]))
+
+    def log_casts(self, tick: int, result, store: EntityStore)->None:
+        """What a spell_engine cast() did: every hit with the damage done, then every kill."""
+        hits = len(result.cast)
+        amount = np.zeros(len(result.events), dtype=np.float32)
+        amount[:hits] = result.dealt
+        certainty = store['certainty'][result.events[:, 2 + AGENT]]
+        self.append(self.records(tick, result.events, SPELL, certainty, amount))
+
+    def maybe_snapshot(self, tick: int, store: EntityStore)->bool:
+        """Saves the store as the state at the start of tick, every snapshot_every ticks."""
+        if tick % self.snapshot_every:
+            return False
+        self.snapshot(tick, store)
+        return True
+
+    def snapshot(self, tick: int, store: EntityStore)->None:
+        np.savez(os.path.join(self.snapshot_dir, f"{tick:010d}.npz"), **store_arrays(store))
+
+
+class EventLog:
+    def __init__(self, path: str):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if not len(header) or header['magic'][0] != MAGIC or header['record_size'][0] != RECORD.itemsize:
+            raise ValueError(f"{path} is not an event log with {RECORD.itemsize}-byte records")
+        size = os.path.getsize(path) - HEADER.itemsize
+        count = size // RECORD.itemsize
+        # Zero-copy: a view straight onto the file's pages
+        self.records = (np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.itemsize, shape=(count,))
+                        if count else np.zeros(0, dtype=RECORD))
+
+    def __len__(self)->int:
+        return len(self.records)
+
+    def between(self, start: int, stop: int)->np.ndarray:
+        """Records of ticks start <= tick < stop, a view. Ticks only go up, so it's two binary searches."""
+        ticks = self.records['tick']
+        return self.records[np.searchsorted(ticks, start, 'left'):np.searchsorted(ticks, stop, 'left')]
+
+    def event(self, i: int)->Event:
+        r = self.records[i]
+        return Event(int(r['verb']), int(r['flags']), *r['roles'].tolist())
+
+    def snapshots(self)->list[int]:
+        directory = self.path + '.snapshots'
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.npz'))
+
+    def replay(self, tick: int, spellbook=None, verb_ids: dict = None, kill_verb: int = None)->EntityStore:
+        """The world at the start of tick, from the newest snapshot before it and the batches since."""
+        taken = [t for t in self.snapshots() if t <= tick]
+        if not taken:
+            raise ValueError(f"No snapshot at or before tick {tick}")
+        start = taken[-1]
+        with np.load(os.path.join(self.path + '.snapshots', f"{start:010d}.npz")) as arrays:
+            store = restore_store(arrays)
+        book = spell_engine.SpellBook(spell_engine.default_spells()) if spellbook is None else spellbook
+        updater = Updater(store, verb_ids)
+        kill_verb = updater.verb_ids['kill'] if kill_verb is None else kill_verb
+
+        records = self.between(start, tick)
+        if not len(records):
+            return store
+        batches = records['batch']
+        bounds = np.flatnonzero(np.r_[True, batches[1:] != batches[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            batch = records[lo:hi]
+            source = batch['source'][0]
+            if source == WORLD:
+                self._replay_world(store, updater, batch)
+            elif source == SPELL:
+                self._replay_spell(store, book, kill_verb, batch)
+        return store
+
+    @staticmethod
+    def _replay_world(store: EntityStore, updater: Updater, batch: np.ndarray)->None:
+        # The commit step of Updater.tick, on the accepted acts in the order they were committed
+        verb = updater._verb_index(batch['verb'])
+        agent, patient = batch['roles'][:, AGENT], batch['roles'][:, PATIENT]
+        np.subtract.at(store.columns['mana'], agent, updater.cost[verb])
+        store.die(patient[verb == WORLD_VERBS.index('kill')])
+        store.pass_out(patient[verb == WORLD_VERBS.index('stun')])
+        store.wake_up(patient[verb == WORLD_VERBS.index('wake')])
+        healed = verb == WORLD_VERBS.index('heal')
+        health = store.columns['health']
+        np.add.at(health, patient[healed], batch['amount'][healed])
+        targets = np.unique(patient[healed])
+        health[targets] = np.minimum(health[targets], store.columns['vitality'][targets])
+
+    @staticmethod
+    def _replay_spell(store: EntityStore, book, kill_verb: int, batch: np.ndarray)->None:
+        # The same steps as SpellEngine.cast, with the damage and deaths read from the log
+        kills = batch['verb'] == kill_verb
+        hits = batch[~kills]
+        target = hits['roles'][:, PATIENT].astype(np.int64)
+        health, vitality = store['health'], store['vitality']
+        total = np.bincount(target, weights=hits['amount'], minlength=len(store))
+        hit = np.unique(target)
+        health[hit] = np.clip(health[hit] - total[hit], 0.0, vitality[hit])
+        store.die(batch[kills]['roles'][:, PATIENT].astype(np.int64))
+        attributes = book.attributes[book.lookup(hits['verb'])]
+        standing = (store.flags[target] & ALIVE) != 0
+        has = lambda name: (attributes & spell_engine.ATTRIBUTE[name]) != 0
+        store.wake_up(np.unique(target[standing & has('wake')]))
+        store.pass_out(np.unique(target[standing & has('stun')]))
+        store.vanish(np.unique(target[has('vanish')]))
+        store.set_flag(np.unique(target[has('reveal')]), VISIBLE, True)
+        store.set_flag(np.unique(target[has('infect')]), INFECTIOUS, True)
+
+
+def battle(path: str, wizards=10000, ticks=200, acts_per_tick=2000, casts_per_tick=32, snapshot_every=50,
+           keep=(), seed=123)->dict:
+    """A logged battle of world ticks and spell casts. Returns the live states at the ticks in keep."""
+    import world_updater
+    rng = np.random.default_rng(seed)
+    store = world_updater.battle_store(wizards, seed)
+    side = np.sqrt(wizards / 0.5)
+    store['x'][:] = rng.uniform(0, side, wizards)
+    store['y'][:] = rng.uniform(0, side, wizards)
+    store['health'][:] = rng.uniform(0.3, 1.0, wizards)
+    store['certainty'][:] = rng.random(wizards)
+    updater = world_updater.Updater(store)
+    engine = spell_engine.SpellEngine(store)
+    kept = {}
+    with EventWriter(path, snapshot_every=snapshot_every) as log:
+        for tick in range(ticks + 1):
+            if tick in keep:
+                kept[tick] = {k: v.copy() for k, v in store_arrays(store).items()}
+            log.maybe_snapshot(tick, store)
+            if tick == ticks:
+                break
+            updater.submit_many(*world_updater.random_acts(store, acts_per_tick, seed=seed + tick))
+            log.log_tick(tick, updater.tick(), store)
+            casters = rng.choice(wizards, casts_per_tick, replace=False)
+            spells = engine.spellbook.ids[rng.integers(0, len(engine.spellbook), casts_per_tick)]
+            aimed = rng.integers(0, wizards, casts_per_tick)
+            log.log_casts(tick, engine.cast(casters, spells, store['x'][aimed], store['y'][aimed]), store)
+        written = log.written
+    return {'store': store, 'kept': kept, 'written': written}
+
+
+def benchmark_event_log(wizards=10000, ticks=200, seed=123)->dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'battle.wzlog')
+        keep = sorted({t for t in (0, 37, 50, 123, ticks) if t <= ticks})
+        started = time.perf_counter()
+        run = battle(path, wizards, ticks, keep=keep, seed=seed)
+        battle_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        log = EventLog(path)
+        records = log.records
+        kills = records['verb'] == DEFAULT_VERB_IDS['kill']
+        kills_per_tick = np.bincount(records['tick'][kills], minlength=ticks)
+        lies = (records['source'] == SAID) & (records['amount'] == 0)
+        analytics_seconds = time.perf_counter() - started
+
+        replay_seconds = []
+        for tick in keep:
+            started = time.perf_counter()
+            replayed = store_arrays(log.replay(tick))
+            replay_seconds.append(time.perf_counter() - started)
+            live = run['kept'][tick]
+            assert all(np.array_equal(replayed[k], live[k]) for k in live), f"replay differs at tick {tick}"
+        size = os.path.getsize(path)
+        result = {'events': len(log), 'bytes': size, 'battle_seconds': battle_seconds, 'analytics_ms': analytics_seconds * 1000,
+                  'replay_ms': max(replay_seconds) * 1000, 'kills': int(kills.sum()), 'lies': int(lies.sum())}
+        print(f"{len(log):,} events over {ticks} ticks of {wizards:,} wizards: {size / 2 ** 20:.1f} MiB ({RECORD.itemsize} bytes each),",
+              f"battle with logging {battle_seconds:.1f} s")
+        print(f"mmap analytics (kills per tick, false statements) {analytics_seconds * 1000:.1f} ms:",
+              f"{int(kills.sum()):,} kills, busiest tick {int(kills_per_tick.argmax())}, {int(lies.sum()):,} false statements")
+        print(f"replay to any tick from the last snapshot: {max(replay_seconds) * 1000:.0f} ms at most, matches the live world")
+        print(log.event(int(np.flatnonzero(kills)[0])))
+        del log, records
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_event_log()
@@ -21,9 +21,6 @@ It approximates the result already in the polynomial, i.e. if you apply Cartesia
 import random
 import numpy as np
 
-from matplotlib import pyplot
-from mpl_toolkits.mplot3d import Axes3D
-
 from typing import Callable
 
 from functools import lru_cache
@@ -175,6 +172,7 @@ def es_comma(objective: Callable[[float,float], float],
  
  
 def plot_function(r_min, r_max)->None:
+    from matplotlib import pyplot # imported here so the module doesn't pull in matplotlib
     x_axis = np.arange(r_min, r_max, 0.1)
     y_axis = np.arange(r_min, r_max, 0.1)
     x, y = np.meshgrid(x_axis, y_axis)
@@ -185,4 +183,6 @@ def plot_function(r_min, r_max)->None:
     pyplot.show()
     return None
 
-plot_function(-10, 10)
\ No newline at end of file
+
+if __name__ == "__main__":
+    plot_function(-10, 10)
@@ -0,0 +1,297 @@
+"""
+Wizard faces for Battle Wizard Simulator
+
+README goals: Wizards recognize each other's faces. Wizard faces are generated and have
+variations to communicate emotion.
+
+A face is a fixed-length vector of FACE_PARAMS, each in [0, 1], stored as uint8 (20 bytes a
+wizard). Most parameters are identity (head shape, eye spacing, nose, skin and hair tone); the
+last few are EXPRESSIVE (brows, eye openness, smile, open mouth). An emotion is an offset on the
+expressive ones only, so the same wizard angry or afraid still has the same identity, and
+read_emotion() gets the emotion back from the difference.
+
+render() draws faces headless, straight into small grayscale NumPy rasters with coordinate
+masks (ellipses for the head and eyes, bands for brows and mouth), a batch at a time.
+write_pgm() saves one without any image library.
+
+FaceIndex answers "who is this?" with an inverted-file (IVF) index over the identity part of
+the vectors: k-means splits the faces into about sqrt(n) lists, and a query only compares
+against the lists of its few nearest centroids. Among 100k wizards that is a fraction of a
+millisecond per face. Identity confusion comes from the same index: a face seen through
+perception noise, or disguised as someone else with disguise(), is whoever it is nearest to.
+"""
+
+import time
+
+import numpy as np
+
+FACE_PARAMS = (
+    'head_width', 'head_height', 'jaw', 'eye_spacing', 'eye_height', 'eye_size', 'nose_length', 'nose_width',
+    'mouth_width', 'mouth_height', 'ear_size', 'hairline', 'skin', 'hair', 'brow_thickness',
+    # expressive
+    'brow_raise', 'brow_tilt', 'eye_open', 'smile', 'mouth_open',
+)
+PARAM = {name: i for i, name in enumerate(FACE_PARAMS)}
+EXPRESSIVE = np.array([PARAM[p] for p in ('brow_raise', 'brow_tilt', 'eye_open', 'smile', 'mouth_open')])
+IDENTITY = np.array([i for i in range(len(FACE_PARAMS)) if i not in EXPRESSIVE])
+
+# Offsets on the expressive parameters at full intensity
+EMOTION_OFFSETS = {
+    'neutral': {},
+    'happy': {'smile': 0.35, 'eye_open': -0.1, 'brow_raise': 0.05},
+    'sad': {'smile': -0.3, 'brow_tilt': 0.3, 'brow_raise': 0.05, 'eye_open': -0.15},
+    'angry': {'brow_tilt': -0.35, 'brow_raise': -0.2, 'smile': -0.2, 'mouth_open': 0.1},
+    'surprised': {'brow_raise': 0.35, 'eye_open': 0.3, 'mouth_open': 0.4},
+    'afraid': {'brow_raise': 0.25, 'brow_tilt': 0.2, 'eye_open': 0.25, 'mouth_open': 0.2, 'smile': -0.1},
+}
+EMOTIONS = tuple(EMOTION_OFFSETS)
+OFFSETS = np.zeros((len(EMOTIONS), len(FACE_PARAMS)), dtype=np.float32)
+for _i, _emotion in enumerate(EMOTIONS):
+    for _param, _offset in EMOTION_OFFSETS[_emotion].items():
+        OFFSETS[_i, PARAM[_param]] = _offset
+del _i, _emotion, _param, _offset
+
+
+def random_faces(count: int, seed=123)->np.ndarray:
+    """(count, len(FACE_PARAMS)) uint8 faces. Resting expressions sit near the middle so emotions have room."""
+    rng = np.random.default_rng(seed)
+    faces = rng.random((count, len(FACE_PARAMS)), dtype=np.float32)
+    faces[:, EXPRESSIVE] = 0.5 + rng.normal(0.0, 0.05, (count, len(EXPRESSIVE)))
+    return to_bytes(faces)
+
+def to_bytes(faces)->np.ndarray:
+    return np.round(np.clip(faces, 0.0, 1.0) * 255).astype(np.uint8)
+
+def to_floats(faces)->np.ndarray:
+    faces = np.asarray(faces)
+    return faces.astype(np.float32) / 255 if faces.dtype == np.uint8 else faces.astype(np.float32)
+
+
+def express(faces, emotion, amount=1.0)->np.ndarray:
+    """Faces as floats wearing an emotion (a name, or an index per face into EMOTIONS) at some intensity."""
+    faces = to_floats(faces)
+    index = EMOTIONS.index(emotion) if isinstance(emotion, str) else np.asarray(emotion)
+    amount = np.asarray(amount, dtype=np.float32)
+    return np.clip(faces + (amount[..., None] if amount.ndim else amount) * OFFSETS[index], 0.0, 1.0)
+
+def read_emotion(observed, resting)->tuple:
+    """(emotion index, intensity) per face, from how the expressive parameters moved from the resting face."""
+    change = (to_floats(observed) - to_floats(resting))[..., EXPRESSIVE]
+    offsets = OFFSETS[:, EXPRESSIVE]
+    norms = (offsets ** 2).sum(axis=1)
+    norms[0] = 1.0 # neutral has no offset
+    amount = np.maximum(change @ offsets.T / norms, 0.0)
+    # The emotion whose offset explains most of the change, not the one with the largest amount:
+    # afraid overlaps surprised and is smaller, so a surprised face projects onto it further
+    explained = amount ** 2 * norms
+    explained[..., 0] = 0.0
+    best = explained.argmax(axis=-1)
+    strength = np.take_along_axis(amount, best[..., None], axis=-1)[..., 0]
+    faint = strength < 0.25 # below a quarter strength it reads as neutral
+    return np.where(faint, 0, best), np.where(faint, 0.25, strength)
+
+def perceive(faces, noise: float, seed=None)->np.ndarray:
+    """Faces as someone sees them: distance, light and memory blur every parameter."""
+    faces = to_floats(faces)
+    return np.clip(faces + np.random.default_rng(seed).normal(0.0, noise, faces.shape).astype(np.float32), 0.0, 1.0)
+
+def disguise(faces, targets, amount=0.8)->np.ndarray:
+    """Faces made up to look like targets, amount 1 being a perfect copy of the targets' identity."""
+    faces, targets = to_floats(faces), to_floats(targets)
+    disguised = faces.copy()
+    disguised[..., IDENTITY] += amount * (targets[..., IDENTITY] - faces[..., IDENTITY])
+    return disguised
+
+
+# Rendering
+
+def render(faces, size: int = 32, batch: int = 1024)->np.ndarray:
+    """(n, size, size) uint8 grayscale images of faces (uint8 or float vectors)."""
+    faces = np.atleast_2d(to_floats(faces))
+    images = np.empty((len(faces), size, size), dtype=np.uint8)
+    coords = (np.arange(size, dtype=np.float32) + 0.5) / size * 2 - 1
+    u = coords[None, None, :]
+    v = coords[None, :, None]
+    for start in range(0, len(faces), batch):
+        f = faces[start:start + batch]
+        p = {name: f[:, i, None, None] for i, name in enumerate(FACE_PARAMS)}
+        image = np.full((len(f), size, size), 235.0, dtype=np.float32)
+        skin = 120 + 100 * p['skin']
+        hair = 30 + 150 * p['hair']
+
+        # Head, narrowing toward the jaw, with ears and hair over the top
+        a = 0.55 + 0.3 * p['head_width']
+        b = 0.75 + 0.2 * p['head_height']
+        width = np.where(v > 0, a * (0.7 + 0.3 * p['jaw']), a)
+        ears = ((np.abs(u) - a) ** 2 + (v + 0.05) ** 2) <= (0.08 + 0.1 * p['ear_size']) ** 2
+        image = np.where(ears, skin - 20, image)
+        head = (u / width) ** 2 + (v / b) ** 2 <= 1
+        image = np.where(head, skin, image)
+        image = np.where(head & (v < -b + 0.25 + 0.3 * p['hairline']), hair, image)
+
+        # Eyes and brows
+        eye_x = 0.18 + 0.2 * p['eye_spacing']
+        eye_y = -0.15 + 0.2 * (p['eye_height'] - 0.5)
+        rx = 0.07 + 0.07 * p['eye_size']
+        ry = rx * (0.2 + 1.0 * p['eye_open'])
+        eyes = ((np.abs(u) - eye_x) / rx) ** 2 + ((v - eye_y) / ry) ** 2 <= 1
+        image = np.where(eyes, 25.0, image)
+        # Brow height above each eye, tilted so the inner end goes up (sad) or down (angry)
+        inner = np.clip((eye_x - np.abs(u)) / (2 * rx), -0.5, 0.5)
+        brow_y = eye_y - ry - 0.06 - 0.15 * p['brow_raise'] - inner * 0.25 * (p['brow_tilt'] - 0.5)
+        brows = (np.abs(np.abs(u) - eye_x) <= rx * 1.2) & (np.abs(v - brow_y) <= 0.02 + 0.04 * p['brow_thickness'])
+        image = np.where(brows, hair, image)
+
+        # Nose and mouth
+        nose_top = eye_y + 0.05
+        nose = (np.abs(u) <= 0.03 + 0.05 * p['nose_width']) & (v >= nose_top) & (v <= nose_top + 0.15 + 0.2 * p['nose_length'])
+        image = np.where(nose, skin - 35, image)
+        mouth_w = 0.15 + 0.2 * p['mouth_width']
+        mouth_y = 0.4 + 0.2 * (p['mouth_height'] - 0.5) - (p['smile'] - 0.5) * 0.5 * (1 - (u / mouth_w) ** 2)
+        mouth = (np.abs(u) <= mouth_w) & (np.abs(v - mouth_y) <= 0.025 + 0.12 * p['mouth_open'])
+        image = np.where(mouth, 50.0, image)
+        images[start:start + batch] = image.astype(np.uint8)
+    return images
+
+def write_pgm(path: str, image: np.ndarray)->None:
+    """Saves one grayscale image (or a tiled sheet of them) as binary PGM."""
+    image = np.asarray(image, dtype=np.uint8)
+    with open(path, 'wb') as f:
+        f.write(f"P5 {image.shape[1]} {image.shape[0]} 255\n".encode())
+        f.write(image.tobytes())
+
+def tile(images: np.ndarray, columns: int = 8)->np.ndarray:
+    n, h, w = images.shape
+    rows = -(-n // columns)
+    sheet = np.full((rows * h, columns * w), 255, dtype=np.uint8)
+    for i, image in enumerate(images):
+        sheet[(i // columns) * h:(i // columns + 1) * h, (i % columns) * w:(i % columns + 1) * w] = image
+    return sheet
+
+def ascii_art(image: np.ndarray, ramp: str = "@%#*+=-:. ")->str:
+    """A rendered face as text, for looking at faces without a display."""
+    levels = (np.asarray(image, dtype=np.int32) * (len(ramp) - 1) // 255)
+    return '\n'.join(''.join(ramp[l] * 2 for l in row) for row in levels)
+
+
+# Recognition
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = 8, seed=123)->np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        nearest = nearest_centroid(vectors, centroids)
+        counts = np.bincount(nearest, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, nearest, vectors)
+        filled = counts > 0 # an empty cluster keeps its centroid
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+def nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 16384)->np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int64)
+    c2 = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        out[start:start + chunk] = (c2[None, :] - 2 * block @ centroids.T).argmin(axis=1)
+    return out
+
+
+class FaceIndex:
+    """IVF index over the identity parameters of a bank of faces; ids are rows of the bank."""
+    def __init__(self, faces, lists: int = None, probes: int = 8, iterations: int = 8, sample: int = 20000, seed=123):
+        vectors = to_floats(faces)[:, IDENTITY]
+        lists = lists or max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(seed)
+        training = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+        self.centroids = kmeans(training, min(lists, len(training)), iterations, seed)
+        assigned = nearest_centroid(vectors, self.centroids)
+        self.ids = np.argsort(assigned, kind='stable')
+        self.vectors = vectors[self.ids] # grouped by list, so each list is one slice
+        self.offsets = np.searchsorted(assigned[self.ids], np.arange(len(self.centroids) + 1))
+        self.probes = probes
+
+    def __len__(self)->int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self)->int:
+        return self.centroids.nbytes + self.ids.nbytes + self.vectors.nbytes + self.offsets.nbytes
+
+    def search(self, faces, probes: int = None)->tuple:
+        """(ids, squared distances) of the nearest face to each query face, looking in the nearest probes lists."""
+        queries = np.atleast_2d(to_floats(faces))[:, IDENTITY]
+        probes = min(probes or self.probes, len(self.centroids))
+        c2 = (self.centroids ** 2).sum(axis=1)
+        lists = np.argpartition(c2[None, :] - 2 * queries @ self.centroids.T, probes - 1, axis=1)[:, :probes]
+        lo, hi = self.offsets[lists], self.offsets[lists + 1]
+        counts = (hi - lo).ravel()
+        # Every candidate of every query, flat and grouped by query
+        run_start = np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(lo.ravel(), counts) + np.arange(counts.sum()) - run_start
+        query = np.repeat(np.repeat(np.arange(len(queries)), probes), counts)
+        d2 = ((self.vectors[positions] - queries[query]) ** 2).sum(axis=1)
+        per_query = np.bincount(query, minlength=len(queries))
+        starts = np.r_[0, np.cumsum(per_query)[:-1]]
+        best = np.full(len(queries), -1, dtype=np.int64)
+        distance = np.full(len(queries), np.inf, dtype=np.float32)
+        has = per_query > 0
+        if has.any():
+            # Candidates are already grouped by query, so each group's minimum is a reduceat
+            mins = np.minimum.reduceat(d2, starts[has])
+            at_min = d2 == np.repeat(mins, per_query[has])
+            first = np.minimum.reduceat(np.where(at_min, np.arange(len(d2)), len(d2)), starts[has])
+            best[has] = self.ids[positions[first]]
+            distance[has] = mins
+        return best, distance
+
+    def identify(self, faces, max_distance: float = 0.05, probes: int = None)->np.ndarray:
+        """Who each face is, -1 for a stranger (no face within max_distance, in identity parameter units)."""
+        ids, d2 = self.search(faces, probes)
+        ids[d2 > max_distance ** 2 * len(IDENTITY)] = -1
+        return ids
+
+
+def benchmark_faces(count=100000, queries=1000, seed=123)->dict:
+    rng = np.random.default_rng(seed)
+    bank = random_faces(count, seed)
+    started = time.perf_counter()
+    index = FaceIndex(bank, seed=seed)
+    build_seconds = time.perf_counter() - started
+
+    # Wizards seen across the battlefield wearing some emotion
+    who = rng.choice(count, queries, replace=False)
+    emotion = rng.integers(0, len(EMOTIONS), queries)
+    seen = perceive(express(bank[who], emotion, rng.uniform(0.5, 1.0, queries).astype(np.float32)), 0.02, seed)
+    started = time.perf_counter()
+    for face in seen:
+        index.search(face)
+    single_seconds = (time.perf_counter() - started) / queries
+    started = time.perf_counter()
+    found, _ = index.search(seen)
+    batch_seconds = (time.perf_counter() - started) / queries
+
+    # Exact nearest neighbour, to see what the index misses
+    exact = np.array([((to_floats(bank)[:, IDENTITY] - face[IDENTITY]) ** 2).sum(axis=1).argmin() for face in seen[:200]])
+    recall = float((found[:200] == exact).mean())
+    read, _ = read_emotion(seen, bank[who])
+    # Identity confusion on purpose: disguised as another wizard
+    targets = rng.choice(count, queries)
+    fooled = float((index.search(disguise(bank[who], bank[targets], 0.9))[0] == targets).mean())
+
+    images = render(seen[:64])
+    result = {'faces': count, 'bank_bytes': bank.nbytes, 'index_bytes': index.nbytes, 'build_seconds': build_seconds,
+              'single_query_us': single_seconds * 1e6, 'batch_query_us': batch_seconds * 1e6, 'recall': recall,
+              'identified': float((found == who).mean()), 'emotion_read': float((read == emotion).mean()), 'fooled': fooled}
+    print(f"{count:,} faces: {bank.nbytes / 2 ** 20:.1f} MiB as uint8, index {index.nbytes / 2 ** 20:.1f} MiB built in {build_seconds:.1f} s")
+    print(f"who is this? {single_seconds * 1e6:.0f} us per face ({batch_seconds * 1e6:.0f} us batched),",
+          f"{result['identified']:.1%} right through emotion and noise, recall vs exact {recall:.1%}")
+    print(f"emotions read right {result['emotion_read']:.1%}, disguised wizards taken for their target {fooled:.1%}")
+    resting, angry = render(bank[who[0]], 20)[0], render(express(bank[who[0]], 'angry'), 20)[0]
+    print('\n'.join(a + '    ' + b for a, b in zip(ascii_art(resting).split('\n'), ascii_art(angry).split('\n'))))
+    assert images.shape == (64, 32, 32)
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_faces()
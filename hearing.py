@@ -0,0 +1,153 @@
+"""
+Hearing for Battle Wizard Simulator
+
+README view goal 4: statements are sound and drop off with the square of the distance between
+wizards. An utterance spoken with loudness L reaches a listener at distance d with intensity
+
+    L / d^2 (d taken as at least 1)
+
+and is heard at all only above the audibility threshold, so every utterance has an audible
+radius sqrt(L / threshold). Listeners are found with a spatial_grid.SpatialGrid over the
+conscious entities, so a tick of utterances is near-linear in the number of wizards instead of
+every utterance going to every wizard.
+
+Everything after that is one vectorized pass over all (utterance, listener) pairs: intensity,
+clarity (intensity relative to the level at which speech is heard perfectly), and what each
+listener actually heard. Utterances are arrays of token ids into a vocabulary. Each token is
+misheard with probability 1 - clarity, and a misheard token becomes a sound-alike word (same
+length and first letter) when there is one, or is lost. Far-away wizards hear the wrong target
+or the wrong verb, which is where miscommunication comes from.
+"""
+
+import time
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from entity_store import CONSCIOUS, EntityStore
+from spatial_grid import SpatialGrid, brute_force_query
+
+THRESHOLD = 0.01 # quietest intensity that is heard at all
+CLEAR = 0.1 # intensity at and above which every token is heard right
+LOST = -1 # a token that wasn't heard, also the padding of short utterances
+
+
+@dataclass
+class Heard:
+    """One row per (utterance, listener) pair that was in earshot."""
+    utterance: np.ndarray
+    listener: np.ndarray
+    intensity: np.ndarray
+    tokens: np.ndarray # (pairs, length) token ids as heard, LOST where nothing came through
+
+    def __len__(self)->int:
+        return len(self.listener)
+
+
+def confusion_table(vocabulary: list, width: int = 4, seed=123)->np.ndarray:
+    """(words, width) token ids a word can be misheard as: other words of the same length and first letter, LOST when there are none."""
+    rng = np.random.default_rng(seed)
+    groups = {}
+    for i, word in enumerate(vocabulary):
+        groups.setdefault((len(word), word[:1]), []).append(i)
+    table = np.full((len(vocabulary), width), LOST, dtype=np.int32)
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members = np.array(members, dtype=np.int32)
+        for column in range(width):
+            # A random other member: shift each one's position in the group by 1..n-1
+            shift = rng.integers(1, len(members), len(members))
+            table[members, column] = members[(np.arange(len(members)) + shift) % len(members)]
+    return table
+
+
+class Hearing:
+    def __init__(self, vocabulary: list, threshold: float = THRESHOLD, clear: float = CLEAR, width: int = 4, seed=123):
+        self.vocabulary = list(vocabulary)
+        self.index = {word: i for i, word in enumerate(self.vocabulary)}
+        self.threshold = threshold
+        self.clear = clear
+        self.confusions = confusion_table(self.vocabulary, width, seed)
+        self.rng = np.random.default_rng(seed)
+
+    def encode(self, sentences: list)->np.ndarray:
+        """Sentences (strings or token lists) as a padded (n, longest) array of token ids."""
+        sentences = [s.split() if isinstance(s, str) else s for s in sentences]
+        tokens = np.full((len(sentences), max(map(len, sentences), default=0)), LOST, dtype=np.int32)
+        for i, words in enumerate(sentences):
+            tokens[i, :len(words)] = [self.index[w] for w in words]
+        return tokens
+
+    def words(self, tokens)->list:
+        """Token ids back to words, '...' where a token was lost."""
+        return ['...' if t == LOST else self.vocabulary[t] for t in np.asarray(tokens).tolist()]
+
+    def radius(self, loudness)->np.ndarray:
+        return np.sqrt(np.asarray(loudness, dtype=np.float64) / self.threshold)
+
+    def hear(self, store: EntityStore, speakers, loudness, tokens: np.ndarray, grid: SpatialGrid = None)->Heard:
+        """
+        Everyone conscious hears every utterance in earshot, speaker i saying tokens[i] at loudness[i].
+        Pass a grid over the conscious entities to share one between systems in a tick.
+        """
+        speakers = np.asarray(speakers, dtype=np.int64)
+        loudness = np.broadcast_to(np.asarray(loudness, dtype=np.float64), speakers.shape)
+        x, y = store['x'], store['y']
+        if grid is None:
+            listeners = np.flatnonzero(store.flags[:len(store)] & CONSCIOUS)
+            grid = SpatialGrid(x[listeners], y[listeners], self.radius(loudness.max(initial=0.0)), listeners)
+        utterance, listener, d2 = grid.query(x[speakers], y[speakers], self.radius(loudness))
+        others = listener != speakers[utterance]
+        utterance, listener, d2 = utterance[others], listener[others], d2[others]
+
+        intensity = loudness[utterance] / np.maximum(d2, 1.0)
+        clarity = np.minimum(intensity / self.clear, 1.0)
+        heard = tokens[utterance]
+        misheard = (heard != LOST) & (self.rng.random(heard.shape) >= clarity[:, None])
+        choice = self.rng.integers(0, self.confusions.shape[1], int(misheard.sum()))
+        heard[misheard] = self.confusions[heard[misheard], choice]
+        return Heard(utterance=utterance, listener=listener, intensity=intensity, tokens=heard)
+
+
+def benchmark_hearing(counts=(1000, 10000, 100000), density=0.01, speaking=0.1, seed=123)->list[dict]:
+    import lexicon_store
+    import world_updater
+    vocabulary = sorted({r['wz'] for r in lexicon_store.synthetic_records(5000, seed)})
+    hearing = Hearing(vocabulary, seed=seed)
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in counts:
+        store = world_updater.battle_store(n, seed)
+        side = np.sqrt(n / density)
+        store['x'][:] = rng.uniform(0, side, n)
+        store['y'][:] = rng.uniform(0, side, n)
+        speakers = rng.choice(n, int(n * speaking), replace=False)
+        loudness = rng.uniform(1.0, 4.0, len(speakers)) # heard out to 10-20 units
+        tokens = rng.integers(0, len(vocabulary), (len(speakers), 6)).astype(np.int32)
+
+        started = time.perf_counter()
+        heard = hearing.hear(store, speakers, loudness, tokens)
+        seconds = time.perf_counter() - started
+        if n <= 10000:
+            # Same listeners as checking every pair
+            q, p, _ = brute_force_query(store['x'], store['y'], store['x'][speakers], store['y'][speakers], hearing.radius(loudness))
+            keep = p != speakers[q]
+            assert sorted(zip(q[keep].tolist(), p[keep].tolist())) == sorted(zip(heard.utterance.tolist(), heard.listener.tolist()))
+
+        changed = (heard.tokens != tokens[heard.utterance]).mean(axis=1)
+        # Inner half of each utterance's earshot vs the outer half
+        near = heard.intensity >= loudness[heard.utterance] / (hearing.radius(loudness)[heard.utterance] / 2) ** 2
+        results.append({'wizards': n, 'utterances': len(speakers), 'pairs': len(heard), 'seconds': seconds,
+                        'misheard_near': float(changed[near].mean()), 'misheard_far': float(changed[~near].mean())})
+        print(f"{n:,} wizards, {len(speakers):,} utterances: {seconds * 1000:.1f} ms ({seconds / len(speakers) * 1e6:.1f} us/utterance),",
+              f"{len(heard):,} hearings, tokens misheard {changed[near].mean():.0%} in the inner half of earshot vs {changed[~near].mean():.0%} further off")
+    far = int(np.argmin(heard.intensity))
+    print(f"said:  {' '.join(hearing.words(tokens[heard.utterance[far]]))}\nheard: {' '.join(hearing.words(heard.tokens[far]))}",
+          f"(intensity {heard.intensity[far]:.3f})")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_hearing()
@@ -0,0 +1,301 @@
+"""
+Intent scheduler for Battle Wizard Simulator
+
+From the README: Intent could be modeled as a queue that holds Sentences where the Wizard reads
+them and acts on them. Every agent has a small FIFO of intents, each one act in the same shape
+world_updater takes (verb id, aspect flags, agent, patient, spell or statement), and the
+scheduler decides when each agent gets to act on the next one:
+
+* IntentQueues keeps every agent's FIFO as a ring buffer inside one shared array, depth slots per
+  agent, so pushing and popping thousands of intents are a handful of NumPy operations and there
+  is no per-agent object.
+* A global heap of (next action time, agent) holds every agent that has something to do. After
+  acting, an agent is due again after its reaction time, if it still has intents.
+* dispatch() pops every agent that is due before a time, takes one intent from each, groups the
+  acts by verb and calls each verb's handler once with arrays, so all the kills of a tick are one
+  call. updater_handler() sends them on to a world_updater.Updater.
+
+run() steps simulated time tick by tick. run_async() does the same on a real-time asyncio clock,
+and console() reads the user wizard's commands from stdin (or any async line source) into that
+wizard's queue while the clock runs, so the user acts through the same queue as everyone else.
+"""
+
+import argparse
+import asyncio
+import heapq
+import sys
+import time
+
+from typing import AsyncIterator, Callable
+
+import numpy as np
+
+import world_updater
+
+from world_updater import DEFAULT_VERB_IDS, WORLD_VERBS
+
+# Columns of an intent
+VERB, FLAGS, AGENT, PATIENT, SPELL = range(5)
+INTENT_FIELDS = ('verb', 'flags', 'agent', 'patient', 'spell')
+
+Handler = Callable[["IntentScheduler", np.ndarray, np.ndarray], None]
+
+
+class IntentQueues:
+    def __init__(self, agents: int, depth: int = 8):
+        depth = 1 << max(0, (depth - 1).bit_length()) # a power of two so wrapping is a mask
+        self.depth = depth
+        self.intents = np.zeros((agents * depth, len(INTENT_FIELDS)), dtype=np.int32)
+        self.head = np.zeros(agents, dtype=np.int32)
+        self.count = np.zeros(agents, dtype=np.int32)
+
+    def __len__(self)->int:
+        return int(self.count.sum())
+
+    def push(self, agent: int, intent)->bool:
+        """Queues one intent (a row of INTENT_FIELDS). False if the agent's queue is full."""
+        count = self.count.item(agent)
+        if count == self.depth:
+            return False
+        self.intents[agent * self.depth + ((self.head.item(agent) + count) & (self.depth - 1))] = intent
+        self.count[agent] = count + 1
+        return True
+
+    def push_many(self, agents, intents)->np.ndarray:
+        """Queues intents[i] for agents[i] in order; returns which ones fit."""
+        agents = np.asarray(agents, dtype=np.int64)
+        order = np.argsort(agents, kind='stable')
+        sorted_agents = agents[order]
+        # How many intents for the same agent come earlier in this batch
+        starts = np.flatnonzero(np.r_[True, sorted_agents[1:] != sorted_agents[:-1]])
+        earlier = np.empty(len(agents), dtype=np.int64)
+        earlier[order] = np.arange(len(agents)) - np.repeat(starts, np.diff(np.r_[starts, len(agents)]))
+        position = self.count[agents] + earlier
+        fits = position < self.depth
+        slots = agents[fits] * self.depth + ((self.head[agents[fits]] + position[fits]) & (self.depth - 1))
+        self.intents[slots] = np.asarray(intents)[fits]
+        self.count += np.bincount(agents[fits], minlength=len(self.count)).astype(np.int32)
+        return fits
+
+    def pop_many(self, agents: np.ndarray)->np.ndarray:
+        """The next intent of each agent, which must be distinct and have one queued."""
+        intents = self.intents[agents * self.depth + self.head[agents]]
+        self.head[agents] = (self.head[agents] + 1) & (self.depth - 1)
+        self.count[agents] -= 1
+        return intents
+
+
+class IntentScheduler:
+    def __init__(self, agents: int, depth: int = 8, reaction=1.0, start: float = 0.0):
+        self.queues = IntentQueues(agents, depth)
+        self.reaction = np.broadcast_to(np.asarray(reaction, dtype=np.float64), (agents,))
+        self.next_time = np.full(agents, start, dtype=np.float64)
+        self.now = start
+        self.handlers = {}
+        self.default = None
+        self.dispatched = 0
+        self._heap = []
+        self._scheduled = np.zeros(agents, dtype=bool)
+
+    def on(self, verb: int, handler: Handler)->None:
+        """Calls handler(scheduler, agents, intents) with every intent for this verb id in a dispatch."""
+        self.handlers[verb] = handler
+
+    def _schedule(self, agents: np.ndarray)->None:
+        agents = agents[~self._scheduled[agents]]
+        if not len(agents):
+            return
+        self._scheduled[agents] = True
+        times = np.maximum(self.next_time[agents], self.now)
+        entries = zip(times.tolist(), agents.tolist())
+        if len(agents) > len(self._heap):
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+
+    def intend(self, agent: int, verb: int, patient: int, spell: bool = True, flags: int = 0, actor: int = None)->bool:
+        """Queues one intent for agent. actor is who the act is by, the agent itself unless it's a statement about someone else."""
+        if not self.queues.push(agent, (verb, flags, agent if actor is None else actor, patient, spell)):
+            return False
+        self._schedule(np.array([agent]))
+        return True
+
+    def intend_many(self, agents, verbs, patients, spell=True, flags=0, actors=None)->np.ndarray:
+        agents = np.asarray(agents, dtype=np.int64)
+        intents = np.empty((len(agents), len(INTENT_FIELDS)), dtype=np.int32)
+        intents[:, VERB] = verbs
+        intents[:, FLAGS] = flags
+        intents[:, AGENT] = agents if actors is None else actors
+        intents[:, PATIENT] = patients
+        intents[:, SPELL] = spell
+        fits = self.queues.push_many(agents, intents)
+        self._schedule(np.unique(agents[fits]))
+        return fits
+
+    def dispatch(self, until: float)->int:
+        """Every agent due before until acts on its next intent. Returns how many acted."""
+        heap = self._heap
+        pop = heapq.heappop
+        times, due = [], []
+        while heap and heap[0][0] < until:
+            t, agent = pop(heap)
+            times.append(t)
+            due.append(agent)
+        if not due:
+            return 0
+        agents = np.array(due, dtype=np.int64)
+        intents = self.queues.pop_many(agents)
+        self.next_time[agents] = np.array(times) + self.reaction[agents]
+        self._scheduled[agents] = False
+        self._schedule(agents[self.queues.count[agents] > 0])
+
+        # One call per verb; agents stay in heap order within a verb
+        order = np.argsort(intents[:, VERB], kind='stable')
+        verbs = intents[order, VERB]
+        bounds = np.flatnonzero(np.r_[True, verbs[1:] != verbs[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            group = order[lo:hi]
+            handler = self.handlers.get(int(verbs[lo]), self.default)
+            if handler is not None:
+                handler(self, agents[group], intents[group])
+        self.dispatched += len(due)
+        return len(due)
+
+    def step(self, tick: float = 1.0, on_tick: Callable[["IntentScheduler"], None] = None)->int:
+        acted = self.dispatch(self.now + tick)
+        if on_tick is not None:
+            on_tick(self)
+        self.now += tick
+        return acted
+
+    def run(self, until: float, tick: float = 1.0, on_tick: Callable[["IntentScheduler"], None] = None)->int:
+        acted = 0
+        while self.now < until:
+            acted += self.step(tick, on_tick)
+        return acted
+
+    async def run_async(self, tick: float = 0.1, until: float = None, on_tick=None, speed: float = 1.0)->None:
+        """run() on a real-time clock, speed simulated seconds per second, yielding to other tasks between ticks."""
+        while until is None or self.now < until:
+            started = time.perf_counter()
+            self.step(tick, on_tick)
+            await asyncio.sleep(max(0.0, tick / speed - (time.perf_counter() - started)))
+
+
+def updater_handler(updater: world_updater.Updater)->Handler:
+    """A handler that submits its acts to a world updater, for the next updater.tick()."""
+    def submit(scheduler, agents, intents):
+        updater.submit_many(agents, intents[:, VERB], intents[:, AGENT], intents[:, PATIENT], intents[:, SPELL] != 0)
+    return submit
+
+
+# Console front-end
+
+def parse_command(line: str, verb_ids: dict = None)->tuple:
+    """
+    'kill 12' casts kill on row 12, 'say kill 12 3' claims row 3 killed row 12 (the actor defaults
+    to the speaker). Returns (verb id, patient, spell, actor or None).
+    """
+    verb_ids = DEFAULT_VERB_IDS if verb_ids is None else verb_ids
+    words = line.split()
+    spell = not (words and words[0] == 'say')
+    if not spell:
+        words = words[1:]
+    if len(words) not in (2, 3) or words[0] not in verb_ids or not all(w.isdigit() for w in words[1:]):
+        raise ValueError(f"Expected '[say] <{'|'.join(WORLD_VERBS)}> <target row> [<actor row>]', got {line!r}")
+    actor = int(words[2]) if len(words) == 3 else None
+    return verb_ids[words[0]], int(words[1]), spell, actor
+
+
+async def stdin_lines()->AsyncIterator[str]:
+    while True:
+        line = await asyncio.to_thread(sys.stdin.readline)
+        if not line:
+            return
+        yield line
+
+
+async def console(scheduler: IntentScheduler, agent: int, lines: AsyncIterator[str] = None,
+                  parse=parse_command, tick: float = 0.1, speed: float = 1.0, on_tick=None, echo=print)->None:
+    """The user wizard's commands go into its intent queue while the scheduler runs in real time."""
+    clock = asyncio.create_task(scheduler.run_async(tick, on_tick=on_tick, speed=speed))
+    try:
+        async for line in (stdin_lines() if lines is None else lines):
+            line = line.strip()
+            if not line:
+                continue
+            if line in ('quit', 'exit'):
+                break
+            try:
+                verb, patient, spell, actor = parse(line)
+            except ValueError as e:
+                echo(e)
+                continue
+            if not scheduler.intend(agent, verb, patient, spell=spell, actor=actor):
+                echo("Too much on your mind, that intent was dropped.")
+    finally:
+        clock.cancel()
+
+
+def battle(wizards: int, intents_per_wizard: int = 8, depth: int = 8, seed=123):
+    """A battle store, an updater, and a scheduler with every wizard's queue filled with random acts."""
+    rng = np.random.default_rng(seed)
+    store = world_updater.battle_store(wizards, seed)
+    updater = world_updater.Updater(store)
+    scheduler = IntentScheduler(wizards, depth, reaction=rng.uniform(0.5, 1.5, wizards))
+    scheduler.default = updater_handler(updater)
+    count = wizards * intents_per_wizard
+    _, verbs, _, patients, spell = world_updater.random_acts(store, count, seed=seed)
+    scheduler.intend_many(np.repeat(np.arange(wizards), intents_per_wizard), verbs, patients, spell)
+    return store, updater, scheduler
+
+
+def benchmark_scheduler(agent_counts=(1000, 10000, 100000), intents_per_wizard=8, seed=123)->list[dict]:
+    results = []
+    for wizards in agent_counts:
+        store, updater, scheduler = battle(wizards, intents_per_wizard, seed=seed)
+        queued = len(scheduler.queues)
+        started = time.perf_counter()
+        scheduler.run(until=20.0, tick=0.25, on_tick=lambda s: updater.tick())
+        seconds = time.perf_counter() - started
+        assert scheduler.dispatched == queued and not len(scheduler.queues)
+
+        # Dispatch alone, acts handed to a handler that does nothing
+        _, _, bare = battle(wizards, intents_per_wizard, seed=seed)
+        bare.default = lambda s, agents, intents: None
+        started = time.perf_counter()
+        bare.run(until=20.0, tick=0.25)
+        bare_seconds = time.perf_counter() - started
+
+        results.append({'agents': wizards, 'actions': queued, 'actions_per_second': queued / seconds,
+                        'dispatch_per_second': queued / bare_seconds})
+        print(f"{wizards:,} agents: {queued:,} actions, {queued / seconds:,.0f}/s with world ticks,",
+              f"{queued / bare_seconds:,.0f}/s dispatch only, {int(store['alive'].sum()):,} left alive")
+
+    # The console wizard's commands go through its queue like everyone else's
+    store, updater, scheduler = battle(16, 0, seed=seed)
+    heard = []
+    scheduler.on(DEFAULT_VERB_IDS['kill'], lambda s, agents, intents: heard.extend(intents[:, PATIENT].tolist()))
+    async def typed():
+        for line in ('kill 3', 'what', 'kill 5'):
+            yield line
+        await asyncio.sleep(0.05)
+    asyncio.run(console(scheduler, 0, typed(), tick=0.1, speed=100.0, echo=lambda message: None))
+    assert heard == [3, 5], heard
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intent scheduler benchmark, or --console to play a wizard")
+    parser.add_argument('--console', action='store_true', help="type commands for wizard 0 in a battle")
+    parser.add_argument('--wizards', type=int, default=1000)
+    args = parser.parse_args()
+    if args.console:
+        store, updater, scheduler = battle(args.wizards)
+        print(f"You are wizard 0 among {args.wizards} wizards. Commands: [say] <{'|'.join(WORLD_VERBS)}> <row> [<actor row>], quit")
+        asyncio.run(console(scheduler, 0, on_tick=lambda s: updater.tick()))
+        print(f"{int(store['alive'].sum())} wizards alive, you are {'alive' if store['alive'][0] else 'dead'}.")
+    else:
+        benchmark_scheduler()
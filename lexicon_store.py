@@ -0,0 +1,290 @@
+"""
+Columnar Lexicon Store for Wizard Language
+
+The lexicon in wizard_language.py is three dicts (lexicon_en, lexicon_jp, lexicon_wz) of
+per-lexeme dicts. That is fine for a handful of words, but a closed-world game lexicon runs to
+tens of thousands of entries, and every worker process would hold its own copy of all of them.
+
+LexiconStore keeps the same information as a struct of arrays:
+
+    ids      int32   lexeme id, the one action_classes.py references
+    classes  uint8   index into the class names ('noun', 'verb', 'particle', ...)
+    en/jp/wz int32   interned string IDs into one shared string table
+
+It saves to a single compact file, and load() memory-maps it, so the columns are NumPy views
+straight onto the file. Worker processes that load the same file share its pages through the OS
+instead of each unpickling a copy. The only per-process state is the surface form indexes,
+plain dicts built the first time a script is looked up.
+
+File layout, all little-endian:
+
+    header   magic 'WZLX', version, rows, strings, classes, id table size, blob bytes
+    int32    ids[rows], en[rows], jp[rows], wz[rows]
+    int32    class_names[classes] (string IDs)
+    int32    row_of_id[id table size], -1 where there is no lexeme
+    uint32   string_offsets[strings + 1]
+    uint8    classes[rows]
+    bytes    UTF-8 string blob
+"""
+
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+import numpy as np
+
+MAGIC = b'WZLX'
+VERSION = 1
+HEADER = struct.Struct('<4s6I')
+
+SCRIPTS = ('en', 'jp', 'wz')
+
+CLASSES = ('noun', 'verb', 'particle', 'determiner', 'modifier')
+
+
+class LexiconStore:
+    def __init__(self, ids, classes, en, jp, wz, class_names, row_of_id, string_offsets, blob, source=None):
+        self.ids = ids
+        self.classes = classes
+        self.columns = {'en': en, 'jp': jp, 'wz': wz}
+        self.class_names = class_names # string IDs
+        self.row_of_id = row_of_id
+        self.string_offsets = string_offsets
+        self.blob = blob
+        self.source = source # the mmap, kept open while the arrays point into it
+        self._strings = {} # string ID -> interned str, filled lazily
+        self._indexes = {} # script -> {surface: row}
+
+    @classmethod
+    def from_records(cls, records)->"LexiconStore":
+        """
+        Builds a store from lexeme dicts shaped like wizard_language.lexeme_example_noun.
+        Wizard Language forms must be unique; it is a language with no homophones.
+        """
+        records = sorted(records, key=lambda lex: lex['id'])
+        strings = []
+        string_ids = {}
+        def intern(s):
+            if s not in string_ids:
+                string_ids[s] = len(strings)
+                strings.append(s)
+            return string_ids[s]
+
+        class_names = list(CLASSES)
+        seen_ids = set()
+        seen_wz = set()
+        columns = {script: [] for script in SCRIPTS}
+        ids, classes = [], []
+        for lex in records:
+            if lex['id'] in seen_ids:
+                raise ValueError(f"Duplicate lexeme id {lex['id']}.")
+            if lex['wz'] in seen_wz:
+                raise ValueError(f"Duplicate Wizard Language form {lex['wz']!r}.")
+            seen_ids.add(lex['id'])
+            seen_wz.add(lex['wz'])
+            if lex['class'] not in class_names:
+                class_names.append(lex['class'])
+            ids.append(lex['id'])
+            classes.append(class_names.index(lex['class']))
+            for script in SCRIPTS:
+                columns[script].append(intern(lex[script]))
+        class_name_ids = [intern(name) for name in class_names]
+
+        ids = np.array(ids, dtype=np.int32)
+        row_of_id = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+        row_of_id[ids] = np.arange(len(ids), dtype=np.int32)
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+        return cls(ids,
+                   np.array(classes, dtype=np.uint8),
+                   np.array(columns['en'], dtype=np.int32),
+                   np.array(columns['jp'], dtype=np.int32),
+                   np.array(columns['wz'], dtype=np.int32),
+                   np.array(class_name_ids, dtype=np.int32),
+                   row_of_id,
+                   offsets,
+                   b''.join(encoded))
+
+    @classmethod
+    def from_lexicons(cls, *lexicons: dict)->"LexiconStore":
+        # Same lexeme can be listed in several lexicons (en, jp, wz); keep one per id
+        by_id = {}
+        for lexicon in lexicons:
+            for lex in lexicon.values():
+                by_id[lex['id']] = lex
+        return cls.from_records(by_id.values())
+
+    def save(self, path: str)->None:
+        arrays = [
+            self.ids.astype('<i4'),
+            self.columns['en'].astype('<i4'),
+            self.columns['jp'].astype('<i4'),
+            self.columns['wz'].astype('<i4'),
+            self.class_names.astype('<i4'),
+            self.row_of_id.astype('<i4'),
+            self.string_offsets.astype('<u4'),
+            self.classes.astype('u1'),
+        ]
+        header = HEADER.pack(MAGIC, VERSION, len(self.ids), len(self.string_offsets) - 1,
+                             len(self.class_names), len(self.row_of_id), len(self.blob))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            for array in arrays:
+                f.write(array.tobytes())
+            f.write(bytes(self.blob))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str)->"LexiconStore":
+        """Memory-maps a saved store. The columns are read-only views onto the file."""
+        with open(path, 'rb') as f:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, strings, num_classes, id_table, blob_bytes = HEADER.unpack_from(source, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} lexicon store.")
+        offset = HEADER.size
+        def take(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(source, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+        ids = take('<i4', rows)
+        en = take('<i4', rows)
+        jp = take('<i4', rows)
+        wz = take('<i4', rows)
+        class_names = take('<i4', num_classes)
+        row_of_id = take('<i4', id_table)
+        string_offsets = take('<u4', strings + 1)
+        classes = take('u1', rows)
+        blob = memoryview(source)[offset:offset + blob_bytes]
+        return cls(ids, classes, en, jp, wz, class_names, row_of_id, string_offsets, blob, source)
+
+    def __len__(self)->int:
+        return len(self.ids)
+
+    def string(self, string_id: int)->str:
+        s = self._strings.get(string_id)
+        if s is None:
+            start, end = int(self.string_offsets[string_id]), int(self.string_offsets[string_id + 1])
+            s = sys.intern(bytes(self.blob[start:end]).decode('utf-8'))
+            self._strings[string_id] = s
+        return s
+
+    def row(self, lexeme_id: int)->int:
+        if 0 <= lexeme_id < len(self.row_of_id):
+            row = int(self.row_of_id[lexeme_id])
+            if row >= 0:
+                return row
+        raise KeyError(lexeme_id)
+
+    def surface(self, lexeme_id: int, script: str = 'wz')->str:
+        return self.string(int(self.columns[script][self.row(lexeme_id)]))
+
+    def class_of(self, lexeme_id: int)->str:
+        return self.string(int(self.class_names[self.classes[self.row(lexeme_id)]]))
+
+    def index(self, script: str)->dict:
+        """Surface form -> row for one script, built on first use. The first lexeme wins a shared form."""
+        index = self._indexes.get(script)
+        if index is None:
+            index = {}
+            for row, string_id in enumerate(self.columns[script].tolist()):
+                index.setdefault(self.string(string_id), row)
+            self._indexes[script] = index
+        return index
+
+    def lookup(self, surface: str, script: str = 'wz')->int:
+        """Lexeme id for a surface form."""
+        return int(self.ids[self.index(script)[surface]])
+
+    def lexeme(self, lexeme_id: int)->dict:
+        # Same shape as the wizard_language lexeme dicts
+        row = self.row(lexeme_id)
+        lex = {'id': int(self.ids[row])}
+        for script in SCRIPTS:
+            lex[script] = self.string(int(self.columns[script][row]))
+        lex['class'] = self.string(int(self.class_names[self.classes[row]]))
+        return lex
+
+    def of_class(self, name: str)->np.ndarray:
+        """Lexeme ids of one class, e.g. every noun."""
+        names = [self.string(int(s)) for s in self.class_names]
+        if name not in names:
+            return np.zeros(0, dtype=np.int32)
+        return self.ids[self.classes == names.index(name)]
+
+
+def default_store()->LexiconStore:
+    """The lexicon as currently written in wizard_language.py."""
+    import wizard_language as wl
+    examples = [wl.lexeme_example_noun, wl.lexeme_example_verb,
+                wl.lexeme_example_particle, wl.lexeme_example_determiner]
+    return LexiconStore.from_lexicons({lex['wz']: lex for lex in examples},
+                                      wl.lexicon_en, wl.lexicon_jp, wl.lexicon_wz)
+
+
+def synthetic_records(size: int, seed=123)->list[dict]:
+    # Unique made-up lexemes for load testing, built from wizard_names.yml style syllables
+    rng = random.Random(seed)
+    onsets = 'ktrnshmdgzcbp'
+    vowels = 'auoie'
+    finals = ['', '', '', 'n', 'm', 'ng', 'c', 'q', 'k', 'p']
+    classes = ['noun'] * 6 + ['verb'] * 3 + ['modifier']
+    seen = set()
+    records = []
+    while len(records) < size:
+        wz = ''.join(rng.choice(onsets) + rng.choice(vowels) + rng.choice(finals) for _ in range(rng.randint(2, 4)))
+        if wz in seen:
+            continue
+        seen.add(wz)
+        i = len(records)
+        records.append({'id': i, 'en': f'word{i}', 'jp': f'kotoba{i}', 'wz': wz, 'class': rng.choice(classes)})
+    return records
+
+
+def benchmark_lexicon(size=50000, path='lexicon_benchmark.wzlx', lookups=100000)->dict:
+    started = time.perf_counter()
+    records = synthetic_records(size)
+    store = LexiconStore.from_records(records)
+    build_seconds = time.perf_counter() - started
+    store.save(path)
+    try:
+        started = time.perf_counter()
+        loaded = LexiconStore.load(path)
+        load_seconds = time.perf_counter() - started
+
+        rng = random.Random(1)
+        words = [rng.choice(records)['wz'] for _ in range(lookups)]
+        started = time.perf_counter()
+        index = loaded.index('wz')
+        index_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for w in words:
+            loaded.lookup(w)
+        lookup_seconds = time.perf_counter() - started
+
+        dict_bytes = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in records)
+        result = {
+            'entries': size,
+            'file_bytes': os.path.getsize(path),
+            'dict_bytes': dict_bytes,
+            'build_seconds': build_seconds,
+            'load_seconds': load_seconds,
+            'index_seconds': index_seconds,
+            'lookup_ns': lookup_seconds / lookups * 1e9,
+        }
+    finally:
+        os.remove(path)
+    print(f"{size} lexemes: file {result['file_bytes'] / 1024:.0f} KiB vs ~{dict_bytes / 1024:.0f} KiB of dicts,",
+          f"load {load_seconds * 1e3:.2f} ms, wz index {index_seconds * 1e3:.1f} ms,",
+          f"lookup {result['lookup_ns']:.0f} ns")
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_lexicon()
@@ -1,7 +1,7 @@
 # Use radom weighted choice to consume Yaml-specified language designs to generate words.
 
-# Distributions to use for weights
-from scipy.stats import poisson, zipf
+# Distributions to use for weights come from scipy.stats, imported in the weight functions
+# because scipy is slow to import
 
 from numpy.random import choice
 
@@ -27,6 +27,7 @@ def poisson_weights(length: int, q=0.7)->list[float]:
 
     int, (float) -> [floats]
     """
+    from scipy.stats import poisson
     rv = poisson(q)
 
     # Use the probability mass function to get weights for weighted choice later
@@ -43,6 +44,7 @@ def zipf_weights(length: int, q=0.7)->list[float]:
 
     int, (float) -> [floats]
     """
+    from scipy.stats import zipf
     length += 1 # later we drop the first value. Zipf results start with 0
 
     # Zipf PMF scales inversely to Poisson. This lets us switch distribution
@@ -163,4 +165,5 @@ def run(words='1', syllables='1', distribution='zipf', file='', alpha='true')->s
     print(output)
     
 
-run(words="100", syllables="2")
\ No newline at end of file
+if __name__ == "__main__":
+    run(words="100", syllables="2")
@@ -1,7 +1,5 @@
 # Use radom weighted choice to consume Yaml-specified language designs to generate words.
 
-from scipy.stats import poisson, zipf
-
 from numpy.random import choice
 
 import itertools as itr 
@@ -13,6 +11,7 @@ from functools import lru_cache # memoizer to save memory
 
 @lru_cache
 def poisson_weights(length: int, q=0.7)->list[float]:
+    from scipy.stats import poisson # scipy is slow to import, only load it when weights are needed
     rv = poisson(q)
     weights = [rv.pmf(i) for i in range(length)]
     return weights
@@ -20,6 +19,7 @@ def poisson_weights(length: int, q=0.7)->list[float]:
 
 @lru_cache
 def zipf_weights(length: int, q=0.7)->list[float]:
+    from scipy.stats import zipf
     # have to add 1 to an index for this distribution vs Poisson
     length += 1 
     if q == 0:
@@ -150,5 +150,6 @@ def run(words='1', syllables='1', distribution='zipf', file='wizard_names.yml',
     outstring += ' of ' + syllables + ' syllable(s) each.'
     print(output)
     
-    
-run(words="100", syllables="1")
\ No newline at end of file
+
+if __name__ == "__main__":
+    run(words="100", syllables="1")
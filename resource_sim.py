@@ -1,12 +1,55 @@
 # Discrete Event Simulation Demo
 # Movie theater simulation is an example of a resource manager simulation -- starting there
 # This will become some other resource that involves a wait, like a powerup
+# The power-up version is PowerUpStation below: Wizards queue for power-ups and mana, then cast spells
 
-import simpy # SimPy is used for discrete event simulation with consumables wheras SymPy is for symbolic computation
+# SimPy is used for discrete event simulation with consumables wheras SymPy is for symbolic computation
+# It is imported where the SimPy theater runs, so the event kernel models don't pay for it
 import random
 import statistics
+import time
+import math
+import argparse
+import itertools
+
+from functools import lru_cache
+
+from concurrent.futures import ProcessPoolExecutor
+
+from event_kernel import EventKernel, ServerPool, Container, PriorityPool, PreemptivePool
+from sim_stats import SimStats, WaitStats
+
+from action_classes import Wizard
+
+
+@lru_cache
+def monitored_resource_class()->type:
+    # The subclass is built on first use so importing this module doesn't import simpy
+    import simpy
+
+    class MonitoredResource(simpy.Resource):
+        # simpy.Resource that reports queue length and busy servers to a sim_stats.ResourceMonitor
+        def __init__(self, env, capacity, monitor):
+            super().__init__(env, capacity)
+            self.monitor = monitor
+
+        def request(self):
+            request = super().request() # granted on the spot when a server is free
+            self.record()
+            return request
+
+        def release(self, request):
+            release = super().release(request)
+            # SimPy grants the next queued request when the release event is processed, not here,
+            # so record after that callback or the handover would count as idle time
+            release.callbacks.append(self.record)
+            return release
+
+        def record(self, event=None):
+            self.monitor.update(self._env.now, len(self.queue), self.count)
+
+    return MonitoredResource
 
-wait_times = []
 
 class Theater(object):
     def __init__(self, 
@@ -15,51 +58,347 @@ class Theater(object):
                  num_servers,
                  num_ushers):
         self.env = env
-        self.cashiers = simpy.Resource(env, num_cashiers)
-        self.servers = simpy.Resource(env, num_servers)
-        self.ushers = simpy.Resource(env, num_ushers)
+        self.stats = SimStats(env.now) # one collector per environment, nothing shared between runs
+        MonitoredResource = monitored_resource_class()
+        self.cashiers = MonitoredResource(env, num_cashiers, self.stats.monitor('cashiers', num_cashiers))
+        self.servers = MonitoredResource(env, num_servers, self.stats.monitor('servers', num_servers))
+        self.ushers = MonitoredResource(env, num_ushers, self.stats.monitor('ushers', num_ushers))
         
-    def purchase_ticket(self, moviegoer):
-        yield self.env.timeout(random.randint(1,3))
+    def purchase_ticket(self, moviegoer, duration):
+        yield self.env.timeout(duration)
         
     def check_ticket(self, moviegoer):
-        yield self.env.timeout(3/60)
+        yield self.env.timeout(CHECK_TIME)
         
-    def sell_food(self, moviegoer):
-        yield self.env.timeout(random.randint(1,5))
+    def sell_food(self, moviegoer, duration):
+        yield self.env.timeout(duration)
         
 
+CHECK_TIME = 3/60
+ARRIVAL_INTERVAL = 0.20 # interval to wait between people
+
+def draw_visit(rng=random)->tuple:
+    # Draw a moviegoer's service times up front, on arrival.
+    # Both the SimPy model and the event kernel consume random numbers in arrival order this way,
+    # so the same seed gives the same moviegoers in each.
+    ticket_time = rng.randint(1,3)
+    food_time = rng.randint(1,5) if rng.choice([True,False]) else None
+    return ticket_time, food_time
+
+
 def go_to_movies(env, moviegoer, theater):
     arrival_time = env.now
+    ticket_time, food_time = draw_visit()
     
     with theater.cashiers.request() as request:
         yield request
-        yield env.process(theater.purchase_ticket(moviegoer))
+        yield env.process(theater.purchase_ticket(moviegoer, ticket_time))
         
     with theater.ushers.request() as request:
         yield request
         yield env.process(theater.check_ticket(moviegoer))
         
-    if random.choice([True,False]):
+    if food_time is not None:
         with theater.servers.request() as request:
             yield request
-            yield env.process(theater.sell_food(moviegoer))
+            yield env.process(theater.sell_food(moviegoer, food_time))
             
-    wait_times.append(env.now - arrival_time)
+    theater.stats.wait.add(env.now - arrival_time)
     
 
-def run_theater(env, num_cashiers, num_servers, num_ushers):
-    theater = Theater(env, num_cashiers, num_servers, num_ushers)
+def run_theater(env, num_cashiers, num_servers, num_ushers, theater=None):
+    if theater is None:
+        theater = Theater(env, num_cashiers, num_servers, num_ushers)
     for moviegoer in range(3):
         env.process(go_to_movies(env, moviegoer, theater))
     while True:
-        yield env.timeout(0.20) # interval to wait between people
+        yield env.timeout(ARRIVAL_INTERVAL)
         moviegoer += 1
         env.process(go_to_movies(env, moviegoer, theater))
         
 
-def get_average_wait_time(wait_times):
-    average_wait = statistics.mean(wait_times)
+class KernelTheater(object):
+    """
+    The same theater on the event kernel instead of SimPy.
+    Each step of a visit is a callback on a moviegoer index rather than a generator,
+    and the cashiers, servers and ushers are FIFO ServerPools with simpy.Resource semantics.
+    """
+    def __init__(self,
+                 kernel,
+                 num_cashiers,
+                 num_servers,
+                 num_ushers,
+                 rng=random):
+        self.kernel = kernel
+        self.rng = rng
+        self.stats = SimStats(kernel.now)
+        self.cashiers = ServerPool(num_cashiers, self.stats.monitor('cashiers', num_cashiers))
+        self.servers = ServerPool(num_servers, self.stats.monitor('servers', num_servers))
+        self.ushers = ServerPool(num_ushers, self.stats.monitor('ushers', num_ushers))
+        # Per-moviegoer (arrival time, ticket time, food time), only while they're in the building
+        self.visits = {}
+        self.moviegoers = 0
+
+    def arrive(self, kernel, moviegoer):
+        self.visits[moviegoer] = (kernel.now,) + draw_visit(self.rng)
+        self.cashiers.request(kernel, self.purchase_ticket, moviegoer)
+
+    def purchase_ticket(self, kernel, moviegoer):
+        kernel.schedule(self.visits[moviegoer][1], self.ticket_bought, moviegoer)
+
+    def ticket_bought(self, kernel, moviegoer):
+        self.cashiers.release(kernel)
+        self.ushers.request(kernel, self.check_ticket, moviegoer)
+
+    def check_ticket(self, kernel, moviegoer):
+        kernel.schedule(CHECK_TIME, self.ticket_checked, moviegoer)
+
+    def ticket_checked(self, kernel, moviegoer):
+        self.ushers.release(kernel)
+        if self.visits[moviegoer][2] is not None:
+            self.servers.request(kernel, self.sell_food, moviegoer)
+        else:
+            self.seated(kernel, moviegoer)
+
+    def sell_food(self, kernel, moviegoer):
+        kernel.schedule(self.visits[moviegoer][2], self.food_bought, moviegoer)
+
+    def food_bought(self, kernel, moviegoer):
+        self.servers.release(kernel)
+        self.seated(kernel, moviegoer)
+
+    def seated(self, kernel, moviegoer):
+        arrival_time = self.visits.pop(moviegoer)[0]
+        self.stats.wait.add(kernel.now - arrival_time)
+
+    def open_doors(self, kernel, moviegoer):
+        # Same arrival pattern as run_theater: three people at opening, then one every interval
+        if moviegoer == 0:
+            for _ in range(3):
+                self.admit(kernel)
+        else:
+            self.admit(kernel)
+        kernel.schedule(ARRIVAL_INTERVAL, self.open_doors, moviegoer + 1)
+
+    def admit(self, kernel):
+        moviegoer = self.moviegoers
+        self.moviegoers += 1
+        self.arrive(kernel, moviegoer)
+
+
+def run_theater_kernel(num_cashiers, num_servers, num_ushers, until=90, rng=random)->SimStats:
+    kernel = EventKernel()
+    theater = KernelTheater(kernel, num_cashiers, num_servers, num_ushers, rng)
+    kernel.schedule(0.0, theater.open_doors, 0)
+    kernel.run(until=until)
+    theater.stats.finish(kernel.now)
+    return theater.stats
+
+
+def benchmark_kernel(num_cashiers=10, num_servers=10, num_ushers=10, until=90, seed=123)->dict:
+    """
+    Runs the SimPy theater and the kernel theater from the same seed and compares them.
+    Both draw each moviegoer's visit on arrival, so the wait times and resource monitors should come out equal.
+    """
+    import simpy
+    random.seed(seed)
+    start = time.perf_counter()
+    env = simpy.Environment()
+    theater = Theater(env, num_cashiers, num_servers, num_ushers)
+    env.process(run_theater(env, num_cashiers, num_servers, num_ushers, theater))
+    env.run(until=until)
+    theater.stats.finish(env.now)
+    simpy_seconds = time.perf_counter() - start
+    simpy_waits = theater.stats.wait
+    simpy_resources = theater.stats.summary()
+
+    random.seed(seed)
+    start = time.perf_counter()
+    kernel_stats = run_theater_kernel(num_cashiers, num_servers, num_ushers, until)
+    kernel_seconds = time.perf_counter() - start
+    kernel_waits = kernel_stats.wait
+    kernel_resources = kernel_stats.summary()
+    names = ('cashiers', 'servers', 'ushers')
+
+    result = {
+        'moviegoers_seated': (simpy_waits.count, kernel_waits.count),
+        'mean_wait': (simpy_waits.mean, kernel_waits.mean),
+        'equal_wait_times': (simpy_waits.count == kernel_waits.count
+                             and math.isclose(simpy_waits.mean, kernel_waits.mean, rel_tol=1e-9)
+                             and math.isclose(simpy_waits.variance, kernel_waits.variance, rel_tol=1e-9)
+                             and simpy_waits.running.maximum == kernel_waits.running.maximum),
+        'utilization': {name: (simpy_resources[name]['utilization'], kernel_resources[name]['utilization']) for name in names},
+        'equal_monitors': all(simpy_resources[name]['max_queue_length'] == kernel_resources[name]['max_queue_length']
+                              and math.isclose(simpy_resources[name]['utilization'], kernel_resources[name]['utilization'], rel_tol=1e-9)
+                              and math.isclose(simpy_resources[name]['mean_queue_length'], kernel_resources[name]['mean_queue_length'],
+                                               rel_tol=1e-9, abs_tol=1e-12)
+                              for name in names),
+        'seconds': (simpy_seconds, kernel_seconds),
+        'speedup': simpy_seconds / kernel_seconds,
+    }
+    print(f"SimPy:  {simpy_waits.count} seated, mean wait {simpy_waits.mean:.4f}, {simpy_seconds:.4f}s")
+    print(f"Kernel: {kernel_waits.count} seated, mean wait {kernel_waits.mean:.4f}, {kernel_seconds:.4f}s")
+    for name in names:
+        simpy_utilization, kernel_utilization = result['utilization'][name]
+        print(f"{name}: utilization {simpy_utilization:.3f} SimPy, {kernel_utilization:.3f} kernel")
+    print(f"Equal wait times: {result['equal_wait_times']}, equal monitors: {result['equal_monitors']}, "
+          f"speedup {result['speedup']:.1f}x")
+    assert result['equal_wait_times'] and result['equal_monitors'], "SimPy and kernel theaters disagree"
+    return result
+
+
+# Power-ups and mana for Wizards
+# Time here is in simulated seconds.
+# A Wizard's cycle: queue for a power-up station (best rank first), draw mana from the shared pool,
+# take a spell-casting slot, cast, then rest. A better-ranked Wizard can take a casting slot
+# from a worse-ranked one mid-cast; the interrupted Wizard keeps the mana and queues again.
+
+POWER_UP_TIME = 0.5
+POWER_BOOST = 0.5
+SPELL_COST = 1.0 # mana
+CAST_TIME = 2.0 # at power 1.0, more power casts faster
+REST_TIME = 5.0 # mean
+MANA_REGEN = 50.0 # per second into the shared pool
+
+def make_wizards(num_wizards: int, rng=random)->list[Wizard]:
+    # Ranks are globally unique, 1 is the best
+    ranks = list(range(1, num_wizards + 1))
+    rng.shuffle(ranks)
+    return [Wizard(name = f"Wizard {i}",
+                   id = i,
+                   certainty = 1.0,
+                   rudeness = rng.random(),
+                   mana = 0.0,
+                   real = True,
+                   pronunciation = {},
+                   face = [],
+                   age = rng.uniform(20.0, 1000.0),
+                   mortal = False,
+                   alive = True,
+                   conscious = True,
+                   health = 1.0,
+                   vitality = 1.0,
+                   strength = 1.0,
+                   agility = 1.0,
+                   intelligence = 1.0,
+                   category = "wizard",
+                   power = 1.0,
+                   rank = rank,
+                   spells = [])
+            for i, rank in enumerate(ranks)]
+
+
+class PowerUpStation(object):
+    def __init__(self,
+                 kernel,
+                 wizards,
+                 num_stations,
+                 num_casting_slots,
+                 mana_capacity,
+                 rng=random):
+        self.kernel = kernel
+        self.wizards = wizards # entity numbers are indexes into this list
+        self.rng = rng
+        self.stations = PriorityPool(num_stations)
+        self.mana_pool = Container(mana_capacity, mana_capacity)
+        self.casting = PreemptivePool(num_casting_slots)
+        self.power_up_wait = WaitStats()
+        self.mana_wait = WaitStats()
+        self.requested_at = {}
+        self.casts = {} # entity -> seq of its pending spell_cast event
+        self.spells_cast = 0
+        self.preemptions = 0
+
+    def start(self):
+        for wizard in range(len(self.wizards)):
+            self.kernel.schedule(self.rng.expovariate(1 / REST_TIME), self.seek_power_up, wizard)
+        self.kernel.schedule(1.0, self.regenerate, 0)
+
+    def regenerate(self, kernel, _):
+        self.mana_pool.put(kernel, MANA_REGEN)
+        kernel.schedule(1.0, self.regenerate, 0)
+
+    def seek_power_up(self, kernel, wizard):
+        self.requested_at[wizard] = kernel.now
+        self.stations.request(kernel, self.power_up, wizard, self.wizards[wizard].rank)
+
+    def power_up(self, kernel, wizard):
+        self.power_up_wait.add(kernel.now - self.requested_at[wizard])
+        kernel.schedule(POWER_UP_TIME, self.powered_up, wizard)
+
+    def powered_up(self, kernel, wizard):
+        self.wizards[wizard].power += POWER_BOOST
+        self.stations.release(kernel)
+        self.requested_at[wizard] = kernel.now
+        self.mana_pool.get(kernel, SPELL_COST, self.channel_mana, wizard)
+
+    def channel_mana(self, kernel, wizard):
+        self.mana_wait.add(kernel.now - self.requested_at.pop(wizard))
+        self.wizards[wizard].mana += SPELL_COST
+        self.seek_casting_slot(kernel, wizard)
+
+    def seek_casting_slot(self, kernel, wizard):
+        self.casting.request(kernel, self.cast, wizard, self.wizards[wizard].rank, self.interrupted)
+
+    def cast(self, kernel, wizard):
+        self.casts[wizard] = kernel.schedule(CAST_TIME / self.wizards[wizard].power, self.spell_cast, wizard)
+
+    def interrupted(self, kernel, wizard):
+        seq = self.casts.pop(wizard, None)
+        if seq is not None:
+            kernel.cancel(seq)
+        self.preemptions += 1
+        self.seek_casting_slot(kernel, wizard)
+
+    def spell_cast(self, kernel, wizard):
+        self.casts.pop(wizard)
+        if not self.casting.holds(wizard):
+            return # preempted at the same instant it finished, interrupted() requeues it
+        self.casting.release(kernel, wizard)
+        w = self.wizards[wizard]
+        w.mana -= SPELL_COST
+        w.power -= POWER_BOOST
+        self.spells_cast += 1
+        kernel.schedule(self.rng.expovariate(1 / REST_TIME), self.seek_power_up, wizard)
+
+
+def run_power_ups(wizards, num_stations=10, num_casting_slots=20, mana_capacity=200.0, until=60.0, rng=random)->PowerUpStation:
+    kernel = EventKernel()
+    station = PowerUpStation(kernel, wizards, num_stations, num_casting_slots, mana_capacity, rng)
+    station.start()
+    kernel.run(until=until)
+    return station
+
+
+def benchmark_power_ups(sizes=(1000, 5000, 10000), until=60.0, seed=123)->list[dict]:
+    """Throughput of the Wizard power-up model in wizards x simulated seconds per wall second."""
+    results = []
+    for num_wizards in sizes:
+        rng = random.Random(seed)
+        wizards = make_wizards(num_wizards, rng)
+        # Scale the stations with the crowd so the queues stay comparable
+        scale = num_wizards // 1000 or 1
+        start = time.perf_counter()
+        station = run_power_ups(wizards, 10 * scale, 20 * scale, 200.0 * scale, until, rng)
+        seconds = time.perf_counter() - start
+        result = {
+            'wizards': num_wizards,
+            'wall_seconds': seconds,
+            'throughput': num_wizards * until / seconds,
+            'spells_cast': station.spells_cast,
+            'preemptions': station.preemptions,
+            'mean_power_up_wait': station.power_up_wait.mean,
+            'mean_mana_wait': station.mana_wait.mean,
+        }
+        results.append(result)
+        print(f"{num_wizards} wizards: {result['throughput']:,.0f} wizard-seconds per second,",
+              f"{station.spells_cast} spells, {station.preemptions} preemptions,",
+              f"power-up wait {station.power_up_wait.mean:.2f}s, mana wait {station.mana_wait.mean:.2f}s")
+    return results
+
+
+def get_average_wait_time(stats):
+    average_wait = stats.wait.mean
     minutes, minutes_decimal = divmod(average_wait, 1)
     seconds = minutes_decimal * 60
     return round(minutes), round(seconds)
@@ -79,18 +418,154 @@ def get_user_input():
         params = [1, 1, 1]
     return params
 
+# Staffing search
+# Finds the cheapest (cashiers, servers, ushers) whose mean wait meets a target.
+# Later this is power-up station capacity.
+
+def replicate(job: tuple)->float:
+    """
+    One replication of the kernel theater. job is (config, seed, until).
+    Every configuration runs replication k from the same seed (common random numbers),
+    so differences between configurations come from the staffing and not from the draws.
+    """
+    (num_cashiers, num_servers, num_ushers), seed, until = job
+    stats = run_theater_kernel(num_cashiers, num_servers, num_ushers, until, random.Random(seed))
+    return stats.wait.mean if stats.wait.count else float('inf')
+
+
+def confidence_interval(samples: list[float], confidence=0.95)->tuple[float, float]:
+    mean = statistics.mean(samples)
+    if len(samples) < 2:
+        return float('-inf'), float('inf')
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    half_width = z * statistics.stdev(samples) / len(samples) ** 0.5
+    return mean - half_width, mean + half_width
+
+
+def evaluate_staffing(config, target_wait, run_batch, batch=8, max_replications=64, confidence=0.95, until=90, seed=123)->dict:
+    """
+    Runs replications of one configuration in batches until the confidence interval of its
+    mean wait separates from the target, or max_replications is reached.
+    """
+    samples = []
+    while len(samples) < max_replications:
+        jobs = [(config, seed + k, until) for k in range(len(samples), min(len(samples) + batch, max_replications))]
+        samples.extend(run_batch(jobs))
+        low, high = confidence_interval(samples, confidence)
+        if high < target_wait or low > target_wait:
+            break
+    low, high = confidence_interval(samples, confidence)
+    mean = statistics.mean(samples)
+    return {
+        'config': config,
+        'mean_wait': mean,
+        'interval': (low, high),
+        'replications': len(samples),
+        'meets_target': high < target_wait if high != float('inf') else mean < target_wait,
+        'separated': high < target_wait or low > target_wait,
+    }
+
+
+def search_staffing(target_wait: float,
+                    max_staff=10,
+                    costs=(1, 1, 1),
+                    batch=8,
+                    max_replications=64,
+                    confidence=0.95,
+                    until=90,
+                    seed=123,
+                    workers=None)->dict:
+    """
+    Cheapest (cashiers, servers, ushers) with a mean wait under target_wait minutes.
+
+    Adding staff never makes the wait longer, so the search first bisects each station with the
+    other two at max_staff to get a lower bound per station. The remaining grid is tried in cost
+    order, and any configuration dominated by one that already failed is skipped.
+    Replications run in a process pool; workers=0 runs them in this process.
+    """
+    if workers == 0:
+        pool = None
+        run_batch = lambda jobs: [replicate(job) for job in jobs]
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        run_batch = lambda jobs: list(pool.map(replicate, jobs))
+
+    evaluated = []
+    def evaluate(config):
+        result = evaluate_staffing(config, target_wait, run_batch, batch, max_replications, confidence, until, seed)
+        evaluated.append(result)
+        return result
+
+    try:
+        # Bisection on each station alone
+        lower = []
+        for station in range(3):
+            low, high = 1, max_staff
+            while low < high:
+                mid = (low + high) // 2
+                config = [max_staff] * 3
+                config[station] = mid
+                if evaluate(tuple(config))['meets_target']:
+                    high = mid
+                else:
+                    low = mid + 1
+            lower.append(low)
+
+        # Cost-ordered grid above the bounds
+        failed = []
+        best = None
+        grid = itertools.product(*(range(low, max_staff + 1) for low in lower))
+        for config in sorted(grid, key=lambda c: (sum(n * cost for n, cost in zip(c, costs)), c)):
+            if any(all(n <= f for n, f in zip(config, fail)) for fail in failed):
+                continue
+            result = evaluate(config)
+            if result['meets_target']:
+                best = result
+                break
+            failed.append(config)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {'best': best, 'evaluated': len(evaluated), 'replications': sum(r['replications'] for r in evaluated)}
+
+
 def main():
+    import simpy
     random.seed(123)
     #num_cashiers, num_servers, num_ushers = get_user_input()
     num_cashiers, num_servers, num_ushers = 10, 10, 10
     
     env = simpy.Environment()
-    env.process(run_theater(env, num_cashiers, num_servers, num_ushers))
+    theater = Theater(env, num_cashiers, num_servers, num_ushers)
+    env.process(run_theater(env, num_cashiers, num_servers, num_ushers, theater))
     env.run(until=90)
+    theater.stats.finish(env.now)
     
-    mins, secs = get_average_wait_time(wait_times)
+    mins, secs = get_average_wait_time(theater.stats)
     print(f"The average wait time is {mins} minutes and {secs} seconds.")
+    summary = theater.stats.summary()
+    print(f"Median {summary['wait']['p50']:.2f}, 90th percentile {summary['wait']['p90']:.2f}, 99th percentile {summary['wait']['p99']:.2f} minutes.")
+    for name in ('cashiers', 'servers', 'ushers'):
+        print(f"{name}: utilization {summary[name]['utilization']:.0%}, mean queue {summary[name]['mean_queue_length']:.2f}")
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Theater (power-up station) queueing simulation.")
+    parser.add_argument('--optimize', type=float, metavar='MINUTES',
+                        help="search for the cheapest staffing with a mean wait under MINUTES")
+    parser.add_argument('--max-staff', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    if args.optimize is None:
+        main()
+    else:
+        found = search_staffing(args.optimize, max_staff=args.max_staff, workers=args.workers)
+        best = found['best']
+        if best is None:
+            print(f"No staffing up to {args.max_staff} per station meets {args.optimize} minutes.")
+        else:
+            print("Cheapest staffing (cashiers, servers, ushers):", best['config'])
+            print(f"Mean wait {best['mean_wait']:.3f} minutes, interval {best['interval'][0]:.3f}-{best['interval'][1]:.3f}",
+                  f"from {best['replications']} replications")
+        print(f"Evaluated {found['evaluated']} configurations with {found['replications']} replications.")
\ No newline at end of file
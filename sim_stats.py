@@ -0,0 +1,255 @@
+"""
+Streaming statistics for the discrete event simulations.
+
+Everything here is constant-memory, so a collector can sit on a simulation for as long as it runs
+and a fresh one per environment keeps repeated runs in the same process from leaking state.
+
+* RunningStats is Welford's online mean and variance.
+* P2Quantile is the P-square algorithm (Jain & Chlamtac 1985), five markers per quantile.
+* WaitStats bundles the two for wait times.
+* ResourceMonitor keeps time-weighted queue length and utilization for one resource,
+  binned into a fixed number of intervals.
+"""
+
+import math
+
+from collections import deque
+
+
+class RunningStats:
+    __slots__ = ('count', 'mean', '_m2', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, x: float)->None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if x < self.minimum:
+            self.minimum = x
+        if x > self.maximum:
+            self.maximum = x
+
+    @property
+    def variance(self)->float:
+        # Sample variance, like statistics.variance
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self)->float:
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """Estimates one quantile p in constant memory with the P-square algorithm."""
+    __slots__ = ('p', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p: float):
+        if not 0.0 < p < 1.0:
+            raise ValueError("Quantile must be between 0 and 1.")
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0]
+        self.increments = [0.0, p / 2, p, (1.0 + p) / 2, 1.0]
+
+    def add(self, x: float)->None:
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Find the cell x falls in, stretching the end markers if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self.desired
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        # Move the three middle markers toward their desired positions
+        for i in range(1, 4):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int)->float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self)->float:
+        q = self.heights
+        if not q:
+            return math.nan
+        if len(q) < 5:
+            # Exact nearest-rank quantile until the markers are initialized
+            return q[min(len(q) - 1, int(self.p * len(q)))]
+        return q[2]
+
+
+class WaitStats:
+    """Online mean, variance and quantiles of wait times."""
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99)):
+        self.running = RunningStats()
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, wait: float)->None:
+        self.running.add(wait)
+        for estimator in self.quantiles.values():
+            estimator.add(wait)
+
+    @property
+    def count(self)->int:
+        return self.running.count
+
+    @property
+    def mean(self)->float:
+        return self.running.mean
+
+    @property
+    def variance(self)->float:
+        return self.running.variance
+
+    def quantile(self, p: float)->float:
+        return self.quantiles[p].value
+
+    def summary(self)->dict:
+        out = {
+            'count': self.running.count,
+            'mean': self.running.mean,
+            'stdev': self.running.stdev,
+            'min': self.running.minimum,
+            'max': self.running.maximum,
+        }
+        for p, estimator in self.quantiles.items():
+            out[f'p{round(p * 100)}'] = estimator.value
+        return out
+
+
+class ResourceMonitor:
+    """
+    Time-weighted queue length and utilization of one resource.
+
+    Call update() whenever the queue length or the number of busy servers changes.
+    The history is kept as the last max_bins intervals of (start time, mean queue length, utilization),
+    alongside totals over the whole run.
+    """
+
+    def __init__(self, capacity: int, interval=1.0, max_bins=256, start=0.0):
+        self.capacity = capacity
+        self.interval = interval
+        self.bins = deque(maxlen=max_bins)
+        self.start = start
+        self._time = start
+        self._queue = 0
+        self._busy = 0
+        self._bin_start = start
+        self._queue_area = 0.0
+        self._busy_area = 0.0
+        self._total_queue_area = 0.0
+        self._total_busy_area = 0.0
+        self.max_queue_length = 0
+
+    def update(self, now: float, queue_length: int, busy: int)->None:
+        self._advance(now)
+        self._queue = queue_length
+        self._busy = busy
+        if queue_length > self.max_queue_length:
+            self.max_queue_length = queue_length
+
+    def _advance(self, now: float)->None:
+        interval = self.interval
+        queue, busy = self._queue, self._busy
+        self._total_queue_area += (now - self._time) * queue
+        self._total_busy_area += (now - self._time) * busy
+        while now >= self._bin_start + interval:
+            end = self._bin_start + interval
+            self._queue_area += (end - self._time) * queue
+            self._busy_area += (end - self._time) * busy
+            self.bins.append((self._bin_start,
+                              self._queue_area / interval,
+                              self._busy_area / (interval * self.capacity)))
+            self._bin_start = end
+            self._time = end
+            self._queue_area = 0.0
+            self._busy_area = 0.0
+            # Long idle stretches only need enough whole bins to fill the history
+            skipped = int((now - end) / interval) - self.bins.maxlen
+            if skipped > 0:
+                self._bin_start += skipped * interval
+                self._time = self._bin_start
+        self._queue_area += (now - self._time) * queue
+        self._busy_area += (now - self._time) * busy
+        self._time = now
+
+    def series(self)->list[tuple[float, float, float]]:
+        return list(self.bins)
+
+    @property
+    def mean_queue_length(self)->float:
+        elapsed = self._time - self.start
+        return self._total_queue_area / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def utilization(self)->float:
+        elapsed = self._time - self.start
+        return self._total_busy_area / (elapsed * self.capacity) if elapsed > 0 else 0.0
+
+
+class SimStats:
+    """Per-environment collector: wait times plus one ResourceMonitor per named resource."""
+
+    def __init__(self, start=0.0, interval=1.0, max_bins=256):
+        self.wait = WaitStats()
+        self.resources = {}
+        self.start = start
+        self.interval = interval
+        self.max_bins = max_bins
+
+    def monitor(self, name: str, capacity: int)->ResourceMonitor:
+        monitor = ResourceMonitor(capacity, self.interval, self.max_bins, self.start)
+        self.resources[name] = monitor
+        return monitor
+
+    def finish(self, now: float)->None:
+        # Close out the time-weighted series at the end of the run
+        for monitor in self.resources.values():
+            monitor.update(now, monitor._queue, monitor._busy)
+
+    def summary(self)->dict:
+        out = {'wait': self.wait.summary()}
+        for name, monitor in self.resources.items():
+            out[name] = {
+                'mean_queue_length': monitor.mean_queue_length,
+                'max_queue_length': monitor.max_queue_length,
+                'utilization': monitor.utilization,
+            }
+        return out
@@ -0,0 +1,138 @@
+"""
+Uniform spatial grid for Battle Wizard Simulator
+
+Hearing, sight and spell areas all ask the same question of the battlefield: for each of these
+points, which entities are within some radius? Checking every pair is O(N^2). SpatialGrid buckets
+the points into square cells once (a single sort of their cell keys) and answers a whole batch
+of radius queries at once by only looking at the cells each circle overlaps.
+
+Nothing is stored per cell: the points are sorted by cell key, and a cell's points are the run
+between two searchsorted bounds. Rebuilding the grid when things move is one argsort, cheap
+enough to do every tick.
+
+query() returns matches as flat pair arrays (query index, point id, squared distance) rather than
+a list per query, so callers can go on with vectorized work on all of them.
+"""
+
+import time
+
+import numpy as np
+
+
+class SpatialGrid:
+    def __init__(self, x, y, cell_size: float, ids=None):
+        """Grid over points (x[i], y[i]). ids are what query() reports for them, default 0..n-1."""
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.ids = np.arange(len(self.x)) if ids is None else np.asarray(ids)
+        self.cell_size = float(cell_size)
+        if len(self.x):
+            self.origin = (self.x.min(), self.y.min())
+            ix, iy = self._cells(self.x, self.y)
+            self.shape = (int(ix.max()) + 1, int(iy.max()) + 1)
+        else:
+            self.origin, self.shape = (0.0, 0.0), (0, 0)
+            ix = iy = np.zeros(0, dtype=np.int64)
+        keys = ix * self.shape[1] + iy
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def __len__(self)->int:
+        return len(self.x)
+
+    def _cells(self, x, y)->tuple:
+        return (np.floor((x - self.origin[0]) / self.cell_size).astype(np.int64),
+                np.floor((y - self.origin[1]) / self.cell_size).astype(np.int64))
+
+    def _block(self, qx, qy, radius, qix, qiy, reach: int)->tuple:
+        # (query index, cell key) of the cells within reach of each query that its circle overlaps
+        offsets = np.arange(-reach, reach + 1)
+        # Every (query, neighbouring cell) at once: (queries, offsets, offsets)
+        cx = (qix[:, None, None] + offsets[None, :, None]).repeat(len(offsets), axis=2)
+        cy = (qiy[:, None, None] + offsets[None, None, :]).repeat(len(offsets), axis=1)
+        # Skip cells the circle can't reach, measured from the query to the cell's nearest edge
+        near_x = np.clip(qx[:, None, None], self.origin[0] + cx * self.cell_size, self.origin[0] + (cx + 1) * self.cell_size)
+        near_y = np.clip(qy[:, None, None], self.origin[1] + cy * self.cell_size, self.origin[1] + (cy + 1) * self.cell_size)
+        inside = ((cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+                  & ((near_x - qx[:, None, None]) ** 2 + (near_y - qy[:, None, None]) ** 2 <= radius[:, None, None] ** 2))
+        query = np.broadcast_to(np.arange(len(qx))[:, None, None], cx.shape)[inside]
+        return query, cx[inside] * self.shape[1] + cy[inside]
+
+    def candidates(self, qx, qy, radius)->tuple:
+        """(query index, point index) for every point in a cell the query's circle overlaps."""
+        qx, qy, radius = np.broadcast_arrays(np.atleast_1d(np.asarray(qx, dtype=np.float64)),
+                                             np.atleast_1d(np.asarray(qy, dtype=np.float64)),
+                                             np.atleast_1d(np.asarray(radius, dtype=np.float64)))
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(qx) or not len(self.x):
+            return empty, empty
+        # Each query looks at a block of cells as wide as its own radius, so queries are done in
+        # groups of the same reach rather than all in a block sized for the widest one
+        reach = np.ceil(radius / self.cell_size).astype(np.int64)
+        qix, qiy = self._cells(qx, qy)
+        queries, cells = [], []
+        for r in np.unique(reach).tolist():
+            group = np.flatnonzero(reach == r)
+            q, k = self._block(qx[group], qy[group], radius[group], qix[group], qiy[group], r)
+            queries.append(group[q])
+            cells.append(k)
+        query, keys = np.concatenate(queries), np.concatenate(cells)
+        if len(queries) > 1:
+            by_query = np.argsort(query, kind='stable')
+            query, keys = query[by_query], keys[by_query]
+        lo = np.searchsorted(self.keys, keys, 'left')
+        hi = np.searchsorted(self.keys, keys, 'right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if not total:
+            return empty, empty
+        # Expand each [lo, hi) run into its positions
+        run_start = np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(lo, counts) + np.arange(total) - run_start
+        return np.repeat(query, counts), self.order[positions]
+
+    def query(self, qx, qy, radius)->tuple:
+        """(query index, point id, squared distance) for every point within radius of each query point."""
+        qx, qy, radius = np.broadcast_arrays(np.atleast_1d(np.asarray(qx, dtype=np.float64)),
+                                             np.atleast_1d(np.asarray(qy, dtype=np.float64)),
+                                             np.atleast_1d(np.asarray(radius, dtype=np.float64)))
+        q, p = self.candidates(qx, qy, radius)
+        d2 = (self.x[p] - qx[q]) ** 2 + (self.y[p] - qy[q]) ** 2
+        keep = d2 <= radius[q] ** 2
+        return q[keep], self.ids[p[keep]], d2[keep]
+
+
+def brute_force_query(x, y, qx, qy, radius)->tuple:
+    """The O(queries x points) version of SpatialGrid.query, for checking it."""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    qx, qy, radius = np.broadcast_arrays(np.atleast_1d(np.asarray(qx, dtype=np.float64)),
+                                         np.atleast_1d(np.asarray(qy, dtype=np.float64)),
+                                         np.atleast_1d(np.asarray(radius, dtype=np.float64)))
+    d2 = (x[None, :] - qx[:, None]) ** 2 + (y[None, :] - qy[:, None]) ** 2
+    q, p = np.nonzero(d2 <= radius[:, None] ** 2)
+    return q, p, d2[q, p]
+
+
+def benchmark_grid(counts=(1000, 10000, 100000), density=0.01, radius=20.0, seed=123)->list[dict]:
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in counts:
+        side = np.sqrt(n / density)
+        x, y = rng.uniform(0, side, n), rng.uniform(0, side, n)
+        queries = n // 10
+        qx, qy = rng.uniform(0, side, queries), rng.uniform(0, side, queries)
+        started = time.perf_counter()
+        grid = SpatialGrid(x, y, radius)
+        q, p, d2 = grid.query(qx, qy, rng.uniform(0.5, 1.0, queries) * radius)
+        seconds = time.perf_counter() - started
+        if n <= 10000:
+            bq, bp, _ = brute_force_query(x, y, qx, qy, radius)
+            gq, gp, _ = grid.query(qx, qy, radius)
+            assert sorted(zip(bq.tolist(), bp.tolist())) == sorted(zip(gq.tolist(), gp.tolist()))
+        results.append({'points': n, 'queries': queries, 'pairs': len(q), 'seconds': seconds})
+        print(f"{n:,} points, {queries:,} radius queries: {seconds * 1000:.1f} ms ({seconds / queries * 1e6:.1f} us/query), {len(q):,} pairs")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_grid()
@@ -0,0 +1,241 @@
+"""
+Spell area-of-effect resolution for Battle Wizard Simulator
+
+action_classes.Spell has damage, reach, radius and attributes. In a battle dozens of spells land
+every tick on crowds of entities, so SpellEngine.cast() takes a whole batch of casts (caster row,
+spell id, aim point) and resolves them together:
+
+1. each aim point is pulled back to the spell's reach from the caster
+2. everyone within each spell's radius of its aim point is found with a spatial_grid.SpatialGrid,
+   usually the same grid hearing and vision use that tick
+3. damage (spell damage times the caster's power, or healing with the 'heal' attribute) from
+   every cast is summed per entity with one bincount and applied to the health column at once,
+   capped between 0 and vitality. Entities brought to 0 health go through EntityStore.die(), so
+   immortal wizards survive at 0 health the way Wizard.die() never kills them.
+4. attributes are flag effects on everyone hit: wake, then stun (stun wins when both land),
+   vanish, reveal, infect
+
+Casters are never hit by their own spell. A cast by someone dead or unconscious fizzles.
+
+The result lists every hit and death and the action_classes.Event records they make for the
+language layer: the spell verb with caster as agent and each entity hit as patient, and a kill
+for each death, credited to the cast that did it the most damage. Roles are store rows, as in
+world_updater.
+"""
+
+import time
+
+from dataclasses import dataclass
+
+import numpy as np
+
+import wizard_language as wl
+
+from action_classes import ASPECTS, Event, ROLES, Spell
+from entity_store import ALIVE, CONSCIOUS, INFECTIOUS, VISIBLE, EntityStore
+from spatial_grid import SpatialGrid
+from world_updater import DEFAULT_VERB_IDS
+
+ATTRIBUTES = ('heal', 'wake', 'stun', 'vanish', 'reveal', 'infect')
+ATTRIBUTE = {name: 1 << i for i, name in enumerate(ATTRIBUTES)}
+
+PERFECTIVE = 1 << ASPECTS.index('perfective')
+AGENT = ROLES.index('agent')
+PATIENT = ROLES.index('patient')
+
+
+def lexicon_spell(name: str, damage: float, reach: float, radius: float, category: str, attributes: list[str])->Spell:
+    # A Spell whose id and pronunciation are its lexeme's, so the events it makes can be rendered
+    lexeme = wl.lexicon_en[name]
+    return Spell(name, damage, reach, radius, category, attributes, id=lexeme['id'],
+                 pronunciation={script: lexeme[script] for script in ('en', 'jp', 'wz')})
+
+
+def default_spells()->list[Spell]:
+    return [
+        lexicon_spell('fireball', 0.6, 20.0, 3.0, 'fire', []),
+        lexicon_spell('thunderclap', 0.1, 10.0, 5.0, 'air', ['stun']),
+        lexicon_spell('mending rain', 0.4, 15.0, 4.0, 'water', ['heal', 'wake']),
+        lexicon_spell('veil', 0.0, 5.0, 3.0, 'shadow', ['vanish']),
+        lexicon_spell('daylight', 0.0, 10.0, 6.0, 'light', ['reveal']),
+        lexicon_spell('plague', 0.1, 12.0, 2.0, 'death', ['infect']),
+    ]
+
+
+class SpellBook:
+    """The numbers of a list of Spells as arrays, looked up by spell id."""
+    def __init__(self, spells: list[Spell]):
+        self.spells = list(spells)
+        self.ids = np.array([s.id for s in spells], dtype=np.int64)
+        self.damage = np.array([-s.damage if 'heal' in s.attributes else s.damage for s in spells], dtype=np.float32)
+        self.reach = np.array([s.reach for s in spells], dtype=np.float64)
+        self.radius = np.array([s.radius for s in spells], dtype=np.float64)
+        self.attributes = np.array([sum(ATTRIBUTE[a] for a in s.attributes) for s in spells], dtype=np.uint8)
+        # Spell id -> index, -1 for ids that aren't spells
+        self.table = np.full(int(self.ids.max(initial=-1)) + 1, -1, dtype=np.int64)
+        self.table[self.ids] = np.arange(len(spells))
+
+    def __len__(self)->int:
+        return len(self.spells)
+
+    def lookup(self, spell_ids)->np.ndarray:
+        spell_ids = np.asarray(spell_ids, dtype=np.int64)
+        known = (spell_ids >= 0) & (spell_ids < len(self.table))
+        index = np.full(len(spell_ids), -1, dtype=np.int64)
+        index[known] = self.table[spell_ids[known]]
+        return index
+
+
+@dataclass
+class CastResult:
+    cast: np.ndarray # per hit: which cast
+    target: np.ndarray # per hit: the entity row hit
+    dealt: np.ndarray # per hit: damage done, negative for healing
+    died: np.ndarray # rows that died this batch
+    killer: np.ndarray # per death: the cast credited with it
+    fizzled: np.ndarray # per cast: whether it did nothing because the caster couldn't cast
+    events: np.ndarray # (hits + deaths, len(Event._fields)) int32 Event records
+
+    def to_events(self)->list[Event]:
+        return [Event(*row) for row in self.events.tolist()]
+
+
+class SpellEngine:
+    def __init__(self, store: EntityStore, spellbook: SpellBook = None, kill_verb: int = DEFAULT_VERB_IDS['kill']):
+        self.store = store
+        self.spellbook = SpellBook(default_spells()) if spellbook is None else spellbook
+        self.kill_verb = kill_verb
+
+    def cast(self, casters, spell_ids, x, y, grid: SpatialGrid = None)->CastResult:
+        """Resolves a batch of casts, caster i casting spell_ids[i] at (x[i], y[i]). grid is over all store rows."""
+        store, book = self.store, self.spellbook
+        n = len(store)
+        casters = np.asarray(casters, dtype=np.int64)
+        spell = book.lookup(spell_ids)
+        flags = store.flags[:n]
+        fizzled = (spell < 0) | ((flags[casters] & (ALIVE | CONSCIOUS)) != (ALIVE | CONSCIOUS))
+        live = np.flatnonzero(~fizzled)
+        s = spell[live]
+
+        # 1. Aim no further than the spell reaches
+        cx, cy = store['x'][casters[live]].astype(np.float64), store['y'][casters[live]].astype(np.float64)
+        dx, dy = np.asarray(x, dtype=np.float64)[live] - cx, np.asarray(y, dtype=np.float64)[live] - cy
+        scale = np.minimum(1.0, book.reach[s] / np.maximum(np.hypot(dx, dy), 1e-9))
+        ax, ay = cx + dx * scale, cy + dy * scale
+
+        # 2. Everyone in each blast except the caster, living or not (zombies are hit too)
+        if grid is None:
+            grid = SpatialGrid(store['x'], store['y'], book.radius.max(initial=1.0))
+        q, target, _ = grid.query(ax, ay, book.radius[s])
+        keep = target != casters[live][q]
+        cast, target = live[q[keep]], target[keep]
+        s_hit = spell[cast]
+
+        # 3. Damage, summed per entity and applied in one go
+        alive = (flags[target] & ALIVE) != 0
+        dealt = book.damage[s_hit] * store['power'][casters[cast]]
+        dealt = np.where((dealt < 0) & ~alive, 0.0, dealt).astype(np.float32) # the dead aren't healed
+        health, vitality = store['health'], store['vitality']
+        total = np.bincount(target, weights=dealt, minlength=n)
+        hit = np.unique(target)
+        was_alive = (flags[hit] & ALIVE) != 0
+        health[hit] = np.clip(health[hit] - total[hit], 0.0, vitality[hit])
+        dying = hit[was_alive & (health[hit] <= 0) & (total[hit] > 0)]
+        died = dying[store.die(dying)]
+
+        # Each death goes to the cast that did the most damage to it, the earliest cast on a tie
+        order = np.lexsort((cast, -dealt, target))
+        first = order[np.diff(target[order], prepend=-1) != 0] # empty when nobody was hit
+        killer_of = np.full(n, -1, dtype=np.int64)
+        killer_of[target[first]] = cast[first]
+        killer = killer_of[died]
+
+        # 4. Flag effects, waking and stunning only those still standing
+        attributes = book.attributes[s_hit]
+        standing = (store.flags[target] & ALIVE) != 0
+        store.wake_up(np.unique(target[standing & ((attributes & ATTRIBUTE['wake']) != 0)]))
+        store.pass_out(np.unique(target[standing & ((attributes & ATTRIBUTE['stun']) != 0)]))
+        store.vanish(np.unique(target[(attributes & ATTRIBUTE['vanish']) != 0]))
+        store.set_flag(np.unique(target[(attributes & ATTRIBUTE['reveal']) != 0]), VISIBLE, True)
+        store.set_flag(np.unique(target[(attributes & ATTRIBUTE['infect']) != 0]), INFECTIOUS, True)
+
+        # Events: the spell on each entity it hit, then each kill
+        events = np.full((len(cast) + len(died), len(Event._fields)), -1, dtype=np.int32)
+        events[:, 1] = PERFECTIVE
+        events[:len(cast), 0] = book.ids[s_hit]
+        events[:len(cast), 2 + AGENT] = casters[cast]
+        events[:len(cast), 2 + PATIENT] = target
+        events[len(cast):, 0] = self.kill_verb
+        events[len(cast):, 2 + AGENT] = casters[killer]
+        events[len(cast):, 2 + PATIENT] = died
+        return CastResult(cast=cast, target=target, dealt=dealt, died=died, killer=killer, fizzled=fizzled, events=events)
+
+
+def brute_force_damage(store: EntityStore, spellbook: SpellBook, casters, spell_ids, x, y)->np.ndarray:
+    """Health after the casts, one cast at a time over every entity, for checking SpellEngine.cast()."""
+    n = len(store)
+    health = store['health'].astype(np.float64).copy()
+    total = np.zeros(n)
+    ex, ey = store['x'].astype(np.float64), store['y'].astype(np.float64)
+    for caster, spell_id, tx, ty in zip(casters, spell_ids, x, y):
+        i = int(spellbook.lookup([spell_id])[0])
+        if i < 0 or (store.flags[caster] & (ALIVE | CONSCIOUS)) != (ALIVE | CONSCIOUS):
+            continue
+        dx, dy = tx - ex[caster], ty - ey[caster]
+        scale = min(1.0, spellbook.reach[i] / max(np.hypot(dx, dy), 1e-9))
+        ax, ay = ex[caster] + dx * scale, ey[caster] + dy * scale
+        hit = ((ex - ax) ** 2 + (ey - ay) ** 2 <= spellbook.radius[i] ** 2) & (np.arange(n) != caster)
+        damage = np.float32(spellbook.damage[i] * store['power'][caster])
+        if damage < 0:
+            hit &= (store.flags[:n] & ALIVE) != 0
+        total[hit] += damage
+    return np.clip(health - total, 0.0, store['vitality'])
+
+
+def benchmark_spells(entities=100000, casts=64, ticks=20, density=0.5, seed=123)->dict:
+    import world_updater
+    rng = np.random.default_rng(seed)
+    store = world_updater.battle_store(entities, seed)
+    side = np.sqrt(entities / density)
+    store['x'][:] = rng.uniform(0, side, entities)
+    store['y'][:] = rng.uniform(0, side, entities)
+    store['health'][:] = rng.uniform(0.1, 1.0, entities) # a battle that's been going on a while
+    engine = SpellEngine(store)
+    book = engine.spellbook
+
+    grid_seconds = cast_seconds = scan_seconds = 0.0
+    hits = deaths = 0
+    for tick in range(ticks):
+        casters = rng.choice(entities, casts, replace=False)
+        spell_ids = book.ids[rng.integers(0, len(book), casts)]
+        # Aim at someone near the caster, into the crowd
+        aimed = np.clip(casters + rng.integers(-50, 50, casts), 0, entities - 1)
+        x, y = store['x'][aimed] + rng.normal(0, 1, casts), store['y'][aimed] + rng.normal(0, 1, casts)
+
+        started = time.perf_counter()
+        expected = brute_force_damage(store, book, casters, spell_ids, x, y)
+        scan_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        grid = SpatialGrid(store['x'], store['y'], book.radius.max()) # shared with hearing and vision in a real tick
+        grid_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        result = engine.cast(casters, spell_ids, x, y, grid)
+        cast_seconds += time.perf_counter() - started
+        assert np.allclose(store['health'], expected, atol=1e-5)
+        assert not (store.flags[result.died] & ALIVE).any()
+        hits += len(result.target)
+        deaths += len(result.died)
+
+    result_dict = {'entities': entities, 'casts_per_tick': casts, 'cast_ms': cast_seconds / ticks * 1000,
+                   'grid_ms': grid_seconds / ticks * 1000, 'scan_ms': scan_seconds / ticks * 1000,
+                   'hits_per_tick': hits / ticks, 'deaths': deaths}
+    print(f"{casts} casts a tick over {entities:,} entities: resolved in {result_dict['cast_ms']:.2f} ms",
+          f"(+{result_dict['grid_ms']:.1f} ms for the tick's shared grid) vs {result_dict['scan_ms']:.1f} ms one cast at a time;",
+          f"{hits / ticks:,.0f} hits a tick, {deaths:,} deaths in {ticks} ticks")
+    events = result.to_events()
+    print(events[0], events[-1], sep='\n')
+    return result_dict
+
+
+if __name__ == "__main__":
+    benchmark_spells()
@@ -0,0 +1,31 @@
+"""
+Tests for action_classes.Event frames.
+"""
+
+import numpy as np
+
+from action_classes import Event, Noun, Verb
+
+
+def test_event_frame_names_entities_by_lexeme():
+    # Store rows 0 and 2 are entities whose names are lexemes 1007 and 1003
+    lexemes = np.array([1007, 1005, 1003], dtype=np.int32)
+    event = Event(200, 1, agent=0, patient=2)
+    assert event.frame(lexemes) == (200, 1, (1007, 1003) + (-1,) * 7)
+    assert event.frame({0: 7, 2: 3}) == (200, 1, (7, 3) + (-1,) * 7)
+
+
+def test_verb_frame_uses_noun_lexemes():
+    thing = Noun('thing', 0, 1.0, 0.0, 0.0, True, {})
+    wizard = Noun('wizard', 1001, 1.0, 0.0, 1.0, True, {})
+    verb = Verb('do', 1, 1.0, 0.0, wizard, thing, None, None, None, None, None, None, None, {}, 1)
+    assert verb.frame() == (1, 1, (1001, 0) + (-1,) * 7)
+    assert verb.event().frame({1001: 1001, 0: 0}) == verb.frame()
+
+
+def test_do_keeps_aspect():
+    verb = Verb('do', 1, 1.0, 0.0, None, None, None, None, None, None, None, None, None,
+                {'en': 'do', 'jp': 'suru', 'wz': 'pekang'}, 0)
+    flags = verb.set_aspect_mood(perfective=True, passive=True)
+    verb.do()
+    assert verb.aspect == flags and verb.event().flags == flags
@@ -0,0 +1,85 @@
+"""
+Tests for belief_store: versioned facts, the delta hash table and what wizards end up believing.
+"""
+
+import numpy as np
+
+from belief_store import FIELD, FIELDS, BeliefStore, DeltaTable, FactTable
+from entity_store import EntityStore
+
+
+def small_world(count=30, seed=0)->EntityStore:
+    store = EntityStore()
+    store.spawn('wizard', count, health=np.random.default_rng(seed).random(count), mana=1.0)
+    return store
+
+
+def test_facts_at_every_version():
+    rng = np.random.default_rng(1)
+    store = small_world()
+    facts = FactTable(store)
+    snapshots = [facts.values.copy()]
+    for _ in range(12):
+        # Few rows change each tick, some of them again and again
+        changing = rng.choice(10, 3, replace=False)
+        store['health'][changing] = rng.random(3)
+        store.pass_out(changing[:1])
+        facts.advance()
+        snapshots.append(facts.values.copy())
+    assert facts.history # some facts changed three times or more
+    for version, snapshot in enumerate(snapshots):
+        for field in FIELDS:
+            rows = np.arange(len(store))
+            fact = facts.fact(rows, field)
+            assert np.array_equal(facts.value_at(fact, np.full(len(rows), version)), snapshot[:, FIELD[field]])
+            assert [facts.value(int(f), version) for f in fact] == snapshot[:, FIELD[field]].tolist()
+
+
+def test_new_entities_are_known_from_when_they_appear():
+    store = small_world(5)
+    facts = FactTable(store)
+    store.spawn('zombie', 2, health=0.5)
+    assert facts.advance() == 1 and facts.values.shape == (7, len(FIELDS))
+    assert facts.changed_at[5:].tolist() == [[1] * len(FIELDS)] * 2
+    assert facts.value_at(facts.fact([5, 6], 'health'), [1, 1]).tolist() == [0.5, 0.5]
+
+
+def test_delta_table_matches_a_dict():
+    rng = np.random.default_rng(2)
+    table = DeltaTable(capacity=16)
+    model = {}
+    for version in range(30):
+        keys = rng.integers(0, 400, 40) << 32 | rng.integers(0, 6, 40) # repeats within a batch too
+        values = rng.random(40).astype(np.float32)
+        table.put(keys, values, version)
+        for key, value in zip(keys.tolist(), values.tolist()):
+            model[key] = (value, version) # the last write to a key wins
+    assert len(table) == len(model) and (table.keys != -1).sum() == len(model)
+    probe = np.array(list(model) + [123 << 32 | 7, 5], dtype=np.int64)
+    slots = table.find(probe)
+    assert slots[-2:].tolist() == [-1, -1]
+    for key, slot in zip(probe[:-2].tolist(), slots[:-2].tolist()):
+        assert (table.values[slot].item(), table.versions[slot].item()) == model[key] == table.get(key)
+    assert table.get(5) is None
+
+
+def test_deltas_last_until_wizards_look_around():
+    store = small_world(4)
+    facts = FactTable(store)
+    beliefs = BeliefStore(facts)
+    beliefs.believe([0, 1], 3, 'alive', 0.0) # a rumour that wizard 3 is dead
+    assert beliefs.wrong([0, 1, 2], 3, 'alive').tolist() == [True, True, False]
+    store['health'][2] = 0.0
+    facts.advance()
+    # Nobody has looked since version 0: wizard 2 still looks healthy, the rumour still stands
+    healthy = facts.previous[2, FIELD['health']].item()
+    assert healthy > 0.0 and beliefs.belief(0, 2, 'health') == healthy
+    assert beliefs.beliefs([0, 1, 2], 3, 'alive').tolist() == [0.0, 0.0, 1.0]
+    beliefs.catch_up([1])
+    assert beliefs.beliefs([0, 1], 3, 'alive').tolist() == [0.0, 1.0] # wizard 1 saw for themselves
+    assert beliefs.belief(1, 2, 'health') == 0.0 and beliefs.belief(0, 2, 'health') != 0.0
+    # A rumour heard after looking around wins over what was seen
+    beliefs.believe(1, 2, 'health', 0.75)
+    assert beliefs.belief(1, 2, 'health') == 0.75
+    beliefs.catch_up()
+    assert not beliefs.wrong(np.arange(4), [3, 3, 2, 2], 'health').any()
@@ -0,0 +1,45 @@
+"""
+Tests for case_tagger.CaseTagger against Syntagm.set_case, phrase by phrase.
+"""
+
+import numpy as np
+
+from action_classes import CASES, CATEGORIES, PARTICLE_CASES, Syntagm
+from case_tagger import CaseTagger
+
+
+def test_phrases_end_at_particles():
+    tagger = CaseTagger({'tasu': 1007, 'pekang': 2})
+    assert tagger.tag_tokens('tasu w4 tasu tasu w0 pekang t3 pekang'.split()) == [
+        (['tasu', 'w4'], 'topic', 'noun'),
+        (['tasu', 'tasu', 'w0'], 'object', 'noun'),
+        (['pekang', 't3'], 'conjunct', 'verb'),
+        (['pekang'], 'neutral', 'noun'), # no particle closes the last phrase
+    ]
+
+
+def test_empty_and_unknown():
+    tagger = CaseTagger()
+    ends, cases, categories = tagger.tag(np.zeros(0, dtype=np.int32))
+    assert len(ends) == len(cases) == len(categories) == 0
+    assert tagger.tag_tokens(['dragon', 'g4']) == [(['dragon', 'g4'], 'subject', 'noun')]
+
+
+def test_particles_get_ids_past_the_vocabulary():
+    tagger = CaseTagger({'tasu': 5, 'w0': 3})
+    assert tagger.vocabulary['w0'] == 3
+    assert min(tagger.vocabulary[p] for p in PARTICLE_CASES if p != 'w0') == 6
+
+
+def test_agrees_with_syntagm():
+    rng = np.random.default_rng(3)
+    words = ['tasu', 'pekang', 'gorak'] + list(PARTICLE_CASES)
+    tagger = CaseTagger({w: i for i, w in enumerate(words[:3])})
+    tokens = [words[i] for i in rng.integers(0, len(words), 2000)]
+    ends, cases, categories = tagger.tag(tagger.encode(tokens))
+    assert ends[-1] == len(tokens)
+    start = 0
+    for end, case, category in zip(ends.tolist(), cases.tolist(), categories.tolist()):
+        syntagm = Syntagm('noun', 'neutral')
+        assert syntagm.set_case(tokens[start:end]) == (CATEGORIES[category], CASES[case])
+        start = end
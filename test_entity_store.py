@@ -0,0 +1,78 @@
+"""
+Tests for entity_store.EntityStore: batch updates against the action_classes methods, and row views.
+"""
+
+import numpy as np
+import pytest
+
+from action_classes import Apparition, MortalNinja, Person, Wizard, Zombie
+from entity_store import ALIVE, FLAGS, KINDS, KIND_FLAGS, MORTAL, VISIBLE, EntityStore
+
+
+def mixed_store(seed=1, per_kind=40)->EntityStore:
+    # Every kind, with random flags so the rules are tried from every starting state
+    rng = np.random.default_rng(seed)
+    store = EntityStore(capacity=4)
+    for kind in KINDS:
+        flags = {name: rng.random(per_kind) < 0.5 for name in FLAGS}
+        store.spawn(kind, per_kind, health=rng.random(per_kind) + 0.1, rank=np.arange(per_kind), **flags)
+    return store
+
+
+@pytest.mark.parametrize('update', ['die', 'pass_out', 'wake_up', 'birth', 'vanish'])
+def test_batch_updates_follow_the_class_methods(update):
+    batched, looped = mixed_store(), mixed_store()
+    rows = np.flatnonzero(np.random.default_rng(2).random(len(batched)) < 0.7)
+    getattr(batched, update)(rows)
+    for row in rows.tolist():
+        view = looped.view(row)
+        if hasattr(view, update): # only apparitions and ninjas vanish
+            getattr(view, update)()
+        elif update == 'vanish':
+            view.visible = False
+    assert np.array_equal(batched.flags[:len(batched)], looped.flags[:len(looped)])
+    assert np.array_equal(batched['health'], looped['health'])
+
+
+def test_die_reports_who_died():
+    store = EntityStore()
+    store.spawn('wizard', 2)
+    store.spawn('person', 2, health=1.0)
+    store.spawn('zombie', 1, mortal=False)
+    assert store.die().tolist() == [False, False, True, True, True] # wizards aren't mortal, zombies always die
+    assert store['alive'].tolist() == [True, True, False, False, False]
+    assert store['health'].tolist() == [0.0] * 5
+
+
+def test_spawn_defaults_and_growth():
+    store = EntityStore(capacity=2)
+    rows = store.spawn('apparition', 3, x=[1.0, 2.0, 3.0], name=['a', 'b', 'c'], spells=['boo'])
+    rows2 = store.spawn('ninja', 2, visible=False)
+    assert rows.tolist() == [0, 1, 2] and rows2.tolist() == [3, 4] and store.capacity >= 5
+    assert store['x'].tolist() == [1.0, 2.0, 3.0, 0.0, 0.0]
+    assert store.objects['name'] == ['a', 'b', 'c', None, None] and store.objects['spells'][:3] == [['boo']] * 3
+    assert store.flags[0] == KIND_FLAGS['apparition'] and store.flags[3] == KIND_FLAGS['ninja'] & ~VISIBLE
+    assert store.of_kind('ninja').tolist() == [3, 4] and store.mask(MORTAL).tolist() == [False] * 3 + [True] * 2
+    with pytest.raises(ValueError):
+        store.spawn('dragon')
+    with pytest.raises(ValueError):
+        store.spawn('person', wings=2)
+
+
+def test_views_are_the_original_classes():
+    store = EntityStore()
+    wizard = Wizard(name='Merlin', id=7, certainty=0.5, rudeness=0.1, mana=3.0, real=True, pronunciation=None, face=None,
+                    age=900.0, mortal=False, alive=True, conscious=True, health=1.0, vitality=1.0, strength=0.5,
+                    agility=0.5, intelligence=1.0, category='wizard', power=2.0, rank=1, spells=['fireball'])
+    row = store.add(wizard)
+    view = store.view(row)
+    assert isinstance(view, Wizard) and not isinstance(view, Zombie)
+    assert (view.name, view.id, view.power, view.spells, view.mortal) == ('Merlin', 7, 2.0, ['fireball'], False)
+    view.mortal = True
+    view.health = 0.25
+    assert store['mortal'][row] and store['health'][row] == 0.25
+    assert view.die() and not store['alive'][row] and store['health'][row] == 0.0
+    for kind, cls in zip(KINDS, (Person, Wizard, Zombie, Apparition, MortalNinja)):
+        assert isinstance(store.view(int(store.spawn(kind)[0])), cls)
+    with pytest.raises(IndexError):
+        store.view(len(store))
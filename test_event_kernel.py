@@ -0,0 +1,114 @@
+"""
+Tests for event_kernel: event order, and its pools against the SimPy resources they mirror.
+"""
+
+import random
+
+import pytest
+
+from event_kernel import Container, EventKernel, PreemptivePool, PriorityPool, ServerPool
+
+
+def test_events_fire_in_time_order_fifo_on_ties():
+    kernel = EventKernel()
+    fired = []
+    record = lambda k, entity: fired.append((k.now, entity))
+    for entity, delay in enumerate([2.0, 1.0, 2.0, 0.0, 1.0]):
+        kernel.schedule(delay, record, entity)
+    kernel.run()
+    assert fired == [(0.0, 3), (1.0, 1), (1.0, 4), (2.0, 0), (2.0, 2)]
+
+
+def test_run_until_leaves_later_events_and_cancel_skips():
+    kernel = EventKernel()
+    fired = []
+    record = lambda k, entity: fired.append(entity)
+    kernel.schedule(1.0, record, 1)
+    dropped = kernel.schedule(2.0, record, 2)
+    kernel.schedule(5.0, record, 5)
+    kernel.cancel(dropped)
+    kernel.run(until=5.0)
+    assert fired == [1] and kernel.now == 5.0 and kernel.peek() == 5.0
+    kernel.run()
+    assert fired == [1, 5]
+
+
+def queue_with_kernel(arrivals, services, capacity)->list:
+    kernel = EventKernel()
+    pool = ServerPool(capacity)
+    started = [None] * len(arrivals)
+    def arrive(k, i):
+        pool.request(k, serve, i)
+    def serve(k, i):
+        started[i] = k.now
+        k.schedule(services[i], done, i)
+    def done(k, i):
+        pool.release(k)
+    for i, t in enumerate(arrivals):
+        kernel.schedule_at(t, arrive, i)
+    kernel.run()
+    return started
+
+
+def queue_with_simpy(arrivals, services, capacity)->list:
+    simpy = pytest.importorskip('simpy')
+    env = simpy.Environment()
+    resource = simpy.Resource(env, capacity)
+    started = [None] * len(arrivals)
+    def customer(i):
+        yield env.timeout(arrivals[i])
+        with resource.request() as request:
+            yield request
+            started[i] = env.now
+            yield env.timeout(services[i])
+    for i in range(len(arrivals)):
+        env.process(customer(i))
+    env.run()
+    return started
+
+
+def test_server_pool_serves_like_simpy_resource():
+    rng = random.Random(7)
+    arrivals = sorted(rng.uniform(0, 20) for _ in range(200))
+    services = [rng.expovariate(0.5) for _ in range(200)]
+    assert queue_with_kernel(arrivals, services, 3) == queue_with_simpy(arrivals, services, 3)
+
+
+def test_theater_matches_simpy():
+    pytest.importorskip('simpy')
+    from resource_sim import benchmark_kernel
+    result = benchmark_kernel(3, 3, 3, until=30)
+    assert result['equal_wait_times'] and result['equal_monitors']
+
+
+def test_container_waits_for_its_level_in_order():
+    kernel = EventKernel()
+    pool = Container(10.0, level=3.0)
+    got = []
+    take = lambda k, entity: got.append((k.now, entity))
+    pool.get(kernel, 5.0, take, 0)
+    pool.get(kernel, 1.0, take, 1) # waits behind the first, even though the level covers it
+    kernel.schedule(1.0, lambda k, _: pool.put(k, 4.0))
+    kernel.run()
+    assert got == [(1.0, 0), (1.0, 1)] and pool.level == 1.0
+
+
+def test_priority_and_preemption():
+    kernel = EventKernel()
+    fired = []
+    record = lambda k, entity: fired.append(entity)
+    pool = PriorityPool(1)
+    pool.request(kernel, record, 0, priority=5)
+    pool.request(kernel, record, 1, priority=3)
+    pool.request(kernel, record, 2, priority=1)
+    pool.release(kernel)
+    kernel.run()
+    assert fired == [0, 2]
+
+    preempted = []
+    slots = PreemptivePool(1)
+    slots.request(kernel, record, 10, priority=2, on_preempt=lambda k, entity: preempted.append(entity))
+    assert not slots.request(kernel, record, 11, priority=2) # equal priority waits
+    assert slots.request(kernel, record, 12, priority=1)
+    kernel.run()
+    assert preempted == [10] and slots.holds(12) and slots.queue_length == 1
@@ -0,0 +1,55 @@
+"""
+Tests for event_log.EventWriter appending to an existing log, and EventLog.replay.
+"""
+
+import numpy as np
+import pytest
+
+from event_log import RECORD, EventLog, EventWriter, battle, store_arrays
+
+
+def test_append_after_partial_record(tmp_path):
+    path = str(tmp_path / 'battle.wzlog')
+    battle(path, wizards=200, ticks=3, acts_per_tick=50, casts_per_tick=4)
+    before = np.array(EventLog(path).records)
+    # A crash partway through writing a record
+    with open(path, 'ab') as f:
+        f.write(b'\x01' * (RECORD.itemsize // 2))
+
+    with EventWriter(path) as log:
+        log.append(before[-5:])
+    after = EventLog(path).records
+    assert len(after) == len(before) + 5
+    assert np.array_equal(after[:len(before)], before)
+    assert np.array_equal(after['roles'][len(before):], before['roles'][-5:])
+    assert (after['batch'][len(before):] == before['batch'][-1] + 1).all()
+
+
+def test_quiet_battle(tmp_path):
+    # Ticks where no spell hits anyone are logged without errors
+    path = str(tmp_path / 'quiet.wzlog')
+    run = battle(path, wizards=50, ticks=2, acts_per_tick=0, casts_per_tick=0, keep=(2,))
+    assert len(EventLog(path)) == 0 and 2 in run['kept']
+
+
+def test_ticks_cannot_go_down(tmp_path):
+    path = str(tmp_path / 'battle.wzlog')
+    battle(path, wizards=100, ticks=3, acts_per_tick=20, casts_per_tick=2)
+    records = np.array(EventLog(path).records)
+    with EventWriter(path) as log:
+        with pytest.raises(ValueError):
+            log.append(records[:1]) # tick 0, after tick 2
+        with pytest.raises(ValueError):
+            log.append(records[::-1][:len(records) // 2 + 2])
+        log.append(records[-1:])
+    assert len(EventLog(path)) == len(records) + 1
+
+
+def test_replay_matches_live_world(tmp_path):
+    path = str(tmp_path / 'battle.wzlog')
+    keep = (0, 3, 4, 7, 10)
+    run = battle(path, wizards=300, ticks=10, acts_per_tick=100, casts_per_tick=8, snapshot_every=4, keep=keep)
+    log = EventLog(path)
+    for tick in keep:
+        replayed = store_arrays(log.replay(tick))
+        assert all(np.array_equal(replayed[k], v) for k, v in run['kept'][tick].items()), tick
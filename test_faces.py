@@ -0,0 +1,60 @@
+"""
+Tests for faces: emotions on top of identity, rendering, and the FaceIndex IVF search.
+"""
+
+import numpy as np
+
+from faces import (EMOTIONS, FACE_PARAMS, IDENTITY, FaceIndex, disguise, express, perceive, random_faces, read_emotion,
+                   render, to_bytes, to_floats, write_pgm)
+
+BANK = random_faces(3000, seed=5)
+
+
+def exact_nearest(faces)->tuple:
+    vectors, queries = to_floats(BANK)[:, IDENTITY], np.atleast_2d(to_floats(faces))[:, IDENTITY]
+    d2 = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return d2.argmin(axis=1), d2.min(axis=1)
+
+
+def test_probing_every_list_is_exact():
+    index = FaceIndex(BANK, lists=40, probes=40)
+    assert len(index) == len(BANK) and sorted(index.ids.tolist()) == list(range(len(BANK)))
+    queries = perceive(random_faces(200, seed=6), 0.05, seed=7)
+    ids, d2 = index.search(queries)
+    _, expected = exact_nearest(queries)
+    assert np.allclose(d2, expected, rtol=1e-5, atol=1e-7)
+
+
+def test_few_probes_still_find_known_faces():
+    index = FaceIndex(BANK, probes=4)
+    rows = np.arange(0, len(BANK), 7)
+    # A wizard's own face, wearing any emotion, lands in their own list: emotions don't touch identity
+    seen = express(BANK[rows], np.arange(len(rows)) % len(EMOTIONS))
+    assert np.array_equal(index.identify(seen), rows)
+    assert np.array_equal(index.identify(perceive(BANK[rows], 0.01, seed=1)), rows)
+    # Someone from outside the bank is a stranger, someone made up as a wizard is mistaken for them
+    assert np.all(index.identify(random_faces(50, seed=8), max_distance=0.02) == -1)
+    assert np.array_equal(index.identify(disguise(random_faces(len(rows), seed=9), BANK[rows], amount=1.0)), rows)
+
+
+def test_emotions_read_back():
+    resting = BANK[:len(EMOTIONS) * 20]
+    emotions = np.arange(len(resting)) % len(EMOTIONS)
+    read, amount = read_emotion(express(resting, emotions, 0.8), resting)
+    strong = emotions != 0
+    assert np.array_equal(read, emotions) and np.allclose(amount[strong], 0.8, atol=0.1)
+    # Faint expressions read as neutral
+    read, _ = read_emotion(express(resting, 'happy', 0.1), resting)
+    assert np.all(read == 0)
+
+
+def test_bytes_and_rendering(tmp_path):
+    assert BANK.dtype == np.uint8 and BANK.shape == (3000, len(FACE_PARAMS))
+    assert np.array_equal(to_bytes(to_floats(BANK)), BANK)
+    images = render(BANK[:5], size=24, batch=2)
+    assert images.shape == (5, 24, 24) and images.dtype == np.uint8
+    assert np.array_equal(images[3], render(BANK[3], size=24)[0]) # batching doesn't change a face
+    assert not np.array_equal(render(express(BANK[3], 'surprised'), size=24)[0], images[3])
+    path = tmp_path / 'face.pgm'
+    write_pgm(str(path), images[0])
+    assert path.read_bytes() == b'P5 24 24 255\n' + images[0].tobytes()
@@ -0,0 +1,70 @@
+"""
+Tests for hearing.Hearing: who is in earshot, inverse-square falloff and mishearing.
+"""
+
+import numpy as np
+
+from entity_store import EntityStore
+from hearing import LOST, Hearing, confusion_table
+from spatial_grid import SpatialGrid, brute_force_query
+
+VOCABULARY = ['tasu', 'tipo', 'taka', 'pekang', 'pokeng', 'gorak', 'w0', 'g4', 'x']
+
+
+def crowd(n=400, side=60.0, seed=3)->EntityStore:
+    rng = np.random.default_rng(seed)
+    store = EntityStore()
+    store.spawn('wizard', n, x=rng.uniform(0, side, n), y=rng.uniform(0, side, n), conscious=rng.random(n) < 0.8)
+    return store
+
+
+def test_listeners_match_brute_force():
+    store = crowd()
+    rng = np.random.default_rng(4)
+    speakers = rng.choice(len(store), 40, replace=False)
+    loudness = rng.uniform(0.1, 4.0, 40)
+    hearing = Hearing(VOCABULARY)
+    heard = hearing.hear(store, speakers, loudness, np.zeros((40, 3), dtype=np.int32))
+    conscious = np.flatnonzero(store['conscious'])
+    q, p, d2 = brute_force_query(store['x'][conscious], store['y'][conscious], store['x'][speakers], store['y'][speakers],
+                                 hearing.radius(loudness))
+    p = conscious[p]
+    keep = p != speakers[q] # nobody hears themselves
+    assert sorted(zip(heard.utterance.tolist(), heard.listener.tolist())) == sorted(zip(q[keep].tolist(), p[keep].tolist()))
+    # Inverse square, at least the threshold everywhere in earshot, and no louder than the voice up close
+    expected = dict(zip(zip(q[keep].tolist(), p[keep].tolist()), (loudness[q[keep]] / np.maximum(d2[keep], 1.0)).tolist()))
+    assert np.allclose(heard.intensity, [expected[k] for k in zip(heard.utterance.tolist(), heard.listener.tolist())])
+    assert np.all(heard.intensity >= hearing.threshold * (1 - 1e-9)) and np.all(heard.intensity <= loudness[heard.utterance])
+    # A grid shared with other systems finds the same pairs
+    grid = SpatialGrid(store['x'][conscious], store['y'][conscious], 5.0, conscious)
+    shared = hearing.hear(store, speakers, loudness, np.zeros((40, 3), dtype=np.int32), grid)
+    assert sorted(zip(shared.utterance.tolist(), shared.listener.tolist())) == sorted(zip(heard.utterance.tolist(), heard.listener.tolist()))
+
+
+def test_far_listeners_mishear_more():
+    store = crowd(2000, 120.0)
+    hearing = Hearing(VOCABULARY, seed=5)
+    speakers = np.arange(0, 2000, 10)
+    tokens = hearing.encode([['tasu', 'w0', 'pekang', 'x']] * len(speakers))
+    heard = hearing.hear(store, speakers, 4.0, tokens)
+    changed = heard.tokens != tokens[heard.utterance]
+    clear = heard.intensity >= hearing.clear
+    assert not changed[clear].any() # loud enough is heard perfectly
+    # Each token is misheard with probability 1 - intensity / clear
+    far = heard.intensity < 0.02
+    assert changed[far].mean() > 0.8 > changed[~far & ~clear].mean()
+    # Misheard words sound alike, or are lost
+    for said, got in zip(tokens[heard.utterance][changed].tolist(), heard.tokens[changed].tolist()):
+        assert got == LOST or (len(VOCABULARY[got]) == len(VOCABULARY[said]) and VOCABULARY[got][0] == VOCABULARY[said][0])
+    assert set(heard.tokens[:, 3].tolist()) == {hearing.index['x'], LOST} # nothing sounds like it
+
+
+def test_confusions_and_encoding():
+    table = confusion_table(VOCABULARY, width=6, seed=1)
+    index = {w: i for i, w in enumerate(VOCABULARY)}
+    assert set(table[index['tasu']].tolist()) <= {index['tipo'], index['taka']}
+    assert set(table[index['pekang']].tolist()) == {index['pokeng']}
+    assert set(table[index['gorak']].tolist()) == {LOST}
+    hearing = Hearing(VOCABULARY)
+    tokens = hearing.encode(['tasu w0', ['x']])
+    assert tokens.tolist() == [[0, 6], [8, LOST]] and hearing.words(tokens[1]) == ['x', '...']
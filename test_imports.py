@@ -0,0 +1,63 @@
+"""
+Checks that every module in the project can be imported as a library.
+
+Each module is imported in a fresh interpreter, which must print nothing, must not pull in the
+heavy dependencies (they are imported where they're used), and must finish within a time budget.
+Run it with `python -m pytest test_imports.py`, or `python test_imports.py` for the timings.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pygame', 'pymunk', 'matplotlib', 'scipy', 'simpy')
+
+IMPORT_BUDGET = 0.25 # seconds per module
+
+PROBE = """
+import io, json, sys, time
+captured = io.StringIO()
+sys.stdout = captured
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+sys.stdout = sys.__stdout__
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': seconds, 'printed': captured.getvalue(), 'heavy': heavy}}))
+"""
+
+
+def project_modules()->list[str]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return sorted(name[:-3] for name in os.listdir(here)
+                  if name.endswith('.py') and not name.startswith('test_'))
+
+
+def probe_import(module: str)->dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=here, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise AssertionError(f"import {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def quiet_imports(budget=IMPORT_BUDGET)->dict:
+    report = {}
+    for module in project_modules():
+        probe = probe_import(module)
+        assert probe['printed'] == '', f"import {module} printed {probe['printed']!r}"
+        assert not probe['heavy'], f"import {module} imported {probe['heavy']}"
+        assert probe['seconds'] < budget, f"import {module} took {probe['seconds']:.3f}s"
+        report[module] = probe['seconds']
+    return report
+
+
+def test_quiet_imports():
+    quiet_imports()
+
+
+if __name__ == "__main__":
+    for module, seconds in quiet_imports().items():
+        print(f"{module}: {seconds * 1000:.1f} ms")
@@ -0,0 +1,87 @@
+"""
+Tests for intent_scheduler: the ring-buffer queues, dispatch timing and the console front-end.
+"""
+
+import asyncio
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+from intent_scheduler import AGENT, PATIENT, IntentQueues, IntentScheduler, console, parse_command
+from world_updater import DEFAULT_VERB_IDS
+
+
+def test_queues_wrap_around_like_fifos():
+    rng = np.random.default_rng(4)
+    queues = IntentQueues(5, depth=3)
+    assert queues.depth == 4
+    model = [deque() for _ in range(5)]
+    serial = 0
+    for _ in range(300):
+        if rng.random() < 0.5:
+            agents = rng.integers(0, 5, rng.integers(1, 8))
+            intents = np.zeros((len(agents), 5), dtype=np.int32)
+            intents[:, PATIENT] = serial + np.arange(len(agents))
+            serial += len(agents)
+            fits = queues.push_many(agents, intents)
+            for agent, intent, fit in zip(agents.tolist(), intents[:, PATIENT].tolist(), fits.tolist()):
+                # Intents past a full queue are dropped, the ones before them in the batch kept
+                assert fit == (len(model[agent]) < 4)
+                if fit:
+                    model[agent].append(intent)
+        elif rng.random() < 0.5:
+            agent = int(rng.integers(0, 5))
+            assert queues.push(agent, (0, 0, agent, serial, 1)) == (len(model[agent]) < 4)
+            if len(model[agent]) < 4:
+                model[agent].append(serial)
+            serial += 1
+        else:
+            agents = np.array([a for a in range(5) if model[a] and rng.random() < 0.7], dtype=np.int64)
+            popped = queues.pop_many(agents)[:, PATIENT].tolist()
+            assert popped == [model[a].popleft() for a in agents.tolist()]
+        assert queues.count.tolist() == [len(m) for m in model]
+    assert len(queues) == sum(map(len, model)) and queues.head.max() > 0
+
+
+def test_agents_act_once_per_reaction_time():
+    scheduler = IntentScheduler(3, depth=4, reaction=[1.0, 2.0, 0.5])
+    acted = []
+    scheduler.default = lambda s, agents, intents: acted.append((s.now, agents.tolist(), intents[:, PATIENT].tolist()))
+    scheduler.intend_many([0, 0, 0, 1, 1, 2], [7] * 6, [10, 11, 12, 20, 21, 30])
+    assert scheduler.run(until=5.0, tick=1.0) == 6
+    assert acted == [(0.0, [0, 1, 2], [10, 20, 30]), (1.0, [0], [11]), (2.0, [0, 1], [12, 21])]
+    assert not len(scheduler.queues) and scheduler.dispatched == 6
+    # An idle agent acts as soon as it has something to do again
+    assert scheduler.intend(2, 7, 31) and scheduler.step() == 1 and acted[-1] == (5.0, [2], [31])
+
+
+def test_one_handler_call_per_verb():
+    scheduler = IntentScheduler(6)
+    calls = []
+    scheduler.on(1, lambda s, agents, intents: calls.append(('one', agents.tolist())))
+    scheduler.on(2, lambda s, agents, intents: calls.append(('two', agents.tolist(), intents[:, AGENT].tolist())))
+    scheduler.intend_many(np.arange(6), [2, 1, 2, 3, 1, 2], np.zeros(6), actors=[5, 4, 3, 2, 1, 0])
+    assert scheduler.dispatch(1.0) == 6
+    assert calls == [('one', [1, 4]), ('two', [0, 2, 5], [5, 3, 0])] # verb 3 has no handler and no default
+
+
+def test_console_commands_go_through_the_queue():
+    assert parse_command('kill 12') == (DEFAULT_VERB_IDS['kill'], 12, True, None)
+    assert parse_command('say kill 12 3') == (DEFAULT_VERB_IDS['kill'], 12, False, 3)
+    for line in ('kill', 'kill twelve', 'dance 1', 'say kill 1 2 3'):
+        with pytest.raises(ValueError):
+            parse_command(line)
+    scheduler = IntentScheduler(4, depth=1)
+    heard, echoed = [], []
+    scheduler.on(DEFAULT_VERB_IDS['kill'], lambda s, agents, intents: heard.extend(intents[:, PATIENT].tolist()))
+    async def typed():
+        for line in ('kill 3', 'kill 2', 'what', ''):
+            yield line
+        await asyncio.sleep(0.05)
+        yield 'kill 1'
+        await asyncio.sleep(0.05)
+    asyncio.run(console(scheduler, 0, typed(), tick=0.1, speed=100.0, echo=echoed.append))
+    # The second kill found the one-slot queue still full
+    assert heard == [3, 1] and len(echoed) == 2
@@ -0,0 +1,60 @@
+"""
+Tests for lexicon_store.LexiconStore: building, saving and memory-mapping it back.
+"""
+
+import numpy as np
+import pytest
+
+import wizard_language as wl
+
+from lexicon_store import LexiconStore, default_store, synthetic_records
+
+RECORDS = [
+    {'id': 7, 'en': 'wizard', 'jp': 'mahoutsukai', 'wz': 'tasu', 'class': 'noun'},
+    {'id': 3, 'en': 'cast', 'jp': 'kakeru', 'wz': 'pekang', 'class': 'verb'},
+    {'id': 12, 'en': 'cat', 'jp': 'neko', 'wz': 'myaq', 'class': 'familiar'}, # a class the store hasn't heard of
+    {'id': 40, 'en': 'wizard', 'jp': 'mahoutsukai', 'wz': 'tasuq', 'class': 'noun'}, # same English word
+]
+
+
+def test_records_round_trip(tmp_path):
+    store = LexiconStore.from_records(RECORDS)
+    path = str(tmp_path / 'lexicon.wzlx')
+    store.save(path)
+    loaded = LexiconStore.load(path)
+    assert len(loaded) == 4 and loaded.ids.tolist() == [3, 7, 12, 40]
+    for lex in RECORDS:
+        assert loaded.lexeme(lex['id']) == lex
+    assert loaded.lookup('myaq') == 12
+    assert loaded.of_class('noun').tolist() == [7, 40] and loaded.of_class('dragon').tolist() == []
+    # The two 'wizard's are one interned string
+    assert loaded.columns['en'][loaded.row(7)] == loaded.columns['en'][loaded.row(40)]
+    with pytest.raises(KeyError):
+        loaded.row(8)
+
+
+def test_load_maps_the_file(tmp_path):
+    path = str(tmp_path / 'lexicon.wzlx')
+    LexiconStore.from_records(synthetic_records(2000)).save(path)
+    loaded = LexiconStore.load(path)
+    # Read-only views onto the mapping, not copies
+    assert not loaded.ids.flags.owndata and not loaded.ids.flags.writeable
+    assert np.shares_memory(loaded.ids, np.frombuffer(loaded.source, dtype=np.uint8))
+    assert loaded.lexeme(1999) == synthetic_records(2000)[1999]
+
+
+def test_bad_files_and_records(tmp_path):
+    path = tmp_path / 'not_a_lexicon.wzlx'
+    path.write_bytes(b'WZEVLOG1' + bytes(64))
+    with pytest.raises(ValueError):
+        LexiconStore.load(str(path))
+    with pytest.raises(ValueError):
+        LexiconStore.from_records(RECORDS + [dict(RECORDS[0], id=99)]) # a second 'tasu'
+    with pytest.raises(ValueError):
+        LexiconStore.from_records(RECORDS + [dict(RECORDS[0], wz='tasut')]) # a second id 7
+
+
+def test_default_store_has_the_language_lexicons():
+    store = default_store()
+    for lex in list(wl.lexicon_en.values()) + list(wl.lexicon_wz.values()):
+        assert store.lexeme(lex['id']) == {k: lex[k] for k in ('id', 'en', 'jp', 'wz', 'class')}
@@ -0,0 +1,73 @@
+"""
+Tests for resource_sim: the staffing search and the Wizard power-up model.
+"""
+
+import itertools
+import math
+import random
+
+from resource_sim import POWER_BOOST, SPELL_COST, confidence_interval, evaluate_staffing, make_wizards, replicate, run_power_ups, search_staffing
+
+SEARCH = dict(max_staff=6, batch=4, max_replications=16, until=30)
+
+
+def run_here(jobs)->list:
+    return [replicate(job) for job in jobs]
+
+
+def test_replications_use_common_random_numbers():
+    assert replicate(((2, 2, 2), 5, 30)) == replicate(((2, 2, 2), 5, 30))
+    assert replicate(((2, 2, 2), 5, 30)) != replicate(((2, 2, 2), 6, 30))
+
+
+def test_confidence_interval():
+    assert confidence_interval([3.0]) == (float('-inf'), float('inf'))
+    low, high = confidence_interval([1.0, 2.0, 3.0])
+    assert math.isclose((low + high) / 2, 2.0) and math.isclose(high - 2.0, 1.959963984540054 / math.sqrt(3))
+
+
+def test_evaluation_stops_once_the_interval_clears_the_target():
+    result = evaluate_staffing((6, 6, 6), 100.0, run_here, batch=4, until=30)
+    assert result['replications'] == 4 and result['separated'] and result['meets_target']
+
+
+def test_search_finds_the_cheapest_staffing():
+    found = search_staffing(10.0, workers=0, **SEARCH)
+    best = found['best']
+    assert best['meets_target'] and best['mean_wait'] < 10.0
+    cheaper = [c for c in itertools.product(range(1, 7), repeat=3) if sum(c) < sum(best['config'])]
+    assert not any(evaluate_staffing(c, 10.0, run_here, 4, 16, until=30)['meets_target'] for c in cheaper)
+    assert search_staffing(5.0, workers=0, **SEARCH)['best'] is None
+
+
+def test_process_pool_gives_the_same_answer():
+    assert search_staffing(10.0, workers=2, **SEARCH) == search_staffing(10.0, workers=0, **SEARCH)
+
+
+def power_ups(seed=3, wizards=200):
+    rng = random.Random(seed)
+    crowd = make_wizards(wizards, rng)
+    # Two stations and three casting slots for 200 wizards, so everything queues
+    return crowd, run_power_ups(crowd, 2, 3, 20.0, 30.0, rng)
+
+
+def test_power_ups_are_reproducible():
+    _, first = power_ups()
+    _, second = power_ups()
+    assert (first.spells_cast, first.preemptions, first.power_up_wait.mean) == (second.spells_cast, second.preemptions, second.power_up_wait.mean)
+
+
+def test_wizards_cast_with_boost_and_mana_and_give_them_back():
+    wizards, station = power_ups()
+    assert station.spells_cast > 0 and station.preemptions > 0
+    for wizard in wizards:
+        # From power-up to the end of its cast a wizard holds the boost, and one spell's mana once it's drawn
+        assert (wizard.power, wizard.mana) in ((1.0, 0.0), (1.0 + POWER_BOOST, 0.0), (1.0 + POWER_BOOST, SPELL_COST))
+    assert 0.0 <= station.mana_pool.level <= station.mana_pool.capacity
+
+
+def test_casting_slots_go_to_the_best_ranks():
+    wizards, station = power_ups()
+    holders = [wizards[w].rank for w in station.casting.users]
+    waiting = [priority for priority, *_ in station.casting.waiting]
+    assert len(holders) == 3 and max(holders) < min(waiting)
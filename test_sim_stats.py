@@ -0,0 +1,72 @@
+"""
+Tests for sim_stats against the exact statistics they stream.
+"""
+
+import math
+import random
+import statistics
+
+import pytest
+
+from sim_stats import P2Quantile, ResourceMonitor, RunningStats, SimStats
+
+
+def test_running_stats_match_statistics():
+    rng = random.Random(1)
+    xs = [rng.gauss(5.0, 2.0) for _ in range(1000)]
+    running = RunningStats()
+    for x in xs:
+        running.add(x)
+    assert running.count == 1000 and (running.minimum, running.maximum) == (min(xs), max(xs))
+    assert math.isclose(running.mean, statistics.mean(xs))
+    assert math.isclose(running.variance, statistics.variance(xs))
+
+
+def test_p2_quantiles_are_close_to_exact():
+    rng = random.Random(2)
+    xs = [rng.expovariate(1.0) for _ in range(20000)]
+    exact = statistics.quantiles(xs, n=100)
+    for p in (0.5, 0.9, 0.99):
+        estimator = P2Quantile(p)
+        for x in xs:
+            estimator.add(x)
+        assert estimator.value == pytest.approx(exact[round(p * 100) - 1], rel=0.05)
+
+
+def test_p2_with_few_samples_and_bad_p():
+    estimator = P2Quantile(0.5)
+    assert math.isnan(estimator.value)
+    for x in (3.0, 1.0, 2.0):
+        estimator.add(x)
+    assert estimator.value == 2.0
+    with pytest.raises(ValueError):
+        P2Quantile(1.0)
+
+
+def test_resource_monitor_is_time_weighted():
+    monitor = ResourceMonitor(capacity=2, interval=1.0, max_bins=4)
+    monitor.update(0.0, 0, 1)
+    monitor.update(1.5, 3, 2) # one busy for 1.5, then both busy with 3 waiting
+    monitor.update(2.0, 0, 0)
+    monitor.update(4.0, 0, 0)
+    assert monitor.utilization == pytest.approx((1.5 * 1 + 0.5 * 2) / (4.0 * 2))
+    assert monitor.mean_queue_length == pytest.approx(0.5 * 3 / 4.0)
+    assert monitor.max_queue_length == 3
+    assert monitor.series() == pytest.approx([(0.0, 0.0, 0.5), (1.0, 1.5, 0.75), (2.0, 0.0, 0.0), (3.0, 0.0, 0.0)])
+
+
+def test_long_stretch_keeps_only_max_bins():
+    monitor = ResourceMonitor(capacity=1, max_bins=8)
+    monitor.update(0.0, 0, 1)
+    monitor.update(1e6, 0, 0)
+    assert [start for start, _, _ in monitor.series()] == [1e6 - 8 + i for i in range(8)]
+    assert monitor.utilization == 1.0
+
+
+def test_each_run_gets_its_own_collector():
+    first, second = SimStats(), SimStats()
+    first.wait.add(1.0)
+    first.monitor('cashiers', 1).update(0.0, 2, 1)
+    first.finish(2.0)
+    assert second.summary() == {'wait': second.wait.summary()} and second.wait.count == 0
+    assert first.summary()['cashiers'] == {'mean_queue_length': 2.0, 'max_queue_length': 2, 'utilization': 1.0}
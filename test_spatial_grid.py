@@ -0,0 +1,34 @@
+"""
+Tests for spatial_grid.SpatialGrid against brute_force_query.
+"""
+
+import numpy as np
+import pytest
+
+from spatial_grid import SpatialGrid, brute_force_query
+
+
+def pairs(q, p, d2)->list:
+    return sorted(zip(q.tolist(), p.tolist(), d2.tolist()))
+
+
+@pytest.mark.parametrize('cell_size', [0.5, 3.0, 40.0])
+def test_query_matches_brute_force(cell_size):
+    rng = np.random.default_rng(7)
+    x, y = rng.uniform(-20, 80, 600), rng.uniform(0, 50, 600)
+    qx, qy = rng.uniform(-40, 100, 200), rng.uniform(-20, 70, 200) # some from outside the grid
+    radius = rng.choice([0.0, 0.3, 2.0, 7.5, 31.0], 200) # mixed radii, each with its own block of cells
+    grid = SpatialGrid(x, y, cell_size)
+    assert pairs(*grid.query(qx, qy, radius)) == pairs(*brute_force_query(x, y, qx, qy, radius))
+    # Candidates come out grouped by query, in query order, whatever the mix of radii
+    q, _ = grid.candidates(qx, qy, radius)
+    assert np.all(np.diff(q) >= 0)
+
+
+def test_ids_edges_and_empty_grids():
+    grid = SpatialGrid([0.0, 1.0, 2.0], [0.0, 0.0, 0.0], 1.0, ids=[10, 11, 12])
+    q, ids, d2 = grid.query(1.0, 0.0, 1.0) # points exactly on the circle count
+    assert sorted(ids.tolist()) == [10, 11, 12] and q.tolist() == [0, 0, 0]
+    assert [len(a) for a in grid.query([], [], 5.0)] == [0, 0, 0]
+    assert [len(a) for a in SpatialGrid([], [], 1.0).query(0.0, 0.0, 5.0)] == [0, 0, 0]
+    assert [len(a) for a in grid.query(50.0, 50.0, 2.0)] == [0, 0, 0]
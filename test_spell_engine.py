@@ -0,0 +1,139 @@
+"""
+Tests for spell_engine.SpellEngine.cast(): batches that hit nobody, and what a hit does.
+"""
+
+import numpy as np
+
+from entity_store import ALIVE, CONSCIOUS, MORTAL
+from spell_engine import SpellEngine
+from wizard_realizer import Realizer
+from world_updater import DEFAULT_VERB_IDS, WORLD_VERBS, battle_store
+
+
+def spread_store(count=10):
+    # Wizards 1000 apart, out of reach of each other's spells
+    store = battle_store(count)
+    store['x'][:] = np.arange(count) * 1000.0
+    store['y'][:] = 0.0
+    return store
+
+
+def spell(engine, name):
+    return engine.spellbook.ids[[s.name for s in engine.spellbook.spells].index(name)]
+
+
+def assert_nothing_happened(store, result, casts):
+    assert len(result.cast) == len(result.target) == len(result.dealt) == 0
+    assert len(result.died) == len(result.killer) == 0
+    assert result.fizzled.shape == (casts,)
+    assert result.events.shape == (0, 11)
+    assert result.to_events() == []
+    assert (store['health'] == 1.0).all()
+    assert (store.flags[:len(store)] & ALIVE).all()
+
+
+def test_empty_batch():
+    store = spread_store()
+    result = SpellEngine(store).cast([], [], [], [])
+    assert_nothing_happened(store, result, 0)
+
+
+def test_all_fizzled():
+    store = spread_store()
+    engine = SpellEngine(store)
+    spell = engine.spellbook.ids[0]
+    store.die(np.array([1]))
+    # An unknown spell, a dead caster, and a caster passed out, all aimed at wizard 0
+    store.pass_out(np.array([2]))
+    health = store['health'].copy()
+    result = engine.cast([3, 1, 2], [9999, spell, spell], [0.0] * 3, [0.0] * 3)
+    assert result.fizzled.all()
+    assert len(result.target) == 0 and result.events.shape == (0, 11)
+    assert (store['health'] == health).all()
+
+
+def test_all_miss():
+    store = spread_store()
+    engine = SpellEngine(store)
+    spell = engine.spellbook.ids[0]
+    result = engine.cast([0], [spell], [500.0], [500.0])
+    assert not result.fizzled.any()
+    assert_nothing_happened(store, result, 1)
+
+
+def test_events_render_from_the_lexicon():
+    store = spread_store()
+    store['x'][1] = 2.0
+    engine = SpellEngine(store)
+    result = engine.cast([0], [engine.spellbook.ids[0]], [2.0], [0.0])
+    realizer = Realizer()
+    frames = [event.frame(store['id']) for event in result.to_events()]
+    assert [realizer.render(frame, 'en') for frame in frames] == ['thing did fireball thing']
+    for verb in WORLD_VERBS:
+        assert realizer.store.surface(DEFAULT_VERB_IDS[verb], 'en') == verb
+
+
+def test_aim_is_pulled_back_to_reach():
+    store = spread_store()
+    store['x'][1] = 19.0 # inside a fireball's reach of 20 plus radius 3
+    store['power'][:] = 1.0
+    engine = SpellEngine(store)
+    result = engine.cast([0], [spell(engine, 'fireball')], [500.0], [0.0])
+    assert result.target.tolist() == [1]
+    assert np.isclose(store['health'][1], 0.4)
+
+
+def test_damage_from_every_cast_is_summed():
+    store = spread_store()
+    store['x'][[1, 2]] = [5.0, 10.0]
+    store['power'][:] = 0.3
+    engine = SpellEngine(store)
+    fireball = spell(engine, 'fireball')
+    engine.cast([0, 2], [fireball, fireball], [5.0, 5.0], [0.0, 0.0])
+    assert np.isclose(store['health'][1], 1.0 - 2 * 0.6 * 0.3)
+
+
+def test_the_dead_are_not_healed():
+    store = spread_store()
+    store['x'][1] = 5.0
+    store.die(np.array([1]))
+    engine = SpellEngine(store)
+    result = engine.cast([0], [spell(engine, 'mending rain')], [5.0], [0.0])
+    assert result.dealt.tolist() == [0.0]
+    assert store['health'][1] == 0.0 and not store.flags[1] & ALIVE
+
+
+def test_kill_goes_to_the_cast_that_did_most_damage():
+    store = spread_store()
+    store['x'][[1, 2]] = [5.0, 10.0]
+    store['power'][[0, 2]] = [1.0, 0.5]
+    store['health'][1] = 0.5
+    engine = SpellEngine(store)
+    fireball = spell(engine, 'fireball')
+    result = engine.cast([2, 0], [fireball, fireball], [5.0, 5.0], [0.0, 0.0])
+    assert result.died.tolist() == [1] and result.killer.tolist() == [1]
+    kill = result.to_events()[-1]
+    assert (kill.verb, kill.agent, kill.patient) == (DEFAULT_VERB_IDS['kill'], 0, 1)
+
+
+def test_immortals_survive_at_no_health():
+    store = spread_store()
+    store['x'][1] = 5.0
+    store['power'][0] = 1.0
+    store['health'][1] = 0.5
+    store.set_flag(np.array([1]), MORTAL, False)
+    engine = SpellEngine(store)
+    result = engine.cast([0], [spell(engine, 'fireball')], [5.0], [0.0])
+    assert len(result.died) == 0
+    assert store['health'][1] == 0.0 and store.flags[1] & ALIVE
+
+
+def test_stun_beats_wake():
+    store = spread_store()
+    store['x'][[1, 2]] = [5.0, 10.0]
+    store.pass_out(np.array([1]))
+    engine = SpellEngine(store)
+    engine.cast([0, 2], [spell(engine, 'thunderclap'), spell(engine, 'mending rain')], [5.0, 5.0], [0.0, 0.0])
+    assert not store.flags[1] & CONSCIOUS
+    engine.cast([0], [spell(engine, 'mending rain')], [5.0], [0.0]) # wizard 2 was stunned by the thunderclap too
+    assert store.flags[1] & CONSCIOUS
@@ -0,0 +1,43 @@
+"""
+Tests for text_functors.MapCache on chains of maps and bound methods.
+"""
+
+import gc
+
+from text_functors import WZ_TO_ROMAJI, MapCache, StringFunctor
+
+
+def test_chain_hits_cache():
+    cache = MapCache()
+    exclaim = lambda s: s + '!'
+    values = [StringFunctor('w4 n1', cache=cache).map(WZ_TO_ROMAJI).map(str.upper).map(exclaim).value
+              for _ in range(3)]
+    assert values == ['WA NI!'] * 3
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+
+
+def test_chain_results_go_with_their_steps():
+    cache = MapCache()
+    for i in range(100):
+        StringFunctor(str(i), cache=cache).map(str.upper).map(lambda s: s + '?').value
+    gc.collect()
+    assert len(cache) == 0
+
+
+class Shout:
+    def __init__(self, mark):
+        self.mark = mark
+
+    def shout(self, s):
+        return s.upper() + self.mark
+
+
+def test_bound_methods_hit_and_go_with_their_instance():
+    cache = MapCache()
+    loud, louder = Shout('!'), Shout('!!')
+    values = [StringFunctor('hi', cache=cache).map(shouter.shout).value for shouter in (loud, loud, louder)]
+    assert values == ['HI!', 'HI!', 'HI!!']
+    assert (cache.hits, cache.misses) == (1, 2)
+    del loud, louder
+    gc.collect()
+    assert len(cache) == 0
@@ -0,0 +1,66 @@
+"""
+Tests for vision.Vision.see() against brute_force_sight, fresh and reusing the last tick.
+"""
+
+import numpy as np
+
+from entity_store import VISIBLE
+from vision import Vision, brute_force_sight, maze
+from world_updater import battle_store
+
+
+def field(count=300, side=60.0, seed=5):
+    rng = np.random.default_rng(seed)
+    store = battle_store(count, seed)
+    store['x'][:] = rng.uniform(0, side, count)
+    store['y'][:] = rng.uniform(0, side, count)
+    store['heading'][:] = rng.uniform(-np.pi, np.pi, count)
+    return store, rng
+
+
+def pairs(sight)->set:
+    return set(zip(sight.viewer.tolist(), sight.target.tolist()))
+
+
+def test_wall_blocks_sight():
+    store = battle_store(2)
+    store['x'][:] = [0.0, 10.0]
+    store['y'][:] = 0.0
+    store['heading'][:] = [0.0, np.pi]
+    assert pairs(Vision().see(store)) == {(0, 1), (1, 0)}
+    assert pairs(Vision([((5.0, -1.0), (5.0, 1.0))]).see(store)) == set()
+
+
+def test_see_matches_brute_force():
+    store, _ = field()
+    vision = Vision(maze(60.0, 10, length=10.0))
+    sight = vision.see(store)
+    assert pairs(sight) == brute_force_sight(store, vision)
+    assert (np.diff(sight.viewer) >= 0).all()
+
+
+def test_reused_sight_matches_brute_force_as_things_change():
+    store, rng = field()
+    vision = Vision(maze(60.0, 10, length=10.0))
+    vision.see(store)
+    for tick in range(5):
+        movers = rng.choice(len(store), 20, replace=False)
+        store['x'][movers] += rng.normal(0, 2.0, len(movers))
+        store['y'][movers[:10]] += rng.normal(0, 2.0, 10)
+        store['heading'][movers[5:15]] += rng.normal(0, 0.5, 10)
+        store.set_flag(rng.choice(len(store), 3), VISIBLE, bool(tick % 2))
+        store.pass_out(rng.choice(len(store), 2))
+        sight = vision.see(store)
+        assert vision.recomputed < len(store) // 2
+        assert pairs(sight) == brute_force_sight(store, vision)
+        for row in movers[:3].tolist():
+            assert set(vision.visible(row).tolist()) == {t for v, t in pairs(sight) if v == row}
+
+
+def test_everyone_moving_looks_again():
+    store, rng = field()
+    vision = Vision()
+    vision.see(store)
+    store['x'][:] += rng.normal(0, 1.0, len(store))
+    assert pairs(vision.see(store)) == brute_force_sight(store, vision)
+    assert vision.recomputed == len(store)
@@ -0,0 +1,58 @@
+"""
+Tests for wizard_generator: minimum lengths, bounded sentences that parse, and reproducible corpora.
+"""
+
+import random
+
+import pytest
+
+import wizard_parser
+
+from wizard_generator import INFINITE, SentenceGenerator, check_generated, default_vocabulary, generate_corpus, min_lengths
+
+
+def shortest_sentence(grammar, vocabulary, shortest, s)->int:
+    # Following shortest rules down to words, the way sentence() does past max_depth
+    r = shortest[s]
+    if r < 0:
+        return 1
+    return sum(shortest_sentence(grammar, vocabulary, shortest, sym) for sym in grammar.rule_rhs[r])
+
+
+@pytest.mark.parametrize('name', ['wizard', 'english', 'french', 'russian'])
+def test_shortest_rules_reach_the_minimum_length(name):
+    grammar = wizard_parser.get_compiled(name)
+    vocabulary = default_vocabulary(grammar)
+    symbol_length, _, shortest = min_lengths(grammar, vocabulary)
+    for s in range(len(grammar.symbols)):
+        if symbol_length[s] < INFINITE:
+            assert shortest_sentence(grammar, vocabulary, shortest, s) == symbol_length[s]
+
+
+def test_sentences_stay_under_max_length_and_parse():
+    assert check_generated('wizard', count=100, max_length=8) == 100
+    assert check_generated('english', count=50, max_length=10) == 50
+    # With no slack at all, every sentence is one of the shortest
+    generator = SentenceGenerator(wizard_parser.get_compiled('french'), max_length=4)
+    rng = random.Random(5)
+    assert {len(generator.sentence(rng)) for _ in range(200)} == {4}
+
+
+def test_grammars_too_long_for_max_length():
+    with pytest.raises(ValueError):
+        SentenceGenerator(wizard_parser.get_compiled('wizard_1')) # every <sentence> contains another
+    with pytest.raises(ValueError):
+        SentenceGenerator(wizard_parser.get_compiled('french'), max_length=3)
+
+
+def test_corpus_is_the_same_for_any_number_of_workers(tmp_path):
+    generator = SentenceGenerator(wizard_parser.get_compiled('wizard'))
+    assert list(generator.sentences(20, seed=7)) == list(generator.sentences(20, seed=7))
+    serial = generate_corpus(str(tmp_path / 'serial'), 101, shards=3, seed=7, workers=0, chunk=16)
+    pooled = generate_corpus(str(tmp_path / 'pooled'), 101, shards=3, seed=7, workers=2, chunk=16)
+    assert [count for _, count, _ in serial] == [34, 34, 33]
+    for (a, count, tokens), (b, _, _) in zip(serial, pooled):
+        with open(a, encoding='utf-8') as f, open(b, encoding='utf-8') as g:
+            lines = f.read().splitlines()
+            assert lines == g.read().splitlines()
+        assert len(lines) == count and sum(len(line.split()) for line in lines) == tokens
@@ -0,0 +1,105 @@
+"""
+Tests for the wizard_parser Earley parser, its parse forest and the compiled grammar cache.
+"""
+
+import os
+
+import pytest
+
+import wizard_parser
+from wizard_parser import (GRAMMARS, IncrementalParser, compile_grammar, get_compiled, grammar_digest, load_compiled,
+                           load_grammar, long_sentence, parse)
+
+
+def toy(text):
+    return compile_grammar(load_grammar(text))
+
+
+def test_ambiguity_is_packed_not_enumerated():
+    grammar = toy("<e> ::= <e> '+' <e> | 'n'")
+    catalan = [1, 1, 2, 5, 14, 42, 132, 429]
+    for terms, trees in enumerate(catalan, start=1):
+        forest = parse(' + '.join(['n'] * terms).split(), grammar, {})
+        assert forest.accepted and forest.count_trees() == trees
+        # One symbol node per span of terms, however many trees share it
+        assert forest.size()['symbol_nodes'] == terms * (terms + 1) // 2
+    assert parse(['n', '+'], grammar, {}).accepted is False
+
+
+def test_tree_follows_the_tokens():
+    forest = parse(['n', '+', 'n'], toy("<e> ::= <e> '+' <e> | 'n'"), {})
+    assert forest.tree() == ('<e>', [('<e>', ['n']), '+', ('<e>', ['n'])])
+
+
+def test_repetition_and_optional_notation():
+    grammar = toy("<s> ::= 'a'* {'c'} 'b'+")
+    for sentence, accepted in (('b', True), ('a a c b b', True), ('c b', True), ('a', False), ('b a', False), ('c c b', False)):
+        assert parse(sentence.split(), grammar, {}).accepted is accepted, sentence
+
+
+def test_bad_grammar_text():
+    for text in ("<s> 'a'", "s ::= 'a'", "<s> ::= {'a'", "<s> ::= * 'a'"):
+        with pytest.raises(ValueError):
+            load_grammar(text)
+
+
+def test_wizard_sentences():
+    grammar = get_compiled('wizard')
+    forest = parse(long_sentence(1), grammar)
+    assert forest.accepted and forest.tree()[0] == '<sentence>'
+    # Every clause chained on adds readings
+    counts = [parse(long_sentence(c), grammar).count_trees() for c in (1, 2, 3, 4)]
+    assert counts[0] > 1 and all(a < b for a, b in zip(counts, counts[1:]))
+    assert not parse(['w0', 'tasu'], grammar).accepted
+
+
+def test_feeding_tokens_builds_the_batch_forest():
+    grammar = get_compiled('wizard')
+    for tokens in (long_sentence(3), 'tasu w4 tasu w0 pekang'.split(), ['w0', 'w0']):
+        listener = IncrementalParser(grammar)
+        for tok in tokens:
+            partial = listener.feed(tok)
+        batch = parse(tokens, grammar)
+        assert listener.forest.symbols == batch.symbols and listener.forest.links == batch.links
+        assert partial.accepted is batch.accepted and partial.position == len(tokens)
+    assert not IncrementalParser(grammar).feed('w0').viable
+
+
+def test_hypotheses_arrive_with_their_particles():
+    listener = IncrementalParser()
+    heard = [listener.feed(tok) for tok in 'tasu w4 tasu w0 pekang'.split()]
+    assert heard[0].marked == {}
+    assert heard[1].topics == [(0, 1)] and heard[1].objects == [] and not heard[1].accepted
+    assert heard[3].objects == [(2, 3)] and heard[3].viable and not heard[3].accepted
+    assert heard[4].accepted and heard[4].marked == {'topic': [(0, 1)], 'object': [(2, 3)]}
+
+
+def test_earlier_partial_parses_stay_as_they_were():
+    listener = IncrementalParser()
+    heard = [listener.feed(tok) for tok in long_sentence(3)]
+    snapshots = [partial.marked for partial in heard]
+    more = [listener.feed(tok) for tok in long_sentence(2)] # on past the end, adding hypotheses
+    assert sum(map(len, more[-1].marked.values())) > sum(map(len, heard[-1].marked.values()))
+    assert [partial.marked for partial in heard] == snapshots
+    # Each span is found once, at the particle that closes it
+    for case, spans in heard[-1].marked.items():
+        assert len(spans) == len(set(spans))
+
+
+def test_cached_grammar_matches_compiled(tmp_path):
+    text, start = GRAMMARS['wizard']
+    wizard_parser._compiled.clear()
+    load_compiled(text, start, str(tmp_path))
+    wizard_parser._compiled.clear()
+    assert load_compiled(text, start, str(tmp_path)) == compile_grammar(load_grammar(text, start), grammar_digest(text, start))
+
+
+def test_unreadable_cache_file_is_rebuilt(tmp_path):
+    text, start = GRAMMARS['wizard']
+    expected = compile_grammar(load_grammar(text, start), grammar_digest(text, start))
+    path = tmp_path / (grammar_digest(text, start) + '.json')
+    for junk in (b'{"symbols": [', b'\x80\x04\x95 not json', b'{"symbols": []}'):
+        path.write_bytes(junk)
+        wizard_parser._compiled.clear()
+        assert load_compiled(text, start, str(tmp_path)) == expected
+    assert os.path.getsize(path) > 100 # rewritten with the rebuilt grammar
@@ -0,0 +1,73 @@
+"""
+Tests for wizard_realizer.Realizer: word order per language, batches, and the frame cache.
+"""
+
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+from action_classes import ROLES
+from lexicon_store import LexiconStore, synthetic_records
+from wizard_realizer import ASPECT_BIT, LANGUAGES, Realizer, random_frames
+
+STORE = LexiconStore.from_records([
+    {'id': 1, 'en': 'wizard', 'jp': 'mahoutsukai', 'wz': 'tasu', 'class': 'noun'},
+    {'id': 2, 'en': 'dragon', 'jp': 'ryuu', 'wz': 'gorog', 'class': 'noun'},
+    {'id': 3, 'en': 'staff', 'jp': 'tsue', 'wz': 'bokan', 'class': 'noun'},
+    {'id': 10, 'en': 'kill', 'jp': 'korosu', 'wz': 'gorak', 'class': 'verb'},
+])
+
+
+def frame(flags=0, **roles)->tuple:
+    return (10, flags, tuple(roles.get(role, -1) for role in ROLES))
+
+
+@pytest.mark.parametrize('flags, roles, expected', [
+    (0, dict(agent=1, patient=2),
+     ('wizard kill dragon', 'mahoutsukai ga ryuu wo korosu', 'tasu g4 gorog w0 gorak')),
+    (ASPECT_BIT['perfective'], dict(agent=1, patient=2, instrument=3),
+     ('wizard did kill dragon with staff', 'mahoutsukai ga tsue de ryuu wo korosu ta', 'tasu g4 bokan d3 gorog w0 gorak t4')),
+    (ASPECT_BIT['passive'], dict(agent=1, patient=2),
+     ('dragon get kill by wizard', 'mahoutsukai ni ryuu ga korosu rare', 'tasu n1 gorog g4 gorak r4r3')),
+    (ASPECT_BIT['imperative'], dict(agent=1, patient=2),
+     ('kill dragon', 'ryuu wo korosu nasai', 'gorog w0 gorak n4s41')),
+])
+def test_word_order(flags, roles, expected):
+    realizer = Realizer(STORE)
+    assert tuple(realizer.render(frame(flags, **roles), language) for language in LANGUAGES) == expected
+
+
+def test_batch_matches_single_frames():
+    store = LexiconStore.from_records(synthetic_records(500))
+    verb_ids, flags, roles = random_frames(store, 300, distinct=40)
+    for language in LANGUAGES:
+        realizer = Realizer(store)
+        out = np.empty(305, dtype=object)
+        realizer.render_batch(verb_ids, flags, roles, language, out, offset=5)
+        assert list(out[5:]) == [realizer.render(f, language) for f in zip(verb_ids, flags, roles)]
+        assert realizer.render_batch([], [], np.zeros((0, len(ROLES))), language) == []
+
+
+def test_unknown_lexemes_and_languages():
+    realizer = Realizer(STORE)
+    with pytest.raises(KeyError):
+        realizer.render_batch([10], [0], [[99] + [-1] * (len(ROLES) - 1)], 'en')
+    with pytest.raises(ValueError):
+        realizer.template('fr', 1, 0)
+
+
+def test_cache_is_bounded_and_goes_with_the_realizer():
+    realizer = Realizer(STORE, cache_size=2)
+    for agent in (1, 2, 1, 3, 1):
+        realizer.render(frame(agent=agent), 'en')
+    info = realizer.cache_info()
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (2, 3, 2, 2)
+    alive = weakref.ref(realizer)
+    gc.disable()
+    try:
+        del realizer
+        assert alive() is None # freed by reference counting, with no cycle through the cache
+    finally:
+        gc.enable()
@@ -0,0 +1,63 @@
+"""
+Tests for wizard_tokenizer: the DAWG and the segmentation lattices built with it.
+"""
+
+import random
+
+import wizard_parser
+
+from wizard_tokenizer import Dawg, WizardTokenizer
+
+WORDS = ['tasu', 'ta', 'su', 'w0', 'pekang', 'pe', 'kang']
+LEXICON = {'tasu': {'<noun>'}, 'ta': {'<noun>'}, 'su': {'<noun>'}, 'pe': {'<noun>'}, 'kang': {'<noun>'}, 'pekang': {'<verb>'}}
+
+
+def leaves(tree)->list:
+    return [tree] if isinstance(tree, str) else [w for child in tree[1] for w in leaves(child)]
+
+
+def all_segmentations(text, words)->list:
+    if not text:
+        return [[]]
+    return [[w] + rest for w in words if text.startswith(w) for rest in all_segmentations(text[len(w):], words)]
+
+
+def test_dawg_holds_exactly_its_words_and_shares_suffixes():
+    rng = random.Random(4)
+    words = {''.join(rng.choice('tasupk') for _ in range(rng.randint(1, 6))) for _ in range(300)}
+    dawg = Dawg(words)
+    others = {''.join(rng.choice('tasupk') for _ in range(rng.randint(1, 6))) for _ in range(300)} - words
+    assert all(w in dawg for w in words) and not any(w in dawg for w in others)
+    # tasu, pasu and masu share everything after their first letter: root, one state per letter after
+    assert len(Dawg(['tasu', 'pasu', 'masu'])) == 5
+    assert list(Dawg(WORDS).prefixes('tasuw0', 0)) == [2, 4]
+
+
+def test_lattice_keeps_only_complete_segmentations():
+    tokenizer = WizardTokenizer(WORDS)
+    lattice = tokenizer.lattice('tasu w0 pekang') # spaces are ignored, speech has none
+    assert lattice.complete and lattice.count() == 4
+    assert sorted(lattice.segmentations()) == sorted(all_segmentations('tasuw0pekang', WORDS))
+    # 'ta' can't start a complete segmentation of 'tasuk', so no edge is left for it
+    dead_end = WizardTokenizer(['ta', 'tasu', 'suk']).lattice('tasuk')
+    assert dead_end.edges[0] == [(2, 'ta')] and dead_end.count() == 1
+    assert not tokenizer.lattice('tasuq').complete
+
+
+def test_counts_match_enumeration():
+    rng = random.Random(9)
+    words = ['a', 'b', 'ab', 'ba', 'aba', 'bb']
+    tokenizer = WizardTokenizer(words)
+    for _ in range(50):
+        text = ''.join(rng.choice('ab') for _ in range(rng.randint(1, 12)))
+        assert tokenizer.lattice(text).count() == len(all_segmentations(text, words))
+
+
+def test_lattice_parses_in_one_chart():
+    lattice = WizardTokenizer(WORDS).lattice('tasuw0pekang')
+    forest = wizard_parser.parse_lattice(lattice, wizard_parser.get_compiled('wizard'), LEXICON)
+    assert forest.accepted and forest.count_trees() > 1
+    assert ''.join(leaves(forest.tree())) == 'tasuw0pekang'
+    spoken = WizardTokenizer.from_store().lattice('tasuw0pekang')
+    assert list(spoken.segmentations()) == [['tasu', 'w0', 'pekang']]
+    assert wizard_parser.parse_lattice(spoken).accepted
@@ -0,0 +1,78 @@
+"""
+Tests for wizard_translator.Translator: reading frames back from Wizard Language and the two caches.
+"""
+
+import gc
+import random
+import weakref
+
+import pytest
+
+from action_classes import ROLES
+from lexicon_store import LexiconStore, synthetic_records
+from wizard_realizer import ASPECT_BIT
+from wizard_translator import ROLE_INDEX, Translator
+
+STORE = LexiconStore.from_records(synthetic_records(2000, 5))
+
+
+def random_frames(count, seed)->list:
+    rng = random.Random(seed)
+    nouns = STORE.of_class('noun').tolist()
+    verbs = STORE.of_class('verb').tolist()
+    flag_choices = [0, ASPECT_BIT['perfective'], ASPECT_BIT['passive'], ASPECT_BIT['potential'] | ASPECT_BIT['perfective']]
+    frames = []
+    for _ in range(count):
+        roles = [-1] * len(ROLES)
+        for role in ('agent', 'patient', 'instrument'):
+            if role != 'instrument' or rng.random() < 0.5:
+                roles[ROLE_INDEX[role]] = rng.choice(nouns)
+        frames.append((rng.choice(verbs), rng.choice(flag_choices), tuple(roles)))
+    return frames
+
+
+def test_frames_read_back_from_their_wizard_language():
+    translator = Translator(STORE)
+    for frame in random_frames(100, 2):
+        spoken = translator.realizer.render(frame, 'wz')
+        assert translator.frame(spoken) == frame, spoken
+        for language in ('en', 'jp'):
+            assert translator.translate(spoken, language) == translator.realizer.render(frame, language)
+
+
+def test_not_wizard_language():
+    translator = Translator(STORE)
+    with pytest.raises(ValueError):
+        translator.frame('w0 w0')
+    assert translator.cache_info().currsize == 0 # failures aren't cached
+
+
+def test_repeats_come_from_the_caches():
+    translator = Translator(STORE)
+    spoken = [translator.realizer.render(frame, 'wz') for frame in random_frames(10, 3)]
+    fresh = Translator(STORE)
+    for sentence in spoken * 5:
+        fresh.translate(sentence, 'en')
+    # String and token forms of a sentence are one entry
+    fresh.frame(spoken[0].split())
+    info = fresh.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (41, 10, 10)
+    assert fresh.hit_rate() == {'parse': 41 / 51, 'render': 40 / 50}
+
+
+def test_parse_cache_is_bounded_and_goes_with_the_translator():
+    translator = Translator(STORE, cache_size=4)
+    spoken = [translator.realizer.render(frame, 'wz') for frame in random_frames(6, 4)]
+    for sentence in spoken:
+        translator.frame(sentence)
+    translator.frame(spoken[2])
+    translator.frame(spoken[0]) # evicted, so parsed again
+    info = translator.cache_info()
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 7, 4, 4)
+    alive = weakref.ref(translator)
+    gc.disable()
+    try:
+        del translator
+        assert alive() is None # freed by reference counting, with no cycle through the caches
+    finally:
+        gc.enable()
@@ -0,0 +1,82 @@
+"""
+Tests for world_updater.Updater conflict resolution and mana.
+"""
+
+import numpy as np
+
+from action_classes import Event
+from entity_store import ALIVE
+from world_updater import ACCEPTED, CONFLICT, DEFAULT_VERB_IDS, NO_MANA, SPELL_COST, Updater, battle_store
+
+KILL = DEFAULT_VERB_IDS['kill']
+HEAL = DEFAULT_VERB_IDS['heal']
+
+
+def store_of(count=4):
+    store = battle_store(count)
+    store['mana'][:] = 1.0
+    store['power'][:] = 0.5
+    return store
+
+
+def test_mana_only_pays_for_spells_that_win():
+    store = store_of()
+    store['mana'][0] = SPELL_COST['kill'] # enough for one kill
+    store['power'][1] = 1.0 # wizard 1 outranks wizard 0 on any target
+    updater = Updater(store)
+    updater.submit(0, Event(KILL, agent=0, patient=2))
+    updater.submit(0, Event(KILL, agent=0, patient=3))
+    updater.submit(1, Event(KILL, agent=1, patient=2))
+    result = updater.tick()
+    assert result.outcome.tolist() == [CONFLICT, ACCEPTED, ACCEPTED]
+    assert not (store.flags[[2, 3]] & ALIVE).any()
+    assert np.isclose(store['mana'][0], 0.0)
+
+
+def test_winning_spells_are_rationed():
+    store = store_of()
+    store['mana'][0] = SPELL_COST['kill'] * 1.5
+    updater = Updater(store)
+    updater.submit(0, Event(KILL, agent=0, patient=3))
+    updater.submit(0, Event(KILL, agent=0, patient=2))
+    result = updater.tick()
+    # Paid for by target row, so the kill on row 2 goes first
+    assert result.outcome.tolist() == [NO_MANA, ACCEPTED]
+    assert result.applied.tolist() == [1]
+
+
+def test_spell_beyond_mana_does_not_block_the_target():
+    store = store_of()
+    store['mana'][0] = 0.0
+    store['power'][0] = 1.0
+    updater = Updater(store)
+    updater.submit(0, Event(KILL, agent=0, patient=2))
+    updater.submit(1, Event(KILL, agent=1, patient=2))
+    result = updater.tick()
+    assert result.outcome.tolist() == [NO_MANA, ACCEPTED]
+
+
+def test_target_falls_to_next_caster_when_winner_cannot_pay():
+    store = store_of()
+    store['mana'][0] = SPELL_COST['kill'] # enough for one of its two kills
+    store['power'][0] = 1.0 # wizard 0 wins both targets
+    updater = Updater(store)
+    updater.submit(0, Event(KILL, agent=0, patient=2))
+    updater.submit(0, Event(KILL, agent=0, patient=3))
+    updater.submit(1, Event(KILL, agent=1, patient=3))
+    result = updater.tick()
+    assert result.outcome.tolist() == [ACCEPTED, NO_MANA, ACCEPTED]
+    assert not (store.flags[[2, 3]] & ALIVE).any()
+
+
+def test_cheaper_spell_is_paid_after_a_refused_one():
+    store = store_of()
+    store['mana'][0] = SPELL_COST['kill'] + SPELL_COST['heal']
+    store['health'][1] = 0.5
+    updater = Updater(store)
+    updater.submit(0, Event(KILL, agent=0, patient=2))
+    updater.submit(0, Event(KILL, agent=0, patient=3))
+    updater.submit(0, Event(HEAL, agent=0, patient=1))
+    result = updater.tick()
+    assert result.outcome.tolist() == [ACCEPTED, NO_MANA, ACCEPTED]
+    assert store['health'][1] > 0.5 and store['mana'][0] < 1e-6
@@ -1,13 +1,301 @@
 #!/usr/bin/python3
+"""
+Text functors for Wizard Language surfaces
+
+StringFunctor wraps a string so transformations can be chained with map(). map() only records
+the function; the chain runs when .value is read, as one fused Pipeline, so a chain of maps is a
+single call per value and no intermediate functors are evaluated. Consecutive CharMap steps
+(per-character tables like the Wizard Language digit vowels) are merged into one str.translate
+table, so they really are one pass over the text.
+
+Results are memoized in a MapCache keyed on (value, identity of each function in the chain). The old version used
+@lru_cache on the method, which kept every functor and every lambda ever mapped alive for the
+life of the process. MapCache holds its functions through weak references, so a function's
+results go when the function does, and each function's results are a bounded LRU.
+
+Transliteration: WZ_TO_ROMAJI turns the digit vowels of Wizard Language (w4, g4, n1, ...) into
+romaji, ROMAJI_TO_KANA turns romaji into hiragana, and WZ_TO_KANA does both after rewriting the
+particles to the kana Japanese writes them with (w4 -> は, not わ).
+"""
+
+import random
+import re
+import time
+import weakref
+
+from collections import OrderedDict
+
 from typing import Any, Callable
 
-from functools import lru_cache
+MISSING = object()
+
+
+class _CacheNode:
+    # Results for one chain of functions, and the nodes of the chains that extend it by one step
+    __slots__ = ('results', 'weak', 'strong', 'methods')
+
+    def __init__(self):
+        self.results = OrderedDict()
+        self.weak = weakref.WeakKeyDictionary()
+        self.strong = {}
+        self.methods = weakref.WeakKeyDictionary() # instance -> node keyed by its methods' functions
+
+    def child(self, func)->"_CacheNode":
+        owner, function = getattr(func, '__self__', None), getattr(func, '__func__', None)
+        if owner is not None and function is not None:
+            # A bound method is a new object every time it's looked up, so it's keyed as
+            # (instance, function), the instance weakly. Instances that can't be weakly
+            # referenced are keyed by the method as before, which never hits.
+            try:
+                methods = self.methods.get(owner)
+                if methods is None:
+                    methods = self.methods[owner] = _CacheNode()
+                return methods.child(function)
+            except TypeError:
+                pass
+        try:
+            node = self.weak.get(func)
+            if node is None:
+                node = self.weak[func] = _CacheNode()
+        except TypeError:
+            node = self.strong.get(func)
+            if node is None:
+                node = self.strong[func] = _CacheNode()
+        return node
+
+    def __len__(self)->int:
+        nodes = list(self.weak.values()) + list(self.strong.values()) + list(self.methods.values())
+        return len(self.results) + sum(len(n) for n in nodes)
+
+
+class MapCache:
+    """
+    value -> result LRU per function, each bounded to maxsize entries. Functions are held weakly,
+    so their results are dropped when the function is garbage collected. Functions that can't be
+    weakly referenced (builtins like str.upper) live for the whole process anyway and are held normally.
+    A bound method is cached under its instance (weakly) and its function, so obj.method hits
+    each time it is looked up again and its results go with obj.
+
+    A chain of functions is cached under its steps, one weak level per step, so reading the same
+    chain again hits without building its Pipeline, and its results go when any of its steps does.
+    """
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._root = _CacheNode()
+        self.hits = 0
+        self.misses = 0
+
+    def _results(self, steps: tuple)->OrderedDict:
+        node = self._root
+        for step in steps:
+            node = node.child(step)
+        return node.results
+
+    def __call__(self, func: Callable[[str], str], value: str)->str:
+        return self.chain((func,), value)
+
+    def chain(self, steps: tuple, value: str)->str:
+        # Pipeline(*steps)(value), with the Pipeline only built on a miss
+        results = self._results(steps)
+        result = results.get(value, MISSING)
+        if result is not MISSING:
+            self.hits += 1
+            results.move_to_end(value)
+            return result
+        self.misses += 1
+        result = (steps[0] if len(steps) == 1 else Pipeline(*steps))(value)
+        results[value] = result
+        if len(results) > self.maxsize:
+            results.popitem(last=False)
+        return result
+
+    def __len__(self)->int:
+        return len(self._root)
+
+    def clear(self)->None:
+        self._root = _CacheNode()
+
+
+default_cache = MapCache()
+
+
+class CharMap:
+    """A per-character table for str.translate. Adjacent CharMaps in a Pipeline merge into one."""
+    __slots__ = ('table', '__weakref__')
+
+    def __init__(self, table: dict):
+        self.table = str.maketrans(table) if any(isinstance(k, str) for k in table) else dict(table)
+
+    def then(self, other: "CharMap")->"CharMap":
+        # Each character goes through self, and whatever it became goes through other
+        table = {c: (None if out is None else (chr(out) if isinstance(out, int) else out).translate(other.table))
+                 for c, out in self.table.items()}
+        for c, out in other.table.items():
+            table.setdefault(c, out)
+        return CharMap(table)
+
+    def __call__(self, text: str)->str:
+        return text.translate(self.table)
+
+
+class Pipeline:
+    """A chain of str -> str functions, fused when it's built and run as one call."""
+    __slots__ = ('steps', '_run', '__weakref__')
+
+    def __init__(self, *steps: Callable[[str], str]):
+        fused = []
+        for step in steps:
+            for s in (step.steps if isinstance(step, Pipeline) else (step,)):
+                if isinstance(s, CharMap) and fused and isinstance(fused[-1], CharMap):
+                    fused[-1] = fused[-1].then(s)
+                else:
+                    fused.append(s)
+        self.steps = tuple(fused)
+        if len(fused) == 1:
+            self._run = fused[0]
+        else:
+            def run(text, steps=self.steps):
+                for step in steps:
+                    text = step(text)
+                return text
+            self._run = run
+
+    def then(self, func: Callable[[str], str])->"Pipeline":
+        return Pipeline(self, func)
+
+    __or__ = then
+
+    def __call__(self, text: str)->str:
+        return self._run(text)
+
 
 class StringFunctor:
-    def __init__(self, value: str):
-        self.value = value
-    # memoize results    
-    @lru_cache
+    __slots__ = ('source', 'steps', 'cache', '_value')
+
+    def __init__(self, value: str, steps: tuple = (), cache: MapCache = None):
+        self.source = value
+        self.steps = steps
+        self.cache = default_cache if cache is None else cache
+        self._value = MISSING
+
     def map(self, func: Callable[[Any], str]) -> "StringFunctor":
-        # Recursively apply func() to a text input.
-        return StringFunctor(func(self.value))
\ No newline at end of file
+        # Recorded, not applied: the whole chain runs once when the value is read
+        return StringFunctor(self.source, self.steps + (func,), self.cache)
+
+    @property
+    def value(self)->str:
+        if self._value is MISSING:
+            if not self.steps:
+                self._value = self.source
+            else:
+                # Keyed by the steps themselves, so the same chain of maps reuses results
+                self._value = self.cache.chain(self.steps, self.source)
+        return self._value
+
+    def __str__(self)->str:
+        return self.value
+
+    def __repr__(self)->str:
+        return f"StringFunctor({self.value!r})"
+
+
+# Transliteration
+
+# Wizard Language writes some vowels as digits, see the particles in wizard_language.py
+WZ_VOWELS = {'4': 'a', '0': 'o', '1': 'i', '3': 'e', '7': 'u'}
+WZ_TO_ROMAJI = CharMap(WZ_VOWELS)
+
+KANA_PARTICLES = {
+    'w4': 'は', 'w0': 'を', 'g4': 'が', 'n1': 'に', 'd3': 'で', 'h3': 'へ', 'n0': 'の',
+    'm0': 'も', 't0': 'と', 'y4': 'や', 'k4': 'か', 't3': 'て', 'q4': 'か', 'n3': 'ね',
+}
+
+HIRAGANA = {
+    'a': 'あ', 'i': 'い', 'u': 'う', 'e': 'え', 'o': 'お',
+    'ka': 'か', 'ki': 'き', 'ku': 'く', 'ke': 'け', 'ko': 'こ',
+    'ga': 'が', 'gi': 'ぎ', 'gu': 'ぐ', 'ge': 'げ', 'go': 'ご',
+    'sa': 'さ', 'shi': 'し', 'si': 'し', 'su': 'す', 'se': 'せ', 'so': 'そ',
+    'za': 'ざ', 'ji': 'じ', 'zi': 'じ', 'zu': 'ず', 'ze': 'ぜ', 'zo': 'ぞ',
+    'ta': 'た', 'chi': 'ち', 'ti': 'ち', 'tsu': 'つ', 'tu': 'つ', 'te': 'て', 'to': 'と',
+    'da': 'だ', 'de': 'で', 'do': 'ど',
+    'na': 'な', 'ni': 'に', 'nu': 'ぬ', 'ne': 'ね', 'no': 'の',
+    'ha': 'は', 'hi': 'ひ', 'fu': 'ふ', 'hu': 'ふ', 'he': 'へ', 'ho': 'ほ',
+    'ba': 'ば', 'bi': 'び', 'bu': 'ぶ', 'be': 'べ', 'bo': 'ぼ',
+    'pa': 'ぱ', 'pi': 'ぴ', 'pu': 'ぷ', 'pe': 'ぺ', 'po': 'ぽ',
+    'ma': 'ま', 'mi': 'み', 'mu': 'む', 'me': 'め', 'mo': 'も',
+    'ya': 'や', 'yu': 'ゆ', 'yo': 'よ',
+    'ra': 'ら', 'ri': 'り', 'ru': 'る', 're': 'れ', 'ro': 'ろ',
+    'wa': 'わ', 'wo': 'を',
+    'kya': 'きゃ', 'kyu': 'きゅ', 'kyo': 'きょ', 'gya': 'ぎゃ', 'gyu': 'ぎゅ', 'gyo': 'ぎょ',
+    'sha': 'しゃ', 'shu': 'しゅ', 'sho': 'しょ', 'ja': 'じゃ', 'ju': 'じゅ', 'jo': 'じょ',
+    'cha': 'ちゃ', 'chu': 'ちゅ', 'cho': 'ちょ', 'nya': 'にゃ', 'nyu': 'にゅ', 'nyo': 'にょ',
+    'hya': 'ひゃ', 'hyu': 'ひゅ', 'hyo': 'ひょ', 'mya': 'みゃ', 'myu': 'みゅ', 'myo': 'みょ',
+    'rya': 'りゃ', 'ryu': 'りゅ', 'ryo': 'りょ', 'bya': 'びゃ', 'byu': 'びゅ', 'byo': 'びょ',
+    'pya': 'ぴゃ', 'pyu': 'ぴゅ', 'pyo': 'ぴょ',
+    'n': 'ん',
+}
+
+# A doubled consonant is a small tsu, a nasal (n, ng, m) with no vowel after it is ん, and
+# otherwise the longest syllable wins. Anything else (c, q, l...) is left as is.
+_SYLLABLE = re.compile('([kgsztdbpmrhfjc])(?=\\1)|(ng?|m)(?![aiueoy])|'
+                       + '|'.join(sorted(map(re.escape, HIRAGANA), key=len, reverse=True)))
+
+def _kana(match)->str:
+    if match.group(1):
+        return 'っ'
+    if match.group(2):
+        return 'ん'
+    return HIRAGANA[match.group(0)]
+
+def romaji_to_kana(text: str)->str:
+    return _SYLLABLE.sub(_kana, text)
+
+
+def rewrite_words(mapping: dict)->Callable[[str], str]:
+    """A step that replaces whole space-separated words, like particles, and leaves the rest."""
+    get = mapping.get
+    def rewrite(text: str)->str:
+        return ' '.join([get(word, word) for word in text.split(' ')])
+    return rewrite
+
+rewrite_particles = rewrite_words(KANA_PARTICLES)
+
+ROMAJI_TO_KANA = Pipeline(romaji_to_kana)
+WZ_TO_KANA = Pipeline(rewrite_particles, WZ_TO_ROMAJI, romaji_to_kana)
+
+
+def benchmark_functors(count=100000, distinct=2000, seed=123)->dict:
+    import lexicon_store
+    words = [r['wz'] for r in lexicon_store.synthetic_records(distinct, seed)]
+    particles = list(KANA_PARTICLES)
+    rng = random.Random(seed)
+    sentences = [f"{rng.choice(words)} {rng.choice(particles)} {rng.choice(words)} w0 {rng.choice(words)}" for _ in range(distinct)]
+    stream = [rng.choice(sentences) for _ in range(count)]
+
+    digits_upper = Pipeline(WZ_TO_ROMAJI, CharMap({c: c.upper() for c in 'aeiou'}))
+    assert len(digits_upper.steps) == 1 # the two tables are one translate
+
+    started = time.perf_counter()
+    for text in stream:
+        StringFunctor(text).map(rewrite_particles).map(WZ_TO_ROMAJI).map(romaji_to_kana).value
+    chained = time.perf_counter() - started
+    cache = MapCache()
+    started = time.perf_counter()
+    for text in stream:
+        StringFunctor(text, cache=cache).map(WZ_TO_KANA).value
+    cached = time.perf_counter() - started
+
+    # Lambdas that are thrown away take their results with them
+    leak = MapCache(maxsize=16)
+    for i in range(1000):
+        StringFunctor(str(i), cache=leak).map(lambda s: s + '!').value
+    result = {'chained_us': chained / count * 1e6, 'cached_us': cached / count * 1e6,
+              'hit_rate': cache.hits / (cache.hits + cache.misses), 'entries_after_lambdas': len(leak)}
+    print(f"wz -> kana: chain of maps {result['chained_us']:.1f} us, module pipeline with cache {result['cached_us']:.2f} us",
+          f"({result['hit_rate']:.0%} hits), {result['entries_after_lambdas']} entries left after 1000 lambdas")
+    print(sentences[0], '->', WZ_TO_KANA(sentences[0]))
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_functors()
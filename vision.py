@@ -0,0 +1,265 @@
+"""
+Vision for Battle Wizard Simulator
+
+README goal: the agents are capable of sight. A viewer sees a target when
+
+* the target is within sight range, found with a spatial_grid.SpatialGrid over the entities
+* the target is inside the viewer's field-of-view cone around its heading column
+* the target is VISIBLE (MortalNinja.vanish and Apparition.vanish clear that flag)
+* no wall is in between. Walls are static line segments, like the Wall segments in disease_sim,
+  kept in their own grid, so a sight line is only tested against the walls in the cells around it.
+
+Vision.see() answers this for every conscious viewer at once each tick, as flat (viewer, target)
+pairs sorted by viewer, and visible(row) is a slice of them. Between ticks it remembers what
+everyone saw and only redoes the pairs that could have changed: viewers that moved, turned or
+changed flags look again, and everyone else only rechecks the changed rows, found with one grid
+query around where they are now. In a battle where most wizards stand and cast, that is a small
+part of the field; when most of it changed, see() just looks again from everyone.
+"""
+
+import time
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from entity_store import CONSCIOUS, VISIBLE, EntityStore
+from spatial_grid import SpatialGrid
+
+SIGHT_RANGE = 15.0
+FIELD_OF_VIEW = np.radians(120)
+REUSE_LIMIT = 0.5 # past this share of changed rows, looking again from everyone is cheaper
+
+
+def wall_segments(walls)->np.ndarray:
+    """(m, 4) float array of x1, y1, x2, y2 from ((x1, y1), (x2, y2)) pairs or disease_sim Wall objects."""
+    rows = []
+    for wall in walls:
+        shape = getattr(wall, 'shape', None)
+        p1, p2 = (shape.a, shape.b) if shape is not None else wall
+        rows.append((p1[0], p1[1], p2[0], p2[1]))
+    return np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+
+def _expand(lo, counts)->tuple:
+    """For runs [lo, lo + count): (run index, position) of every element, flat."""
+    total = int(counts.sum())
+    run = np.repeat(np.arange(len(counts)), counts)
+    return run, np.repeat(lo, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+class WallGrid:
+    """Static wall segments bucketed by every grid cell their bounding box covers."""
+    def __init__(self, segments, cell_size: float):
+        self.segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        self.cell_size = float(cell_size)
+        s = self.segments
+        if len(s):
+            self.origin = (min(s[:, 0].min(), s[:, 2].min()), min(s[:, 1].min(), s[:, 3].min()))
+        else:
+            self.origin = (0.0, 0.0)
+        ix0, iy0 = self._cells(np.minimum(s[:, 0], s[:, 2]), np.minimum(s[:, 1], s[:, 3]))
+        ix1, iy1 = self._cells(np.maximum(s[:, 0], s[:, 2]), np.maximum(s[:, 1], s[:, 3]))
+        self.rows = int(iy1.max()) + 1 if len(s) else 1
+        wall, cell_x, cell_y = self._span(ix0, iy0, ix1, iy1)
+        keys = cell_x * self.rows + cell_y
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.walls = keys[order], wall[order]
+
+    def _cells(self, x, y)->tuple:
+        return (np.floor((x - self.origin[0]) / self.cell_size).astype(np.int64),
+                np.floor((y - self.origin[1]) / self.cell_size).astype(np.int64))
+
+    @staticmethod
+    def _span(ix0, iy0, ix1, iy1)->tuple:
+        # Every cell of each box, as (box index, cell x, cell y)
+        height = iy1 - iy0 + 1
+        box, k = _expand(np.zeros(len(ix0), dtype=np.int64), (ix1 - ix0 + 1) * height)
+        return box, ix0[box] + k // height[box], iy0[box] + k % height[box]
+
+    def blocked(self, px, py, qx, qy)->np.ndarray:
+        """Whether a wall crosses each sight line p -> q. Grazing the end of a wall doesn't block."""
+        blocked = np.zeros(len(px), dtype=bool)
+        if not len(self.segments) or not len(px):
+            return blocked
+        ix0, iy0 = self._cells(np.minimum(px, qx), np.minimum(py, qy))
+        ix1, iy1 = self._cells(np.maximum(px, qx), np.maximum(py, qy))
+        line, cell_x, cell_y = self._span(ix0, iy0, ix1, iy1)
+        inside = (cell_y >= 0) & (cell_y < self.rows) & (cell_x >= 0)
+        line, keys = line[inside], cell_x[inside] * self.rows + cell_y[inside]
+        lo = np.searchsorted(self.keys, keys, 'left')
+        hi = np.searchsorted(self.keys, keys, 'right')
+        run, position = _expand(lo, hi - lo)
+        line, wall = line[run], self.walls[position]
+
+        ax, ay, bx, by = self.segments[wall].T
+        x1, y1, x2, y2 = px[line], py[line], qx[line], qy[line]
+        def orient(ox, oy, ux, uy, vx, vy):
+            return (ux - ox) * (vy - oy) - (uy - oy) * (vx - ox)
+        crosses = ((orient(ax, ay, bx, by, x1, y1) * orient(ax, ay, bx, by, x2, y2) < 0)
+                   & (orient(x1, y1, x2, y2, ax, ay) * orient(x1, y1, x2, y2, bx, by) < 0))
+        blocked[line[crosses]] = True
+        return blocked
+
+
+@dataclass
+class Sight:
+    """What every viewer sees, one row per (viewer, target) sorted by viewer."""
+    viewer: np.ndarray
+    target: np.ndarray
+    distance: np.ndarray
+
+    def __len__(self)->int:
+        return len(self.viewer)
+
+
+class Vision:
+    def __init__(self, walls=(), sight_range: float = SIGHT_RANGE, fov: float = FIELD_OF_VIEW):
+        self.sight_range = sight_range
+        self.fov = fov
+        segments = walls if isinstance(walls, np.ndarray) else wall_segments(walls)
+        self.walls = WallGrid(segments, sight_range)
+        self.sight = None
+        self._offsets = None
+        self._last = None # positions, headings and flags the cached sight was computed from
+        self.recomputed = 0
+
+    def _pairs(self, store: EntityStore, viewer, target, d2)->Sight:
+        # Of (viewer, target) pairs within sight range, the ones in the cone, visible and not walled off
+        x, y, heading = store['x'], store['y'], store['heading']
+        dx, dy = x[target] - x[viewer], y[target] - y[viewer]
+        distance = np.sqrt(d2)
+        # Inside the cone: the angle to the target is within half the field of view of the heading
+        in_view = dx * np.cos(heading[viewer]) + dy * np.sin(heading[viewer]) >= np.cos(self.fov / 2) * distance
+        keep = (target != viewer) & in_view & ((store.flags[target] & VISIBLE) != 0)
+        viewer, target, distance = viewer[keep], target[keep], distance[keep]
+        clear = ~self.walls.blocked(x[viewer], y[viewer], x[target], y[target])
+        return Sight(viewer=viewer[clear], target=target[clear], distance=distance[clear].astype(np.float32))
+
+    def _look(self, store: EntityStore, viewers: np.ndarray, grid: SpatialGrid)->Sight:
+        q, target, d2 = grid.query(store['x'][viewers], store['y'][viewers], self.sight_range)
+        return self._pairs(store, viewers[q], target, d2)
+
+    def see(self, store: EntityStore, grid: SpatialGrid = None, reuse: bool = True)->Sight:
+        """Everything every conscious entity sees this tick."""
+        n = len(store)
+        x, y, heading, flags = store['x'], store['y'], store['heading'], store.flags[:n]
+        if grid is None:
+            grid = SpatialGrid(x, y, self.sight_range)
+        viewers = np.flatnonzero(flags & CONSCIOUS)
+
+        changed = None
+        if reuse and self.sight is not None and len(self._last[0]) == n:
+            last_x, last_y, last_heading, last_flags = self._last
+            changed = (x != last_x) | (y != last_y) | (heading != last_heading) | (flags != last_flags)
+            if np.count_nonzero(changed) > REUSE_LIMIT * n:
+                changed = None
+        if changed is not None:
+            # Pairs between unchanged rows still hold; changed viewers look again...
+            keep = ~changed[self.sight.viewer] & ~changed[self.sight.target]
+            looking = viewers[changed[viewers]]
+            fresh = self._look(store, looking, grid)
+            # ...and unchanged viewers recheck only the changed rows, from where those are now
+            moved = np.flatnonzero(changed & ((flags & VISIBLE) != 0))
+            q, near, d2 = grid.query(x[moved], y[moved], self.sight_range)
+            still = ((flags[near] & CONSCIOUS) != 0) & ~changed[near]
+            seen = self._pairs(store, near[still], moved[q[still]], d2[still])
+            viewer = np.concatenate((self.sight.viewer[keep], fresh.viewer, seen.viewer))
+            order = np.argsort(viewer, kind='stable')
+            sight = Sight(viewer=viewer[order],
+                          target=np.concatenate((self.sight.target[keep], fresh.target, seen.target))[order],
+                          distance=np.concatenate((self.sight.distance[keep], fresh.distance, seen.distance))[order])
+            self.recomputed = len(looking)
+        else:
+            sight = self._look(store, viewers, grid)
+            order = np.argsort(sight.viewer, kind='stable')
+            sight = Sight(viewer=sight.viewer[order], target=sight.target[order], distance=sight.distance[order])
+            self.recomputed = len(viewers)
+
+        self.sight = sight
+        self._offsets = np.searchsorted(sight.viewer, np.arange(n + 1))
+        self._last = (x.copy(), y.copy(), heading.copy(), flags.copy())
+        return sight
+
+    def visible(self, row: int)->np.ndarray:
+        """Rows the entity saw at the last see()."""
+        return self.sight.target[self._offsets[row]:self._offsets[row + 1]]
+
+    def sees(self, viewer: int, target: int)->bool:
+        return bool(np.isin(target, self.visible(viewer)))
+
+
+def maze(side: float, walls: int, length: float = 20.0, seed=123)->np.ndarray:
+    """Random wall segments inside a square arena, plus its four sides."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, side, (walls, 2))
+    angle = rng.uniform(0, np.pi, walls)
+    end = start + length * np.column_stack((np.cos(angle), np.sin(angle)))
+    border = [(0, 0, 0, side), (0, 0, side, 0), (0, side, side, side), (side, 0, side, side)]
+    return np.vstack((np.column_stack((start, end)), border))
+
+
+def brute_force_sight(store: EntityStore, vision: Vision)->set:
+    """Every pair and every wall checked directly, for checking see()."""
+    n = len(store)
+    x, y, heading = store['x'].astype(np.float64), store['y'].astype(np.float64), store['heading']
+    viewers = np.flatnonzero(store.flags[:n] & CONSCIOUS)
+    pairs = set()
+    s = vision.walls.segments
+    for v in viewers.tolist():
+        dx, dy = x - x[v], y - y[v]
+        d = np.hypot(dx, dy)
+        ok = (d <= vision.sight_range) & (np.arange(n) != v) & ((store.flags[:n] & VISIBLE) != 0)
+        ok &= dx * np.cos(heading[v]) + dy * np.sin(heading[v]) >= np.cos(vision.fov / 2) * d
+        for t in np.flatnonzero(ok).tolist():
+            d1 = (s[:, 2] - s[:, 0]) * (y[v] - s[:, 1]) - (s[:, 3] - s[:, 1]) * (x[v] - s[:, 0])
+            d2 = (s[:, 2] - s[:, 0]) * (y[t] - s[:, 1]) - (s[:, 3] - s[:, 1]) * (x[t] - s[:, 0])
+            d3 = (x[t] - x[v]) * (s[:, 1] - y[v]) - (y[t] - y[v]) * (s[:, 0] - x[v])
+            d4 = (x[t] - x[v]) * (s[:, 3] - y[v]) - (y[t] - y[v]) * (s[:, 2] - x[v])
+            if not ((d1 * d2 < 0) & (d3 * d4 < 0)).any():
+                pairs.add((v, t))
+    return pairs
+
+
+def benchmark_vision(counts=(1000, 10000, 100000), density=0.01, moving=0.1, seed=123)->list[dict]:
+    import world_updater
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in counts:
+        store = world_updater.battle_store(n, seed)
+        side = np.sqrt(n / density)
+        store['x'][:] = rng.uniform(0, side, n)
+        store['y'][:] = rng.uniform(0, side, n)
+        store['heading'][:] = rng.uniform(-np.pi, np.pi, n)
+        store.set_flag(rng.random(n) < 0.05, VISIBLE, False) # vanished ninjas and apparitions
+        vision = Vision(maze(side, n // 20, seed=seed))
+
+        started = time.perf_counter()
+        sight = vision.see(store)
+        full_seconds = time.perf_counter() - started
+        if n <= 1000:
+            assert set(zip(sight.viewer.tolist(), sight.target.tolist())) == brute_force_sight(store, vision)
+
+        # Next tick a few wizards step and turn, the rest stand and cast
+        movers = rng.choice(n, int(n * moving), replace=False)
+        store['x'][movers] += rng.normal(0, 1.0, len(movers))
+        store['y'][movers] += rng.normal(0, 1.0, len(movers))
+        store['heading'][movers] += rng.normal(0, 0.3, len(movers))
+        started = time.perf_counter()
+        cached = vision.see(store)
+        cached_seconds = time.perf_counter() - started
+        recomputed = vision.recomputed
+        again = Vision(vision.walls.segments).see(store)
+        assert np.array_equal(cached.viewer, again.viewer)
+        assert set(zip(cached.viewer.tolist(), cached.target.tolist())) == set(zip(again.viewer.tolist(), again.target.tolist()))
+
+        results.append({'entities': n, 'walls': len(vision.walls.segments), 'pairs': len(sight), 'full_seconds': full_seconds,
+                        'cached_seconds': cached_seconds, 'recomputed': recomputed})
+        print(f"{n:,} entities, {len(vision.walls.segments):,} walls: everyone looks in {full_seconds * 1000:.1f} ms",
+              f"({full_seconds / n * 1e6:.1f} us each, {len(sight):,} sightings); after {moving:.0%} move",
+              f"{cached_seconds * 1000:.1f} ms recomputing {recomputed:,} viewers")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_vision()
@@ -0,0 +1,265 @@
+"""
+Sentence generator for the Wizard Language grammars
+
+Random sentences from the compiled grammars in wizard_parser.py, for language model training data
+(see wizard_language.__syntax_readme__) and for load testing the parser with realistic input.
+
+The grammars are left-recursive (<p-phrase> ::= <p-phrase> <particle>, <noun> ::= <noun>), so
+naive random expansion can run forever. Before generating, every symbol gets its minimum
+derivation length: the fewest tokens any derivation of it can produce, worked out to a fixed
+point like the nullable set. Expansion then runs on an explicit stack and keeps a token budget:
+
+* a rule is only chosen if the tokens it needs at least, plus the minimum of everything still
+  on the stack, fit under max_length, so every sentence stays within max_length tokens
+* past max_depth, every symbol takes its shortest rule, the one that set its minimum length,
+  and following those always ends in words
+
+Symbols with no rules are lexical categories and become words from the vocabulary (the lexicon's
+nouns, verbs and so on). A category nothing in the lexicon belongs to, like <adjective> with the
+current lexicon, is written as its bare name, so the parser can still tag it.
+
+generate_corpus() writes sentences to shard files in a process pool. Each shard has its own seed
+derived from the corpus seed, so a corpus is reproducible whatever the number of workers.
+"""
+
+import os
+import random
+import time
+
+from bisect import bisect_right
+
+from concurrent.futures import ProcessPoolExecutor
+
+import lexicon_store
+import wizard_parser
+
+from wizard_parser import CompiledGrammar
+
+INFINITE = float('inf')
+
+
+def default_vocabulary(grammar: CompiledGrammar, store: lexicon_store.LexiconStore = None)->dict:
+    """
+    Category symbol name -> tuple of words, for every symbol in the grammar with no rules.
+    Words come from the lexicon; categories with none get their bare name as their only word.
+    """
+    lexicon = wizard_parser.lexicon_categories(store)
+    words = {}
+    for word, categories in lexicon.items():
+        for category in categories:
+            words.setdefault(category, []).append(word)
+    vocabulary = {}
+    for s, name in enumerate(grammar.symbols):
+        if s in grammar.terminals or grammar.by_lhs[s]:
+            if name in words:
+                vocabulary[name] = tuple(sorted(words[name]))
+        else:
+            vocabulary[name] = tuple(sorted(words.get(name, [name.strip('<>')])))
+    return vocabulary
+
+
+def vocabulary_lexicon(vocabulary: dict)->dict:
+    """Word -> set of category symbols, the lexicon wizard_parser.parse() takes."""
+    lexicon = {}
+    for category, words in vocabulary.items():
+        for word in words:
+            lexicon.setdefault(word, set()).add(category)
+    return lexicon
+
+
+def min_lengths(grammar: CompiledGrammar, vocabulary: dict)->tuple[list, list, list]:
+    """
+    Minimum derivation length of every symbol and every rule, and each symbol's shortest rule
+    (-1 when a word is shortest). Symbols with no finite derivation get INFINITE.
+    """
+    symbol_length = [INFINITE] * len(grammar.symbols)
+    shortest = [-1] * len(grammar.symbols)
+    for s, name in enumerate(grammar.symbols):
+        if s in grammar.terminals or name in vocabulary:
+            symbol_length[s] = 1
+    rule_length = [INFINITE] * len(grammar.rule_rhs)
+    changed = True
+    while changed:
+        changed = False
+        for r, (lhs, rhs) in enumerate(zip(grammar.rule_lhs, grammar.rule_rhs)):
+            length = sum(symbol_length[sym] for sym in rhs)
+            rule_length[r] = length
+            # Only a strict improvement moves the shortest rule, so shortest rules never form a cycle
+            if length < symbol_length[lhs]:
+                symbol_length[lhs] = length
+                shortest[lhs] = r
+                changed = True
+    return symbol_length, rule_length, shortest
+
+
+class SentenceGenerator:
+    def __init__(self, grammar: CompiledGrammar, vocabulary: dict = None, max_length: int = 30, max_depth: int = 16):
+        if vocabulary is None:
+            vocabulary = default_vocabulary(grammar)
+        self.grammar = grammar
+        self.vocabulary = vocabulary
+        self.max_length = max_length
+        self.max_depth = max_depth
+        symbol_length, rule_length, shortest = min_lengths(grammar, vocabulary)
+        if symbol_length[grammar.start] > max_length:
+            raise ValueError(f"The shortest {grammar.symbols[grammar.start]} is {symbol_length[grammar.start]} tokens, "
+                             f"over max_length {max_length}.")
+        self.symbol_length = symbol_length
+        self.shortest = shortest
+
+        # Per symbol, its options sorted by how many tokens they need beyond the symbol's minimum:
+        # extras[s] for bisecting on the budget, and options[s] the rule IDs, -1 for a word
+        self.extras = []
+        self.options = []
+        self.words = [None] * len(grammar.symbols)
+        self.rhs_length = [sum(symbol_length[sym] for sym in rhs) for rhs in grammar.rule_rhs]
+        for s, name in enumerate(grammar.symbols):
+            choices = []
+            if s in grammar.terminals:
+                self.words[s] = (name.strip("'"),)
+            elif name in vocabulary:
+                self.words[s] = tuple(vocabulary[name])
+            if self.words[s] is not None:
+                choices.append((1 - symbol_length[s], -1))
+            for r in grammar.by_lhs[s]:
+                if rule_length[r] < INFINITE:
+                    choices.append((rule_length[r] - symbol_length[s], r))
+            choices.sort()
+            self.extras.append([extra for extra, _ in choices])
+            self.options.append([r for _, r in choices])
+
+    def sentence(self, rng: random.Random = random)->list[str]:
+        grammar = self.grammar
+        rule_rhs = grammar.rule_rhs
+        symbol_length = self.symbol_length
+        rhs_length = self.rhs_length
+        extras = self.extras
+        options = self.options
+        words = self.words
+        shortest = self.shortest
+        max_length = self.max_length
+        max_depth = self.max_depth
+        randrange = rng.randrange
+
+        out = []
+        stack = [(grammar.start, 0)]
+        pending = symbol_length[grammar.start] # tokens still owed by the symbols on the stack
+        while stack:
+            s, depth = stack.pop()
+            pending -= symbol_length[s]
+            if depth >= max_depth:
+                r = shortest[s]
+            else:
+                # Every option within the slack keeps the whole sentence under max_length
+                slack = max_length - len(out) - pending - symbol_length[s]
+                fits = bisect_right(extras[s], slack) or 1
+                r = options[s][randrange(fits)]
+            if r < 0:
+                choices = words[s]
+                out.append(choices[randrange(len(choices))])
+            else:
+                rhs = rule_rhs[r]
+                pending += rhs_length[r]
+                for sym in reversed(rhs):
+                    stack.append((sym, depth + 1))
+        return out
+
+    def sentences(self, count: int, seed=123):
+        rng = random.Random(seed)
+        for _ in range(count):
+            yield self.sentence(rng)
+
+
+def shard_seed(seed, shard: int)->str:
+    # Seeds for str are hashed by random.Random, so neighbouring shards get unrelated streams
+    return f"{seed}/{shard}"
+
+
+def write_shard(job: tuple)->tuple[str, int, int]:
+    """Writes one shard file, one space-separated sentence per line. Returns (path, sentences, tokens)."""
+    grammar_name, path, count, seed, max_length, max_depth, chunk = job
+    generator = SentenceGenerator(wizard_parser.get_compiled(grammar_name), max_length=max_length, max_depth=max_depth)
+    rng = random.Random(seed)
+    sentence = generator.sentence
+    tokens = 0
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        for done in range(0, count, chunk):
+            lines = [' '.join(sentence(rng)) for _ in range(min(chunk, count - done))]
+            tokens += sum(line.count(' ') + 1 for line in lines)
+            f.write('\n'.join(lines))
+            f.write('\n')
+    os.replace(tmp, path)
+    return path, count, tokens
+
+
+def generate_corpus(directory: str,
+                    sentences: int = 1_000_000,
+                    shards: int = 8,
+                    grammar_name: str = 'wizard',
+                    seed=123,
+                    max_length: int = 30,
+                    max_depth: int = 16,
+                    workers=None,
+                    chunk: int = 10000)->list[tuple]:
+    """
+    Writes `sentences` random sentences to shard files {grammar_name}-00000.txt, ... in directory.
+    Shards run in a process pool; workers=0 writes them in this process.
+    """
+    os.makedirs(directory, exist_ok=True)
+    per_shard, extra = divmod(sentences, shards)
+    jobs = [(grammar_name,
+             os.path.join(directory, f"{grammar_name}-{shard:05d}.txt"),
+             per_shard + (shard < extra),
+             shard_seed(seed, shard),
+             max_length,
+             max_depth,
+             chunk) for shard in range(shards)]
+    if workers == 0:
+        return [write_shard(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(write_shard, jobs))
+
+
+def check_generated(grammar_name='wizard', count=200, seed=123, max_length=12)->int:
+    """Parses generated sentences back with wizard_parser; every one should be accepted."""
+    grammar = wizard_parser.get_compiled(grammar_name)
+    generator = SentenceGenerator(grammar, max_length=max_length)
+    lexicon = vocabulary_lexicon(generator.vocabulary)
+    for tokens in generator.sentences(count, seed):
+        assert len(tokens) <= max_length, tokens
+        assert wizard_parser.parse(tokens, grammar, lexicon).accepted, f"{grammar_name} rejected {' '.join(tokens)}"
+    return count
+
+
+def benchmark_generator(count=200000, corpus_sentences=1_000_000, directory='generated_corpus', seed=123)->dict:
+    results = {}
+    for name in wizard_parser.GRAMMARS:
+        try:
+            check_generated(name)
+        except ValueError as e:
+            # bnf_grammar_1's <sentence> always contains another <sentence>
+            print(f"{name}: {e}")
+            continue
+        generator = SentenceGenerator(wizard_parser.get_compiled(name))
+        started = time.perf_counter()
+        tokens = sum(len(s) for s in generator.sentences(count, seed))
+        seconds = time.perf_counter() - started
+        results[name] = count / seconds * 60
+        print(f"{name}: {count / seconds * 60 / 1e6:.1f}M sentences/minute in one process,",
+              f"{tokens / count:.1f} tokens each")
+    started = time.perf_counter()
+    shards = generate_corpus(directory, corpus_sentences, seed=seed)
+    seconds = time.perf_counter() - started
+    size = sum(os.path.getsize(path) for path, _, _ in shards)
+    for path, _, _ in shards:
+        os.remove(path)
+    os.rmdir(directory)
+    results['corpus'] = corpus_sentences / seconds * 60
+    print(f"corpus: {corpus_sentences:,} sentences in {len(shards)} shards ({size / 2 ** 20:.0f} MiB) in {seconds:.1f}s,",
+          f"{corpus_sentences / seconds * 60 / 1e6:.1f}M sentences/minute")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_generator()
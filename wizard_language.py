@@ -183,17 +183,40 @@ lexeme_example_determiner = {
     'class': 'particle'
 }
 
+# Verbs the game world applies (world_updater) and the spells it knows (spell_engine.default_spells()).
+# The events they make name these ids, so they have to be real lexemes for the realizer to say them.
+world_verb_lexemes = [
+    {'id': 100, 'en': 'kill', 'jp': 'korosu', 'wz': 'gorak', 'class': 'verb'},
+    {'id': 101, 'en': 'stun', 'jp': 'shibireru', 'wz': 'bizeng', 'class': 'verb'},
+    {'id': 102, 'en': 'wake', 'jp': 'okosu', 'wz': 'tokim', 'class': 'verb'},
+    {'id': 103, 'en': 'heal', 'jp': 'iyasu', 'wz': 'namip', 'class': 'verb'},
+]
+
+spell_lexemes = [
+    {'id': 200, 'en': 'fireball', 'jp': 'hinotama', 'wz': 'kazpo', 'class': 'verb'},
+    {'id': 201, 'en': 'thunderclap', 'jp': 'raimei', 'wz': 'dongrak', 'class': 'verb'},
+    {'id': 202, 'en': 'mending rain', 'jp': 'megumi', 'wz': 'sumaqe', 'class': 'verb'},
+    {'id': 203, 'en': 'veil', 'jp': 'tobari', 'wz': 'hobac', 'class': 'verb'},
+    {'id': 204, 'en': 'daylight', 'jp': 'hakuchuu', 'wz': 'rikang', 'class': 'verb'},
+    {'id': 205, 'en': 'plague', 'jp': 'ekibyou', 'wz': 'zekum', 'class': 'verb'},
+]
+
 # This is indexed by each lexeme's English form 
 lexicon_en = {
-    'thing': lexeme_example_noun
+    'thing': lexeme_example_noun,
+    **{lex['en']: lex for lex in world_verb_lexemes + spell_lexemes},
 }
 
 lexicon_jp = {
-    'mono': lexeme_example_noun
+    'mono': lexeme_example_noun,
+    **{lex['jp']: lex for lex in world_verb_lexemes + spell_lexemes},
 }
 
 lexicon_wz = {
-    'tasu': lexeme_example_noun
+    'tasu': lexeme_example_noun,
+    **{lex['wz']: lex for lex in world_verb_lexemes + spell_lexemes},
 }
 
-print(lexicon_en['thing'])
\ No newline at end of file
+
+if __name__ == "__main__":
+    print(lexicon_en['thing'])
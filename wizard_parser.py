@@ -0,0 +1,870 @@
+"""
+Parser for Wizard Language
+
+Compiles the BNF grammar strings in wizard_language.py and parses utterances with them.
+
+The grammars are left-recursive and ambiguous (a <p-phrase> is built from a <p-phrase>, a
+<noun-phrase> from a <verb-phrase> and the other way around), so recursive descent would never
+terminate. An Earley parser handles any context-free grammar in polynomial time, and instead of
+enumerating every parse it builds a shared packed parse forest (SPPF): one node per
+(symbol, start, end), with each way of deriving it packed underneath. Ambiguity costs extra links,
+not extra copies of the tree.
+
+Grammar notation, beyond plain BNF:
+* X* is zero or more X, X+ is one or more X
+* {X Y} is optional
+* :== is accepted as a typo of ::=
+
+A symbol with no rules of its own, like <noun> or <verb>, is a lexical category. Tokens are tagged
+with the categories they belong to, and any symbol can also be matched by a token tagged with it,
+which is what gives japanese_style_grammar_3's <noun> ::= <noun> | <noun> <noun>* a base case.
+
+Spells reach listeners a word at a time, so the chart can also be grown one token at a time:
+IncrementalParser.feed() extends the same chart and reports topic and object hypotheses early.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+from dataclasses import dataclass, field
+
+from functools import lru_cache
+
+import lexicon_store
+import wizard_language as wl
+
+from action_classes import PARTICLE_CASES
+
+Symbol = str
+
+
+@dataclass
+class Rule:
+    lhs: Symbol
+    rhs: tuple
+
+
+@dataclass
+class Grammar:
+    """Indexed rule table compiled from a BNF string."""
+    rules: list[Rule]
+    start: Symbol
+    by_lhs: dict = field(default_factory=dict) # lhs -> list of rule indexes
+    terminals: set = field(default_factory=set)
+    nullable: set = field(default_factory=set)
+
+    def __post_init__(self):
+        for i, rule in enumerate(self.rules):
+            self.by_lhs.setdefault(rule.lhs, []).append(i)
+            for sym in rule.rhs:
+                if is_terminal(sym):
+                    self.terminals.add(sym)
+        self.nullable = compute_nullable(self.rules)
+
+    @property
+    def nonterminals(self)->set:
+        return set(self.by_lhs)
+
+    @property
+    def categories(self)->set:
+        # Lexical categories: symbols used on a right-hand side that never get a rule
+        used = {sym for rule in self.rules for sym in rule.rhs if not is_terminal(sym)}
+        return used - set(self.by_lhs)
+
+
+def is_terminal(sym: Symbol)->bool:
+    # A whole quoted token; the helpers for 'w4'* and the like start with a quote too
+    return len(sym) > 1 and sym[0] == sym[-1] == "'"
+
+
+def compute_nullable(rules: list[Rule])->set:
+    nullable = set()
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            if rule.lhs not in nullable and all(sym in nullable for sym in rule.rhs):
+                nullable.add(rule.lhs)
+                changed = True
+    return nullable
+
+
+_token = re.compile(r"<[^<>\s]+>|'[^']*'|[{}|*+]")
+
+
+def load_grammar(text: str, start: Symbol = None)->Grammar:
+    """
+    Compiles a BNF string into a Grammar. The *, + and {} extensions are rewritten into
+    helper nonterminals named after what they wrap, e.g. <p-phrase>* or {<noun-phrase>}.
+    The start symbol defaults to the first rule's left-hand side.
+    """
+    rules = []
+    seen = set()
+    helpers = {}
+
+    def add(lhs, rhs):
+        if (lhs, rhs) not in seen:
+            seen.add((lhs, rhs))
+            rules.append(Rule(lhs, rhs))
+
+    def star(sym):
+        name = sym + '*'
+        if name not in helpers:
+            helpers[name] = True
+            add(name, ())
+            add(name, (name, sym))
+        return name
+
+    def plus(sym):
+        name = sym + '+'
+        if name not in helpers:
+            helpers[name] = True
+            add(name, (sym,))
+            add(name, (name, sym))
+        return name
+
+    def optional(seq):
+        name = '{' + ' '.join(seq) + '}'
+        if name not in helpers:
+            helpers[name] = True
+            add(name, ())
+            add(name, tuple(seq))
+        return name
+
+    def parse_sequence(tokens, i, closing=None):
+        seq = []
+        while i < len(tokens) and tokens[i] != '|' and tokens[i] != closing:
+            tok = tokens[i]
+            if tok == '{':
+                inner, i = parse_sequence(tokens, i + 1, '}')
+                sym = optional(inner)
+            elif tok in ('*', '+', '}'):
+                raise ValueError(f"Unexpected {tok!r} in grammar.")
+            else:
+                sym = tok
+            i += 1
+            while i < len(tokens) and tokens[i] in ('*', '+'):
+                sym = star(sym) if tokens[i] == '*' else plus(sym)
+                i += 1
+            seq.append(sym)
+        if closing is not None:
+            if i >= len(tokens) or tokens[i] != closing:
+                raise ValueError(f"Missing {closing!r} in grammar.")
+        return seq, i
+
+    first = None
+    for line in text.strip().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        head, sep, body = re.split(r"(::=|:==)", line, maxsplit=1) if re.search(r"::=|:==", line) else (line, '', '')
+        if not sep:
+            raise ValueError(f"Not a grammar rule: {line!r}")
+        lhs = head.strip()
+        if not re.fullmatch(r"<[^<>\s]+>", lhs):
+            raise ValueError(f"Bad left-hand side: {lhs!r}")
+        first = first or lhs
+        tokens = _token.findall(body)
+        i = 0
+        while True:
+            seq, i = parse_sequence(tokens, i)
+            add(lhs, tuple(seq))
+            if i >= len(tokens):
+                break
+            i += 1 # skip '|'
+
+    return Grammar(rules, start or first)
+
+
+# The surface grammars from wizard_language.py with the symbol utterances parse as
+GRAMMARS = {
+    'wizard_1': (wl.bnf_grammar_1, '<sentence>'),
+    'wizard': (wl.bnf_grammar_2, '<sentence>'),
+    'japanese': (wl.japanese_style_grammar_3, '<sentence>'),
+    'english': (wl.english_style_grammar, '<sentence>'),
+    'french': (wl.french_style_grammar, '<sentence>'),
+    'chinese': (wl.chinese_style_grammar, '<sentence>'),
+    'german': (wl.german_style_grammar, '<sentence>'),
+    'russian': (wl.russian_style_grammar, '<sentence>'),
+}
+
+
+def get_grammar(name: str)->Grammar:
+    text, start = GRAMMARS[name]
+    return load_grammar(text, start)
+
+
+# Compiled grammars
+# Parsing runs on a normalized form of the Grammar: every symbol is an integer ID, rules are
+# tuples of IDs, and the nullable set, FIRST sets and predict table are worked out ahead of time.
+# Compiled grammars are saved to an on-disk cache keyed by a hash of the grammar text, so
+# starting a parser for any language is a load rather than a rebuild. The cache files are plain
+# JSON lists and ints rather than pickles: loading one can't run code, and the file doesn't depend
+# on whether this module was imported or run as a script.
+
+COMPILER_VERSION = 3 # bump when CompiledGrammar changes so stale cache files are ignored
+
+GRAMMAR_CACHE_DIR = os.environ.get('WIZARD_GRAMMAR_CACHE',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), '.grammar_cache'))
+
+
+@dataclass
+class CompiledGrammar:
+    symbols: list[str] # id -> name
+    ids: dict # name -> id
+    start: int
+    rule_lhs: tuple # rule -> lhs id
+    rule_rhs: tuple # rule -> tuple of ids
+    by_lhs: tuple # symbol id -> tuple of rule ids, empty for terminals and categories
+    terminals: frozenset
+    nullable: frozenset
+    first: tuple # symbol id -> frozenset of symbol ids a token can match to start it
+    predict: tuple # symbol id -> {token symbol id: tuple of rule ids that can start with it}
+    nullable_rules: tuple # symbol id -> tuple of rule ids that can derive nothing
+    digest: str
+
+    def symbol_id(self, name: Symbol)->int:
+        return self.ids[name]
+
+    def to_data(self)->dict:
+        # JSON-ready: sets become sorted lists, and predict's int keys become [token, rules] pairs
+        return {
+            'symbols': self.symbols,
+            'start': self.start,
+            'rule_lhs': self.rule_lhs,
+            'rule_rhs': self.rule_rhs,
+            'by_lhs': self.by_lhs,
+            'terminals': sorted(self.terminals),
+            'nullable': sorted(self.nullable),
+            'first': [sorted(f) for f in self.first],
+            'predict': [sorted(p.items()) for p in self.predict],
+            'nullable_rules': self.nullable_rules,
+            'digest': self.digest,
+        }
+
+    @classmethod
+    def from_data(cls, data: dict)->"CompiledGrammar":
+        symbols = list(data['symbols'])
+        return cls(
+            symbols=symbols,
+            ids={sym: i for i, sym in enumerate(symbols)},
+            start=int(data['start']),
+            rule_lhs=tuple(data['rule_lhs']),
+            rule_rhs=tuple(tuple(rhs) for rhs in data['rule_rhs']),
+            by_lhs=tuple(tuple(rules) for rules in data['by_lhs']),
+            terminals=frozenset(data['terminals']),
+            nullable=frozenset(data['nullable']),
+            first=tuple(frozenset(f) for f in data['first']),
+            predict=tuple({tok: tuple(rules) for tok, rules in p} for p in data['predict']),
+            nullable_rules=tuple(tuple(rules) for rules in data['nullable_rules']),
+            digest=data['digest'],
+        )
+
+
+def grammar_digest(text: str, start: Symbol = None)->str:
+    key = f"{COMPILER_VERSION}\n{start}\n{text}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def compile_grammar(grammar: Grammar, digest: str = '')->CompiledGrammar:
+    # Symbol IDs: nonterminals first in rule order, then terminals and categories
+    symbols = []
+    ids = {}
+    def intern(sym):
+        if sym not in ids:
+            ids[sym] = len(symbols)
+            symbols.append(sym)
+        return ids[sym]
+    for rule in grammar.rules:
+        intern(rule.lhs)
+    for rule in grammar.rules:
+        for sym in rule.rhs:
+            intern(sym)
+    start = intern(grammar.start)
+
+    rule_lhs = tuple(ids[rule.lhs] for rule in grammar.rules)
+    rule_rhs = tuple(tuple(ids[sym] for sym in rule.rhs) for rule in grammar.rules)
+    by_lhs = [[] for _ in symbols]
+    for r, lhs in enumerate(rule_lhs):
+        by_lhs[lhs].append(r)
+    nullable = frozenset(ids[sym] for sym in grammar.nullable)
+
+    # FIRST(X) includes X itself, since a token tagged with X matches it directly
+    first = [{s} for s in range(len(symbols))]
+    changed = True
+    while changed:
+        changed = False
+        for lhs, rhs in zip(rule_lhs, rule_rhs):
+            for sym in rhs:
+                if not first[sym] <= first[lhs]:
+                    first[lhs] |= first[sym]
+                    changed = True
+                if sym not in nullable:
+                    break
+
+    def first_of(rhs):
+        out = set()
+        for sym in rhs:
+            out |= first[sym]
+            if sym not in nullable:
+                break
+        return out
+
+    predict = [dict() for _ in symbols]
+    nullable_rules = [[] for _ in symbols]
+    for r, (lhs, rhs) in enumerate(zip(rule_lhs, rule_rhs)):
+        for tok in first_of(rhs):
+            predict[lhs].setdefault(tok, []).append(r)
+        if all(sym in nullable for sym in rhs):
+            nullable_rules[lhs].append(r)
+
+    return CompiledGrammar(
+        symbols=symbols,
+        ids=ids,
+        start=start,
+        rule_lhs=rule_lhs,
+        rule_rhs=rule_rhs,
+        by_lhs=tuple(tuple(rules) for rules in by_lhs),
+        terminals=frozenset(ids[sym] for sym in grammar.terminals),
+        nullable=nullable,
+        first=tuple(frozenset(f) for f in first),
+        predict=tuple({tok: tuple(rules) for tok, rules in p.items()} for p in predict),
+        nullable_rules=tuple(tuple(rules) for rules in nullable_rules),
+        digest=digest,
+    )
+
+
+_compiled = {} # digest -> CompiledGrammar, for this process
+
+def load_compiled(text: str, start: Symbol = None, cache_dir: str = None)->CompiledGrammar:
+    """Compiled form of a grammar string, from memory, then the disk cache, then by compiling it."""
+    digest = grammar_digest(text, start)
+    if digest in _compiled:
+        return _compiled[digest]
+    cache_dir = GRAMMAR_CACHE_DIR if cache_dir is None else cache_dir
+    path = os.path.join(cache_dir, digest + '.json')
+    compiled = None
+    try:
+        with open(path, encoding='utf-8') as f:
+            compiled = CompiledGrammar.from_data(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError, json.JSONDecodeError):
+        compiled = None # missing, truncated or from another version: rebuild it
+    if compiled is None or compiled.digest != digest:
+        compiled = compile_grammar(load_grammar(text, start), digest)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(compiled.to_data(), f, separators=(',', ':'))
+            os.replace(tmp, path)
+        except OSError:
+            pass # read-only checkout, just compile every time
+    _compiled[digest] = compiled
+    return compiled
+
+
+def get_compiled(name: str)->CompiledGrammar:
+    text, start = GRAMMARS[name]
+    return load_compiled(text, start)
+
+
+@lru_cache(maxsize=8)
+def lexicon_categories(store=None)->dict:
+    """Token -> lexical category symbols, from a lexicon_store.LexiconStore (the default lexicon if None)."""
+    if store is None:
+        store = lexicon_store.default_store()
+    tags = {}
+    wz = store.index('wz')
+    for form, row in wz.items():
+        lexeme_class = store.class_of(int(store.ids[row]))
+        if lexeme_class != 'particle':
+            tags.setdefault(form, set()).add('<' + lexeme_class + '>')
+    # The example determiner is filed under class 'particle' but the grammars call it <determiner>
+    tags.setdefault(wl.lexeme_example_determiner['wz'], set()).add('<determiner>')
+    return tags
+
+
+def tag_tokens(tokens: list[str], grammar: CompiledGrammar, lexicon: dict = None)->list[frozenset]:
+    """
+    The set of grammar symbol IDs each token can match: the quoted terminal if the grammar has it
+    (particles like 'w4'), plus the token's lexical categories.
+    """
+    if lexicon is None:
+        lexicon = lexicon_categories()
+    ids = grammar.ids
+    tags = []
+    for tok in tokens:
+        symbols = {ids[sym] for sym in lexicon.get(tok, ()) if sym in ids}
+        quoted = "'" + tok + "'"
+        if quoted in ids:
+            symbols.add(ids[quoted])
+        tags.append(frozenset(symbols))
+    return tags
+
+
+class Forest:
+    """
+    Shared packed parse forest.
+
+    Symbol nodes are (symbol id, start, end). Each has a set of item keys (rule, dot, origin, end)
+    for the completed rules deriving it. Item links are binarized: links[item] is a set of
+    (left item or None, child), where child is a symbol node or a token leaf (-1, index).
+    """
+    def __init__(self, grammar: CompiledGrammar, tokens: list[str], start: int = None, length: int = None):
+        self.grammar = grammar
+        self.tokens = tokens
+        self.start = grammar.start if start is None else start
+        self.length = len(tokens) if length is None else length # positions, which differ from tokens for a lattice
+        self.symbols = {} # (sym, start, end) -> set of completed item keys
+        self.links = {} # (rule, dot, origin, end) -> set of (left, child)
+
+    @property
+    def root(self):
+        return (self.start, 0, self.length)
+
+    @property
+    def accepted(self)->bool:
+        return self.root in self.symbols
+
+    def size(self)->dict:
+        return {'symbol_nodes': len(self.symbols),
+                'item_nodes': len(self.links),
+                'packed_links': sum(len(v) for v in self.links.values())}
+
+    def count_trees(self, node=None)->int:
+        """
+        Number of distinct parse trees under a node. Derivations that go around a cycle
+        (like <noun> ::= <noun>) are not counted, since there are infinitely many of them.
+        """
+        memo = {}
+        active = set()
+
+        def count_node(n):
+            if n[0] == TOKEN:
+                return 1
+            if n in memo:
+                return memo[n]
+            if n in active:
+                return 0
+            active.add(n)
+            total = sum(count_item(item) for item in self.symbols.get(n, ()))
+            active.discard(n)
+            memo[n] = total
+            return total
+
+        item_memo = {}
+        def count_item(item):
+            if item in item_memo:
+                return item_memo[item]
+            rule, dot, origin, end = item
+            if dot == 0:
+                return 1
+            total = 0
+            for left, child in self.links.get(item, ()):
+                left_count = 1 if left is None else count_item(left)
+                if left_count:
+                    total += left_count * count_node(child)
+            item_memo[item] = total
+            return total
+
+        return count_node(self.root if node is None else node)
+
+    def tree(self, node=None):
+        """
+        One parse tree as nested (symbol, [children]) tuples, with tokens as leaves.
+        Returns None if the node has no acyclic derivation.
+        """
+        names = self.grammar.symbols
+        active = set()
+
+        def build_node(n):
+            if n[0] == TOKEN:
+                return self.tokens[n[1]]
+            if n in active:
+                return None
+            active.add(n)
+            try:
+                for item in self.symbols.get(n, ()):
+                    children = build_item(item)
+                    if children is not None:
+                        return (names[n[0]], children)
+                return None
+            finally:
+                active.discard(n)
+
+        def build_item(item):
+            rule, dot, origin, end = item
+            if dot == 0:
+                return []
+            for left, child in self.links.get(item, ()):
+                prefix = [] if left is None else build_item(left)
+                if prefix is None:
+                    continue
+                sub = build_node(child)
+                if sub is not None:
+                    return prefix + [sub]
+            return None
+
+        return build_node(self.root if node is None else node)
+
+
+TOKEN = -1 # symbol id of token leaves in the forest
+
+
+def earley_parse(grammar: CompiledGrammar, tags: list[frozenset], tokens: list[str] = None, start: Symbol = None)->Forest:
+    """
+    Earley recognizer that builds the parse forest as it goes.
+    tags[i] is the set of symbol IDs token i can match (see tag_tokens).
+    """
+    if tokens is None:
+        tokens = [None] * len(tags)
+    edges = [[(i + 1, symbols, i)] for i, symbols in enumerate(tags)]
+    return earley_edges(grammar, edges, tokens, start)
+
+
+def earley_edges(grammar: CompiledGrammar, edges: list[list[tuple]], tokens: list[str], start: Symbol = None)->Forest:
+    """
+    Earley over a word lattice. edges[i] lists (end position, symbol IDs, token index) for every
+    word that can start at position i, so a plain token list is the lattice with one edge per
+    position. Scanning follows every edge, and the shared chart means ambiguous segmentations are
+    never enumerated.
+    """
+    chart = EarleyChart(grammar, tokens, start)
+    for outgoing in edges:
+        chart.advance(outgoing)
+    return chart.forest
+
+
+class EarleyChart:
+    """
+    Earley chart built one position at a time, so a parse can be extended as words arrive.
+
+    Predictions are filtered with the predict table, so only rules that can start with a word at
+    the current position (or derive nothing) are added. That needs the next words, so each set is
+    processed in two phases. When the parse reaches position i, the items scanned into set i are
+    completed and only nullable rules are predicted; none of that depends on what comes next, so
+    forest.accepted is already right for an input ending at i. advance() then adds the predictions
+    for the words starting at i and scans across them into the following sets.
+    """
+    def __init__(self, grammar: CompiledGrammar, tokens: list[str] = None, start: Symbol = None):
+        self.grammar = grammar
+        self.forest = Forest(grammar, [] if tokens is None else tokens, None if start is None else grammar.ids[start], 0)
+        self.position = 0
+        # Per set: item (rule, dot, origin) -> None, insertion ordered, and the agenda walking it
+        self.chart = []
+        self.agendas = []
+        self.cursors = [] # how far each agenda has been walked
+        self.waiting = [] # sym -> items at set i whose next symbol is sym
+        self.predicted = []
+        self.completed = [] # symbols completed at i with origin i (nullable here)
+        self._extend(0)
+        self.predicted[0].add(self.forest.start)
+        self._predict(0, self.forest.start, None)
+        self._process(0, None)
+
+    def _extend(self, end: int)->None:
+        while len(self.chart) <= end:
+            self.chart.append({})
+            self.agendas.append([])
+            self.cursors.append(0)
+            self.waiting.append({})
+            self.predicted.append(set())
+            self.completed.append(set())
+
+    def _add(self, i: int, item: tuple, link)->None:
+        if i >= len(self.chart):
+            self._extend(i)
+        key = item + (i,)
+        links = self.forest.links
+        if item not in self.chart[i]:
+            self.chart[i][item] = None
+            self.agendas[i].append(item)
+            links[key] = set()
+        if link is not None:
+            links[key].add(link)
+
+    def _predict(self, i: int, sym: int, lookahead: frozenset)->None:
+        # Without a lookahead only the rules that can derive nothing are safe to add
+        rules = set(self.grammar.nullable_rules[sym])
+        if lookahead:
+            table = self.grammar.predict[sym]
+            for tag in lookahead:
+                rules.update(table.get(tag, ()))
+        for r in rules:
+            self._add(i, (r, 0, i), None)
+
+    def _scan(self, i: int, item: tuple, sym: int, outgoing)->None:
+        r, dot, origin = item
+        for end, tag, token in outgoing:
+            if sym in tag:
+                self._add(end, (r, dot + 1, origin), (item + (i,) if dot else None, (TOKEN, token)))
+
+    def _process(self, i: int, outgoing, lookahead: frozenset = frozenset())->None:
+        """Walks set i's agenda from where it was left. outgoing is None until the words at i are known."""
+        rule_lhs = self.grammar.rule_lhs
+        rule_rhs = self.grammar.rule_rhs
+        terminals = self.grammar.terminals
+        symbols = self.forest.symbols
+        agenda = self.agendas[i]
+        waiting = self.waiting
+        predicted = self.predicted[i]
+        completed = self.completed[i]
+        add = self._add
+        j = self.cursors[i]
+        while j < len(agenda):
+            item = agenda[j]
+            j += 1
+            r, dot, origin = item
+            rhs = rule_rhs[r]
+            if dot < len(rhs):
+                sym = rhs[dot]
+                # Scan
+                if outgoing is not None and sym in lookahead:
+                    self._scan(i, item, sym, outgoing)
+                if sym in terminals:
+                    continue
+                waiting[i].setdefault(sym, []).append(item)
+                # Predict
+                if sym not in predicted:
+                    predicted.add(sym)
+                    self._predict(i, sym, lookahead if outgoing is not None else None)
+                # A symbol already completed empty at i advances late arrivals too
+                if sym in completed:
+                    add(i, (r, dot + 1, origin), (item + (i,) if dot else None, (sym, i, i)))
+            else:
+                # Complete
+                lhs = rule_lhs[r]
+                node = (lhs, origin, i)
+                families = symbols.get(node)
+                if families is None:
+                    families = symbols[node] = set()
+                    first_completion = True
+                else:
+                    first_completion = False
+                families.add(item + (i,))
+                if not first_completion:
+                    continue
+                if origin == i:
+                    completed.add(lhs)
+                for parent in list(waiting[origin].get(lhs, ())):
+                    pr, pdot, porigin = parent
+                    add(i, (pr, pdot + 1, porigin), (parent + (origin,) if pdot else None, node))
+        self.cursors[i] = j
+
+    def advance(self, outgoing: list[tuple])->None:
+        """
+        Moves past the current position. outgoing lists (end, symbol IDs, token index) for each
+        word starting here, the same as one position of earley_edges().
+        """
+        i = self.position
+        lookahead = frozenset().union(*(tag for _, tag, _ in outgoing))
+        rule_rhs = self.grammar.rule_rhs
+        # Catch up on what the first phase had to leave: predictions on the lookahead, and scans
+        for sym in list(self.predicted[i]):
+            self._predict(i, sym, lookahead)
+        for item in self.agendas[i][:self.cursors[i]]:
+            r, dot, _ = item
+            if dot < len(rule_rhs[r]) and rule_rhs[r][dot] in lookahead:
+                self._scan(i, item, rule_rhs[r][dot], outgoing)
+        self._process(i, outgoing, lookahead)
+        self.position = i + 1
+        self._extend(self.position)
+        self._process(self.position, None)
+        self.forest.length = self.position
+
+
+def parse(tokens: list[str], grammar: CompiledGrammar = None, lexicon: dict = None, start: Symbol = None)->Forest:
+    """Parses a list of Wizard Language tokens. The grammar defaults to bnf_grammar_2."""
+    if grammar is None:
+        grammar = get_compiled('wizard')
+    tags = tag_tokens(tokens, grammar, lexicon)
+    return earley_parse(grammar, tags, tokens, start)
+
+
+def parse_lattice(lattice, grammar: CompiledGrammar = None, lexicon: dict = None, start: Symbol = None)->Forest:
+    """
+    Parses every segmentation in a wizard_tokenizer.Lattice at once. The forest's tokens are
+    the lattice's words, so tree() shows which segmentation each parse used.
+    """
+    if grammar is None:
+        grammar = get_compiled('wizard')
+    words = []
+    edges = []
+    for i, out in enumerate(lattice.edges):
+        row = []
+        for end, word in out:
+            symbols = tag_tokens([word], grammar, lexicon)[0]
+            if symbols:
+                row.append((end, symbols, len(words)))
+                words.append(word)
+        edges.append(row)
+    return earley_edges(grammar, edges, words, start)
+
+
+@dataclass
+class PartialParse:
+    """What a listener knows after hearing the first `position` tokens of an utterance."""
+    position: int
+    viable: bool # some sentence still starts with these tokens
+    accepted: bool # and the tokens so far are already a whole sentence
+    spans: dict # case -> [(start, end)] the parser's spans, which only grow; this parse has the first counts[case]
+    counts: dict
+
+    @property
+    def marked(self)->dict:
+        """case -> [(start, end)] token spans of the phrases closed by a particle of that case."""
+        return {case: self.spans[case][:count] for case, count in self.counts.items()}
+
+    @property
+    def topics(self)->list:
+        return self.spans.get('topic', [])[:self.counts.get('topic', 0)]
+
+    @property
+    def objects(self)->list:
+        return self.spans.get('object', [])[:self.counts.get('object', 0)]
+
+
+class IncrementalParser:
+    """
+    Parses an utterance a token at a time, as a wizard hears it. feed() extends one EarleyChart
+    instead of parsing the prefix again, so each token costs its own Earley set plus the
+    hypotheses it adds, never the prefix over again.
+
+    Whenever a particle arrives (w4 topic, w0 object, ...), every phrase it can close under some
+    parse of the prefix becomes a hypothesis for that case, so listeners can react to the topic
+    or the object before the speaker is done.
+
+    That is not constant per token in general. An Earley set can hold an item per earlier
+    position, so a token can cost O(n) items and O(n^2) completions after n tokens; for the wizard
+    grammar the sets stay a few items long. In an ambiguous sentence a particle can close a phrase
+    starting at each earlier position, so it adds O(n) hypotheses (in long_sentence each t3 closes
+    a conjunct from every earlier clause), and all of them together are O(n^2). Hypotheses are
+    only appended, so what feed() returns shares them instead of copying the ones found so far.
+    """
+    def __init__(self, grammar: CompiledGrammar = None, lexicon: dict = None, start: Symbol = None):
+        if grammar is None:
+            grammar = get_compiled('wizard')
+        self.grammar = grammar
+        self.lexicon = lexicon
+        self.chart = EarleyChart(grammar, [], start)
+        self.tokens = self.chart.forest.tokens
+        self.marked = {} # case -> spans in the order they were found, only ever appended to
+        self._seen = set() # (case, span)
+
+    @property
+    def forest(self)->Forest:
+        return self.chart.forest
+
+    def feed(self, token: str)->PartialParse:
+        i = self.chart.position
+        tags = tag_tokens([token], self.grammar, self.lexicon)[0]
+        self.tokens.append(token)
+        self.chart.advance([(i + 1, tags, i)])
+        case = PARTICLE_CASES.get(token)
+        if case is not None:
+            spans = self.marked.setdefault(case[0], [])
+            for span in self.marked_phrases(i):
+                if (case[0], span) not in self._seen:
+                    self._seen.add((case[0], span))
+                    spans.append(span)
+        return self.analysis()
+
+    def marked_phrases(self, i: int)->list[tuple]:
+        """Spans of the phrases the token at i closes: whatever comes right before it in any item that took it."""
+        links = self.forest.links
+        spans = set()
+        for item in self.chart.chart[i + 1]:
+            for left, child in links.get(item + (i + 1,), ()):
+                closes = child == (TOKEN, i) or (child[0] != TOKEN and child[1:] == (i, i + 1))
+                if left is None or not closes:
+                    continue
+                for _, before in links.get(left, ()):
+                    if before[0] == TOKEN:
+                        spans.add((before[1], before[1] + 1))
+                    elif before[1] < i:
+                        spans.add((before[1], before[2]))
+        return sorted(spans)
+
+    def analysis(self)->PartialParse:
+        position = self.chart.position
+        return PartialParse(position=position,
+                            viable=bool(self.chart.chart[position]),
+                            accepted=self.forest.accepted,
+                            spans=self.marked,
+                            counts={case: len(spans) for case, spans in self.marked.items()})
+
+
+def long_sentence(clauses: int)->list[str]:
+    # "tasu w0 pekang t3" conjuncts chained into one verb phrase; ambiguity grows with every clause
+    tokens = []
+    for _ in range(clauses):
+        tokens += ['tasu', 'w0', 'pekang', 't3']
+    return tokens + ['tasu', 'g4', 'pekang']
+
+
+def benchmark_parser(clauses=(2, 4, 8, 16, 32), grammar_name='wizard')->list[dict]:
+    grammar = get_compiled(grammar_name)
+    results = []
+    for c in clauses:
+        tokens = long_sentence(c)
+        start = time.perf_counter()
+        forest = parse(tokens, grammar)
+        seconds = time.perf_counter() - start
+        result = {'tokens': len(tokens), 'seconds': seconds, 'accepted': forest.accepted,
+                  'trees': forest.count_trees() if forest.accepted else 0}
+        result.update(forest.size())
+        results.append(result)
+        print(f"{len(tokens)} tokens: {seconds * 1000:.1f} ms, accepted {forest.accepted},",
+              f"{result['trees']} trees in {result['symbol_nodes']} symbol nodes / {result['packed_links']} packed links")
+    return results
+
+
+def benchmark_incremental(clauses=(4, 8, 16, 32), grammar_name='wizard')->list[dict]:
+    """Feeding tokens one at a time against parsing every prefix again, as a listener would without feed()."""
+    grammar = get_compiled(grammar_name)
+    results = []
+    for c in clauses:
+        tokens = long_sentence(c)
+        started = time.perf_counter()
+        listener = IncrementalParser(grammar)
+        for tok in tokens:
+            partial = listener.feed(tok)
+        feed_seconds = time.perf_counter() - started
+        batch = parse(tokens, grammar)
+        assert listener.forest.symbols == batch.symbols and listener.forest.links == batch.links
+        started = time.perf_counter()
+        for k in range(1, len(tokens) + 1):
+            parse(tokens[:k], grammar)
+        reparse_seconds = time.perf_counter() - started
+        results.append({'tokens': len(tokens), 'feed_seconds': feed_seconds, 'reparse_seconds': reparse_seconds,
+                        'accepted': partial.accepted, 'objects': len(partial.objects)})
+        print(f"{len(tokens)} tokens: feed {feed_seconds / len(tokens) * 1e6:.0f} us/token,",
+              f"reparse every prefix {reparse_seconds * 1000:.1f} ms vs {feed_seconds * 1000:.1f} ms,",
+              f"{len(partial.objects)} object hypotheses")
+    return results
+
+
+def benchmark_grammar_cache(cache_dir: str = None)->dict:
+    """Time to compile each grammar from its text against loading it from the disk cache."""
+    results = {}
+    for name, (text, start) in GRAMMARS.items():
+        started = time.perf_counter()
+        compile_grammar(load_grammar(text, start), grammar_digest(text, start))
+        compile_seconds = time.perf_counter() - started
+        load_compiled(text, start, cache_dir) # make sure the cache file exists
+        _compiled.clear()
+        started = time.perf_counter()
+        load_compiled(text, start, cache_dir)
+        load_seconds = time.perf_counter() - started
+        results[name] = (compile_seconds, load_seconds)
+        print(f"{name}: compile {compile_seconds * 1000:.2f} ms, cached load {load_seconds * 1000:.2f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_grammar_cache()
+    benchmark_parser()
+    benchmark_incremental()
@@ -0,0 +1,305 @@
+"""
+Surface realization for Wizard Language
+
+The flow in wizard_language.__syntax_readme__ is game event -> intent -> Wizard Language ->
+surface rendering. This is the last step: an event frame, the verb plus whichever thematic roles
+are filled (action_classes.Verb.frame(), or Event.frame() with the lexeme naming each entity), is
+linearized as English, Japanese or Wizard Language.
+
+Wizard Language and Japanese share a grammar, so both are verb-final, with each role marked by a
+particle (agent g4, patient w0, ...) and the aspect/mood flags spelled as auxiliaries after the
+verb. Japanese spells the particles in romaji. English is subject-verb-object with prepositions.
+
+A frame is a tuple of integers:
+
+    (verb id, aspect flags, (agent id, patient id, ..., cause id))  # -1 for an empty role
+
+The word order only depends on which roles are filled (the verb's frame class) and on the aspect
+flags, so each (language, role mask, flags) is compiled once into a format string and reused.
+render_batch() takes a batch of frames as arrays, looks up the surface forms of every word with
+NumPy, renders each distinct frame once, and writes the strings into a caller's buffer.
+Single frames go through a bounded LRU dict, since wizards repeat the same spells a lot.
+"""
+
+import time
+
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+import lexicon_store
+
+from action_classes import ASPECTS, ROLES
+from text_functors import WZ_TO_ROMAJI
+
+LANGUAGES = ('en', 'jp', 'wz')
+
+# Role -> Wizard Language particle. Japanese spells the same particles in romaji.
+ROLE_PARTICLES = {
+    'agent': 'g4',
+    'patient': 'w0',
+    'undergoer': 'n1',
+    'experiencer': 'n1',
+    'instrument': 'd3',
+    'location': 'd3',
+    'manner': 'd3',
+    'purpose': 'n1',
+    'cause': 'd3',
+}
+
+# Verb-final word order for Wizard Language and Japanese, the verb comes after all of these
+SOV_ORDER = ('cause', 'location', 'agent', 'experiencer', 'undergoer', 'instrument', 'manner', 'purpose', 'patient')
+
+# Aspect/mood auxiliaries after the verb, in the order they stack
+AUXILIARY_ORDER = ('causative', 'passive', 'potential', 'perfective', 'volitional')
+AUXILIARIES = {
+    'jp': {'causative': 'sase', 'passive': 'rare', 'potential': 'dekiru', 'perfective': 'ta',
+           'volitional': 'you', 'conditional': 'nara', 'imperative': 'nasai'},
+    'wz': {'causative': 's4s3', 'passive': 'r4r3', 'potential': 'd3k1r7', 'perfective': 't4',
+           'volitional': 'y07', 'conditional': 'n4r4', 'imperative': 'n4s41'},
+}
+
+# English is quasi-English, like the readme says: the lexicon only has base forms of verbs
+ENGLISH_PREPOSITIONS = {
+    'undergoer': 'to',
+    'experiencer': 'for',
+    'instrument': 'with',
+    'location': 'at',
+    'manner': 'like',
+    'purpose': 'for',
+    'cause': 'because of',
+}
+ENGLISH_ORDER = ('patient', 'undergoer', 'experiencer', 'instrument', 'location', 'manner', 'purpose', 'cause')
+
+ROLE_INDEX = {role: i for i, role in enumerate(ROLES)}
+ASPECT_BIT = {name: 1 << i for i, name in enumerate(ASPECTS)}
+
+
+def role_mask(roles)->int:
+    """Bit i set when ROLES[i] is filled."""
+    mask = 0
+    for i, lexeme_id in enumerate(roles):
+        if lexeme_id >= 0:
+            mask |= 1 << i
+    return mask
+
+
+def compile_template(language: str, mask: int, flags: int)->str:
+    """
+    Format string for one (language, role mask, aspect flags). Field {0} is the verb and field
+    {i + 1} is ROLES[i], so a frame renders with template.format(verb, *role_surfaces).
+    """
+    if language not in LANGUAGES:
+        raise ValueError(f"Unknown language {language!r}, expected one of {LANGUAGES}.")
+    filled = {role for i, role in enumerate(ROLES) if mask >> i & 1}
+    aspect = {name for name, bit in ASPECT_BIT.items() if flags & bit}
+    field = {role: '{%d}' % (ROLE_INDEX[role] + 1) for role in ROLES}
+    imperative = 'imperative' in aspect
+    if imperative:
+        # Orders are given to the listener, so the agent isn't said
+        filled.discard('agent')
+
+    if language == 'en':
+        subject, by_agent = 'agent', None
+        if 'passive' in aspect and 'patient' in filled:
+            subject, by_agent = 'patient', 'agent'
+        words = ['if'] if 'conditional' in aspect else []
+        if subject in filled:
+            words.append(field[subject])
+        if 'potential' in aspect:
+            words.append('can')
+        elif 'volitional' in aspect:
+            words.append('will')
+        elif 'perfective' in aspect:
+            words.append('did')
+        if 'causative' in aspect:
+            words.append('make')
+        if 'passive' in aspect:
+            words.append('get')
+        words.append('{0}')
+        for role in ENGLISH_ORDER:
+            if role in filled and role != subject:
+                if role == 'patient':
+                    words.append(field[role])
+                elif role != by_agent:
+                    words.extend((ENGLISH_PREPOSITIONS[role], field[role]))
+        if by_agent in filled:
+            words.extend(('by', field[by_agent]))
+        return ' '.join(words)
+
+    particles = dict(ROLE_PARTICLES)
+    if 'passive' in aspect:
+        # The patient becomes the subject and the agent is marked like a source, as in Japanese
+        particles['patient'], particles['agent'] = particles['agent'], 'n1'
+    words = []
+    for role in SOV_ORDER:
+        if role in filled:
+            particle = particles[role]
+            words.extend((field[role], WZ_TO_ROMAJI(particle) if language == 'jp' else particle))
+    words.append('{0}')
+    auxiliaries = AUXILIARIES[language]
+    words.extend(auxiliaries[name] for name in AUXILIARY_ORDER if name in aspect)
+    if 'conditional' in aspect:
+        words.append(auxiliaries['conditional'])
+    if imperative:
+        words.append(auxiliaries['imperative'])
+    return ' '.join(words)
+
+
+class CacheInfo(NamedTuple):
+    # The fields functools.lru_cache reports
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class Realizer:
+    def __init__(self, store: lexicon_store.LexiconStore = None, cache_size: int = 65536):
+        if store is None:
+            store = lexicon_store.default_store()
+        self.store = store
+        self._templates = {} # (language, mask, flags) -> format string
+        # A plain dict rather than lru_cache over a bound method: that holds self, a cycle only the gc frees
+        self._rendered = OrderedDict() # (language, verb id, flags, roles) -> string
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self)->CacheInfo:
+        """Hits and misses of the single frame cache, as functools.lru_cache reports them."""
+        return CacheInfo(self.hits, self.misses, self.cache_size, len(self._rendered))
+
+    def template(self, language: str, mask: int, flags: int)->str:
+        key = (language, mask, flags)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = compile_template(language, mask, flags)
+        return template
+
+    def _render_frame(self, language: str, verb_id: int, flags: int, roles: tuple)->str:
+        surface = self.store.surface
+        words = [surface(lexeme_id, language) if lexeme_id >= 0 else '' for lexeme_id in roles]
+        return self.template(language, role_mask(roles), flags).format(surface(verb_id, language), *words)
+
+    def render(self, frame: tuple, language: str = 'wz')->str:
+        """Renders one (verb id, flags, roles) frame, memoized."""
+        verb_id, flags, roles = frame
+        key = (language, int(verb_id), int(flags), tuple(int(r) for r in roles))
+        rendered = self._rendered.get(key)
+        if rendered is not None:
+            self.hits += 1
+            self._rendered.move_to_end(key)
+            return rendered
+        self.misses += 1
+        rendered = self._rendered[key] = self._render_frame(*key)
+        if len(self._rendered) > self.cache_size:
+            self._rendered.popitem(last=False)
+        return rendered
+
+    def render_batch(self, verb_ids, flags, roles, language: str = 'wz', out=None, offset: int = 0):
+        """
+        Renders a batch of frames given as arrays: verb_ids and flags of shape (n,), roles of
+        shape (n, len(ROLES)) with -1 for empty roles. The strings are written to out[offset:offset + n],
+        a preallocated list or object array (a new list if None), which is returned.
+        """
+        verb_ids = np.asarray(verb_ids, dtype=np.int32)
+        flags = np.asarray(flags, dtype=np.int32)
+        roles = np.asarray(roles, dtype=np.int32).reshape(len(verb_ids), len(ROLES))
+        n = len(verb_ids)
+        if out is None:
+            out = [None] * (offset + n)
+        if n == 0:
+            return out
+        # Identical frames are rendered once and scattered back. Viewing each row as one opaque
+        # value makes np.unique compare rows with memcmp, much faster than unique(axis=0).
+        frames = np.ascontiguousarray(np.column_stack((verb_ids, flags, roles)))
+        width = frames.shape[1]
+        keys = frames.view(np.dtype((np.void, frames.itemsize * width))).reshape(-1)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        unique = unique.view(np.int32).reshape(-1, width)
+        inverse = inverse.reshape(-1)
+
+        # Surface string IDs for every word of every distinct frame, in one pass
+        store = self.store
+        ids = unique[:, [0] + list(range(2, 2 + len(ROLES)))]
+        present = ids >= 0
+        row_of_id = store.row_of_id
+        if (ids >= len(row_of_id)).any():
+            raise KeyError(int(ids[ids >= len(row_of_id)][0]))
+        rows = row_of_id[np.where(present, ids, 0)]
+        missing = present & (rows < 0)
+        if missing.any():
+            raise KeyError(int(ids[missing][0]))
+        string_ids = np.where(present, store.columns[language][rows], -1)
+        masks = (present[:, 1:].astype(np.int64) << np.arange(len(ROLES))).sum(axis=1)
+
+        string = store.string
+        strings = {-1: ''}
+        for s in np.unique(string_ids).tolist():
+            if s >= 0:
+                strings[s] = string(s)
+        template = self.template
+        rendered = [template(language, mask, frame_flags).format(*[strings[s] for s in words])
+                    for mask, frame_flags, words in zip(masks.tolist(), unique[:, 1].tolist(), string_ids.tolist())]
+        for i, u in enumerate(inverse.tolist()):
+            out[offset + i] = rendered[u]
+        return out
+
+
+def random_frames(store: lexicon_store.LexiconStore, count: int, distinct: int = None, seed=123):
+    """
+    Random (verb_ids, flags, roles) arrays for testing, built from distinct frames if given.
+    Each verb gets a fixed set of roles, its frame class, and the aspect flags come from a short
+    list, like the handful of spell forms wizards actually use.
+    """
+    rng = np.random.default_rng(seed)
+    size = distinct or count
+    verbs = store.of_class('verb')
+    nouns = store.of_class('noun')
+    verb_roles = rng.random((len(verbs), len(ROLES))) < 0.4
+    verb_roles[:, ROLE_INDEX['agent']] = True
+    common_flags = rng.integers(0, 1 << len(ASPECTS), 16, dtype=np.int32)
+    pick_verbs = rng.integers(0, len(verbs), size)
+    verb_ids = verbs[pick_verbs]
+    flags = rng.choice(common_flags, size)
+    roles = rng.choice(nouns, (size, len(ROLES))).astype(np.int32)
+    roles[~verb_roles[pick_verbs]] = -1
+    if distinct:
+        pick = rng.integers(0, distinct, count)
+        return verb_ids[pick], flags[pick], roles[pick]
+    return verb_ids, flags, roles
+
+
+def benchmark_realizer(batch=100000, distinct=(1000, 100000), lexicon_size=20000, seed=123)->list[dict]:
+    store = lexicon_store.LexiconStore.from_records(lexicon_store.synthetic_records(lexicon_size, seed))
+    results = []
+    for unique_frames in distinct:
+        verb_ids, flags, roles = random_frames(store, batch, unique_frames, seed)
+        for language in LANGUAGES:
+            realizer = Realizer(store)
+            out = [None] * batch
+            started = time.perf_counter()
+            realizer.render_batch(verb_ids, flags, roles, language, out)
+            batch_seconds = time.perf_counter() - started
+
+            realizer = Realizer(store)
+            frames = [(v, f, r) for v, f, r in zip(verb_ids.tolist(), flags.tolist(), map(tuple, roles.tolist()))]
+            started = time.perf_counter()
+            single = [realizer.render(frame, language) for frame in frames]
+            single_seconds = time.perf_counter() - started
+            assert single == out
+            results.append({'language': language, 'frames': batch, 'distinct': unique_frames,
+                            'batch_seconds': batch_seconds, 'single_seconds': single_seconds})
+            print(f"{language}: {batch:,} frames ({unique_frames:,} distinct) batch {batch_seconds * 1000:.0f} ms",
+                  f"({batch / batch_seconds / 1e3:.0f}k/s), one at a time {single_seconds * 1000:.0f} ms")
+    example = (1, ASPECT_BIT['perfective'], (0, 0, -1, -1, -1, -1, -1, -1, -1))
+    realizer = Realizer()
+    for language in LANGUAGES:
+        print(f"{language}: {realizer.render(example, language)}")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_realizer()
@@ -0,0 +1,193 @@
+"""
+Tokenizer for spoken Wizard Language
+
+Spells are spoken, so they arrive as one continuous phoneme string, the way name_generator.py
+writes words, with no spaces. Wizard Language forms are unique, but a string like 'tasuw0pekang'
+can still be cut more than one way once short lexemes and the particles (w4, g4, n0, ...) are
+in the mix.
+
+The tokenizer keeps every .wz form in a DAWG (a trie with equal suffix subtrees merged, so the
+many words ending in the same syllables share states) and turns an utterance into a segmentation
+lattice: lattice.edges[i] lists every (end, word) starting at character i that lies on at least
+one complete segmentation. Building it walks the DAWG from each position, which is linear in the
+length of the utterance for a bounded word length. wizard_parser.parse_lattice() parses the
+whole lattice in one chart, so ambiguous segmentations never have to be enumerated.
+"""
+
+import random
+import time
+
+from dataclasses import dataclass
+
+import lexicon_store
+import wizard_parser
+
+
+def grammar_particles()->set:
+    """Particles and other closed-class forms that appear as quoted terminals in the Wizard grammars."""
+    particles = set()
+    for name in ('wizard', 'japanese'):
+        grammar = wizard_parser.get_compiled(name)
+        particles.update(grammar.symbols[s].strip("'") for s in grammar.terminals)
+    return particles
+
+
+class Dawg:
+    """
+    Minimal acyclic automaton over a set of words.
+    transitions[state] maps a character to the next state, final[state] marks the end of a word.
+    State 0 is the root.
+    """
+    def __init__(self, words):
+        # Build a trie of nested dicts, then merge equivalent states from the leaves up
+        trie = {}
+        END = ''
+        for word in words:
+            if not word:
+                continue
+            node = trie
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[END] = True
+
+        registry = {} # signature -> state
+        transitions = []
+        final = []
+
+        def register(node):
+            edges = tuple(sorted((ch, register(child)) for ch, child in node.items() if ch != END))
+            signature = (END in node, edges)
+            state = registry.get(signature)
+            if state is None:
+                state = len(transitions)
+                registry[signature] = state
+                transitions.append(dict(edges))
+                final.append(END in node)
+            return state
+
+        root = register(trie)
+        # Put the root first so walks always start from state 0
+        order = [root] + [s for s in range(len(transitions)) if s != root]
+        renumber = {old: new for new, old in enumerate(order)}
+        self.transitions = [{ch: renumber[t] for ch, t in transitions[old].items()} for old in order]
+        self.final = bytearray(final[old] for old in order)
+        self.max_length = max((len(w) for w in words if w), default=0)
+
+    def __len__(self)->int:
+        return len(self.transitions)
+
+    def __contains__(self, word: str)->bool:
+        state = 0
+        for ch in word:
+            state = self.transitions[state].get(ch)
+            if state is None:
+                return False
+        return bool(self.final[state])
+
+    def prefixes(self, text: str, start: int):
+        """End positions of every word in the DAWG that starts at text[start]."""
+        transitions = self.transitions
+        final = self.final
+        state = 0
+        for i in range(start, len(text)):
+            state = transitions[state].get(text[i])
+            if state is None:
+                return
+            if final[state]:
+                yield i + 1
+
+
+@dataclass
+class Lattice:
+    text: str
+    edges: list # edges[i] -> list of (end, word), only edges on a complete segmentation
+
+    @property
+    def complete(self)->bool:
+        return bool(self.text) and bool(self.edges[0])
+
+    def count(self)->int:
+        """Number of complete segmentations, counted without listing them."""
+        n = len(self.text)
+        ways = [0] * (n + 1)
+        ways[n] = 1
+        for i in range(n - 1, -1, -1):
+            ways[i] = sum(ways[end] for end, _ in self.edges[i])
+        return ways[0]
+
+    def segmentations(self, limit=10):
+        """Up to limit segmentations as token lists, for inspection."""
+        n = len(self.text)
+        stack = [(0, [])]
+        found = 0
+        while stack and found < limit:
+            i, tokens = stack.pop()
+            if i == n:
+                found += 1
+                yield tokens
+                continue
+            for end, word in reversed(self.edges[i]):
+                stack.append((end, tokens + [word]))
+
+
+class WizardTokenizer:
+    def __init__(self, words):
+        self.dawg = Dawg(words)
+
+    @classmethod
+    def from_store(cls, store: lexicon_store.LexiconStore = None, particles=None)->"WizardTokenizer":
+        if store is None:
+            store = lexicon_store.default_store()
+        if particles is None:
+            particles = grammar_particles()
+        return cls(set(store.index('wz')) | set(particles))
+
+    def lattice(self, text: str)->Lattice:
+        text = ''.join(text.split())
+        n = len(text)
+        # Forward: every word starting at every position reachable from the start
+        reachable = bytearray(n + 1)
+        reachable[0] = 1
+        forward = [[] for _ in range(n)]
+        for i in range(n):
+            if reachable[i]:
+                for end in self.dawg.prefixes(text, i):
+                    forward[i].append(end)
+                    reachable[end] = 1
+        # Backward: keep only words that can still reach the end of the utterance
+        alive = bytearray(n + 1)
+        alive[n] = 1
+        edges = [[] for _ in range(n)]
+        for i in range(n - 1, -1, -1):
+            for end in forward[i]:
+                if alive[end]:
+                    edges[i].append((end, text[i:end]))
+            if edges[i]:
+                alive[i] = 1
+        return Lattice(text, edges)
+
+
+def benchmark_tokenizer(words_per_utterance=(100, 1000, 10000), lexicon_size=20000, seed=123)->list[dict]:
+    store = lexicon_store.LexiconStore.from_records(lexicon_store.synthetic_records(lexicon_size, seed))
+    started = time.perf_counter()
+    tokenizer = WizardTokenizer.from_store(store)
+    build_seconds = time.perf_counter() - started
+    forms = list(store.index('wz'))
+    particles = sorted(grammar_particles())
+    print(f"DAWG over {len(forms) + len(particles)} forms: {len(tokenizer.dawg)} states, built in {build_seconds:.2f}s")
+    rng = random.Random(seed)
+    results = []
+    for size in words_per_utterance:
+        text = ''.join(rng.choice(forms) + (rng.choice(particles) if rng.random() < 0.3 else '') for _ in range(size))
+        started = time.perf_counter()
+        lattice = tokenizer.lattice(text)
+        seconds = time.perf_counter() - started
+        edges = sum(len(out) for out in lattice.edges)
+        results.append({'characters': len(text), 'seconds': seconds, 'edges': edges, 'complete': lattice.complete})
+        print(f"{len(text)} characters: {seconds * 1000:.1f} ms ({seconds / len(text) * 1e6:.2f} us/char),",
+              f"{edges} lattice edges, {lattice.count():.3g} segmentations")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_tokenizer()
@@ -0,0 +1,198 @@
+"""
+Translation between Wizard Language, English and Japanese
+
+Every wizard in earshot hears the same spell, and the lexicon is a closed 1:1 world, so the same
+Wizard Language sentence gets turned into English or Japanese over and over. Translation goes
+through the event frame that wizard_realizer renders from:
+
+    wz tokens -> parse (wizard_parser) -> frame (verb id, aspect flags, role ids) -> en/jp surface
+
+The frame is the canonical form of a parse. Word order, which of the ambiguous parse trees was
+picked, and the surface script don't change it, so it is what the translation cache is keyed on.
+Two bounded LRU caches sit in front of the work:
+
+* token tuple -> frame, so a sentence heard before is never parsed again
+* (frame, language) -> surface, the realizer's own cache, shared by every word order of a frame
+
+Once battle chatter repeats, a translation costs two dictionary lookups. hit_rate() reports how
+often that happened.
+
+Reading a frame back from a parse is lossy in one way: roles that share a particle (n1 is
+undergoer, experiencer or purpose) are filled in ROLES order.
+"""
+
+import random
+import time
+
+from collections import OrderedDict
+
+import lexicon_store
+import wizard_parser
+import wizard_realizer
+
+from action_classes import ROLES
+from wizard_realizer import ASPECT_BIT, AUXILIARIES, ROLE_PARTICLES
+
+# Particle -> roles it can mark, in ROLES order. The topic is read as the agent.
+PARTICLE_ROLES = {}
+for _role in ROLES:
+    PARTICLE_ROLES.setdefault(ROLE_PARTICLES[_role], []).append(_role)
+PARTICLE_ROLES['w4'] = ['agent']
+del _role
+
+# Wizard Language auxiliary -> aspect flag bit, the auxiliaries the realizer puts after the verb
+AUXILIARY_FLAGS = {form: ASPECT_BIT[name] for name, form in AUXILIARIES['wz'].items()}
+
+ROLE_INDEX = {role: i for i, role in enumerate(ROLES)}
+
+
+def marked_words(node, fill)->list[str]:
+    """
+    The words under a parse tree node. fill(particle, words) is called for every phrase followed
+    by a role particle.
+    """
+    # A module function rather than a recursive closure in _parse_frame: that closure would be a
+    # reference cycle through fill and keep the Translator alive until the next gc run
+    if isinstance(node, str):
+        return [node]
+    parts = [marked_words(child, fill) for child in node[1]]
+    for k in range(1, len(parts)):
+        if len(parts[k]) == 1 and parts[k][0] in PARTICLE_ROLES:
+            fill(parts[k][0], parts[k - 1])
+    return [w for part in parts for w in part]
+
+
+class Translator:
+    def __init__(self,
+                 store: lexicon_store.LexiconStore = None,
+                 grammar: wizard_parser.CompiledGrammar = None,
+                 cache_size: int = 65536):
+        if store is None:
+            store = lexicon_store.default_store()
+        self.store = store
+        self.grammar = wizard_parser.get_compiled('wizard') if grammar is None else grammar
+        self.lexicon = wizard_parser.lexicon_categories(store)
+        self.realizer = wizard_realizer.Realizer(store, cache_size)
+        # Bounded like the realizer's, and for the same reason not an lru_cache over a bound method
+        self._frames = OrderedDict() # token tuple -> frame
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def _parse_frame(self, tokens: tuple)->tuple:
+        # Auxiliaries after the verb are the aspect flags; the grammar itself has no slot for them
+        flags = 0
+        end = len(tokens)
+        while end and tokens[end - 1] in AUXILIARY_FLAGS:
+            end -= 1
+            flags |= AUXILIARY_FLAGS[tokens[end]]
+        words = list(tokens[:end])
+        forest = wizard_parser.parse(words, self.grammar, self.lexicon)
+        if not forest.accepted:
+            raise ValueError(f"Not a Wizard Language sentence: {' '.join(tokens)!r}")
+        tree = forest.tree()
+
+        index = self.store.index('wz')
+        ids = self.store.ids
+        def lexeme(word):
+            row = index.get(word)
+            return None if row is None else int(ids[row])
+
+        roles = [-1] * len(ROLES)
+        passive = flags & ASPECT_BIT['passive']
+        def fill(particle, phrase):
+            # The head of a phrase is its last noun
+            head = next((lexeme(w) for w in reversed(phrase)
+                         if lexeme(w) is not None and self.store.class_of(lexeme(w)) == 'noun'), None)
+            if head is None:
+                return
+            candidates = PARTICLE_ROLES.get(particle, ())
+            if passive:
+                # The realizer marks the patient with g4 and the agent with n1 in the passive
+                candidates = {'g4': ['patient'], 'n1': ['agent'] + PARTICLE_ROLES['n1']}.get(particle, candidates)
+            for role in candidates:
+                if roles[ROLE_INDEX[role]] < 0:
+                    roles[ROLE_INDEX[role]] = head
+                    return
+
+        verb = next((lexeme(w) for w in reversed(marked_words(tree, fill))
+                     if lexeme(w) is not None and self.store.class_of(lexeme(w)) == 'verb'), None)
+        if verb is None:
+            raise ValueError(f"No verb in {' '.join(tokens)!r}")
+        return (verb, flags, tuple(roles))
+
+    def frame(self, sentence)->tuple:
+        """Canonical (verb id, aspect flags, role ids) of a Wizard Language sentence, a string or tokens."""
+        tokens = tuple(sentence.split()) if isinstance(sentence, str) else tuple(sentence)
+        frame = self._frames.get(tokens)
+        if frame is not None:
+            self.hits += 1
+            self._frames.move_to_end(tokens)
+            return frame
+        self.misses += 1
+        frame = self._frames[tokens] = self._parse_frame(tokens)
+        if len(self._frames) > self.cache_size:
+            self._frames.popitem(last=False)
+        return frame
+
+    def cache_info(self)->wizard_realizer.CacheInfo:
+        """Hits and misses of the parse cache."""
+        return wizard_realizer.CacheInfo(self.hits, self.misses, self.cache_size, len(self._frames))
+
+    def translate(self, sentence, language: str = 'en')->str:
+        return self.realizer.render(self.frame(sentence), language)
+
+    def hit_rate(self)->dict:
+        """Share of lookups answered from each cache."""
+        rates = {}
+        for name, info in (('parse', self.cache_info()), ('render', self.realizer.cache_info())):
+            lookups = info.hits + info.misses
+            rates[name] = info.hits / lookups if lookups else 0.0
+        return rates
+
+
+def benchmark_translator(distinct=1000, utterances=100000, lexicon_size=20000, seed=123)->dict:
+    """Battle chatter: a stream where a few spells are heard far more often than the rest."""
+    store = lexicon_store.LexiconStore.from_records(lexicon_store.synthetic_records(lexicon_size, seed))
+    translator = Translator(store)
+    rng = random.Random(seed)
+    nouns = store.of_class('noun').tolist()
+    verbs = store.of_class('verb').tolist()
+    flag_choices = [0, ASPECT_BIT['perfective'], ASPECT_BIT['volitional'], ASPECT_BIT['potential'] | ASPECT_BIT['perfective']]
+    frames = []
+    for _ in range(distinct):
+        roles = [-1] * len(ROLES)
+        for role in ('agent', 'patient', 'undergoer', 'instrument'):
+            if role in ('agent', 'patient') or rng.random() < 0.3:
+                roles[ROLE_INDEX[role]] = rng.choice(nouns)
+        frames.append((rng.choice(verbs), rng.choice(flag_choices), tuple(roles)))
+    spoken = [translator.realizer.render(frame, 'wz') for frame in frames]
+
+    # Every frame reads back from its own Wizard Language rendering
+    for frame, sentence in zip(frames, spoken):
+        assert translator.frame(sentence) == frame, (frame, sentence)
+
+    chatter = [spoken[min(int(rng.paretovariate(1.0)) - 1, distinct - 1)] for _ in range(utterances)]
+    fresh = Translator(store)
+    started = time.perf_counter()
+    for sentence in spoken:
+        fresh.translate(sentence, 'en')
+    cold_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for i, sentence in enumerate(chatter):
+        fresh.translate(sentence, 'en' if i & 1 else 'jp')
+    warm_seconds = time.perf_counter() - started
+    result = {
+        'cold_us': cold_seconds / distinct * 1e6,
+        'chatter_us': warm_seconds / utterances * 1e6,
+        'hit_rate': fresh.hit_rate(),
+    }
+    print(f"first translation {result['cold_us']:.0f} us, repeated chatter {result['chatter_us']:.2f} us,",
+          f"hit rates {', '.join(f'{k} {v:.1%}' for k, v in result['hit_rate'].items())}")
+    example = spoken[0]
+    print(f"wz: {example}\nen: {fresh.translate(example, 'en')}\njp: {fresh.translate(example, 'jp')}")
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_translator()
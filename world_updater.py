@@ -0,0 +1,292 @@
+"""
+World state updater for Battle Wizard Simulator
+
+From the README: statements about the world are Wizard beliefs by default, and an Updater writes
+them to the world state if they are world-true. A spell is the speech act that both describes the
+world and changes it, so each tick the Updater takes every act made during the tick:
+
+* spells: the speaker casts a verb (kill, heal, stun, wake) with an agent and a patient. A spell
+  takes effect if its preconditions hold in the world and the agent has the mana for it.
+* statements: the speaker claims a verb event happened. They change nothing; the Updater reports
+  whether each one is world-true, and that is what a belief store records.
+
+Acts are action_classes.Event records whose roles are rows of an entity_store.EntityStore. A tick
+runs in vectorized passes over the acts, never over the entities:
+
+1. validate every act against the world as it was at the start of the tick, including that the
+   caster has the mana for the spell on its own
+2. resolve conflicts: per target, the highest priority verb wins (kill > stun > wake > heal).
+   Exclusive verbs go to one caster, the strongest (highest power, then lowest rank, then lowest
+   row), and additive ones (heal) all apply.
+3. ration mana over the spells that won: each caster pays for theirs in priority order, skipping
+   any that no longer fit. Spells nobody could pay for are refused, and their targets go back to
+   step 2 with the remaining spells on them, so the next best caster gets the target instead.
+4. commit every accepted spell at once
+
+Everything is decided from the world state and the acts themselves, never from the order acts
+were submitted in, so a tick is deterministic. Two wizards who kill each other in the same tick
+both die.
+"""
+
+import time
+
+from dataclasses import dataclass
+
+import numpy as np
+
+import entity_store
+import wizard_language as wl
+
+from action_classes import Event, ROLES
+from entity_store import ALIVE, CONSCIOUS, EntityStore
+
+AGENT = ROLES.index('agent')
+PATIENT = ROLES.index('patient')
+
+# Verbs the world knows how to apply, in priority order. Their lexeme ids come from the lexicon,
+# so the events a tick makes can be rendered; an Updater can be given another lexicon's ids.
+WORLD_VERBS = ('kill', 'stun', 'wake', 'heal')
+DEFAULT_VERB_IDS = {verb: wl.lexicon_en[verb]['id'] for verb in WORLD_VERBS}
+SPELL_COST = {'kill': 0.5, 'stun': 0.2, 'wake': 0.1, 'heal': 0.2}
+EXCLUSIVE = {'kill': True, 'stun': True, 'wake': True, 'heal': False}
+HEAL_PER_POWER = 0.5
+
+# Outcome codes per act
+ACCEPTED = 0
+INVALID = 1 # preconditions don't hold, or the verb isn't a world verb
+CONFLICT = 2 # another act on the same target won
+NO_MANA = 3
+STATEMENT = 4 # not a spell, see TickResult.true
+OUTCOMES = ('accepted', 'invalid', 'conflict', 'no_mana', 'statement')
+
+
+@dataclass
+class TickResult:
+    outcome: np.ndarray # int8 per act, see OUTCOMES
+    true: np.ndarray # bool per act, whether what the act claims holds in the world at the start of the tick
+    acts: np.ndarray # (n, 4) int32: speaker, verb index into WORLD_VERBS (-1 unknown), agent, patient
+    applied: np.ndarray # indices of the accepted acts in the order they were committed
+
+    @property
+    def accepted(self)->np.ndarray:
+        return self.outcome == ACCEPTED
+
+    def counts(self)->dict:
+        return {name: int(c) for name, c in zip(OUTCOMES, np.bincount(self.outcome, minlength=len(OUTCOMES)))}
+
+
+class Updater:
+    def __init__(self, store: EntityStore, verb_ids: dict = None):
+        self.store = store
+        self.verb_ids = dict(DEFAULT_VERB_IDS if verb_ids is None else verb_ids)
+        # Lexeme id -> index into WORLD_VERBS, a lookup table so the acts convert in one pass
+        size = max(self.verb_ids.values()) + 1
+        self.verb_table = np.full(size, -1, dtype=np.int8)
+        for name, lexeme_id in self.verb_ids.items():
+            self.verb_table[lexeme_id] = WORLD_VERBS.index(name)
+        self.cost = np.array([SPELL_COST[v] for v in WORLD_VERBS], dtype=np.float32)
+        self.exclusive = np.array([EXCLUSIVE[v] for v in WORLD_VERBS])
+        self._pending = [] # (speaker, verb id, agent, patient, spell)
+        self._batches = []
+
+    def submit(self, speaker: int, event: Event, spell: bool = True)->None:
+        """Queues one act for this tick. event.agent and event.patient are store rows."""
+        self._pending.append((speaker, event.verb, event[2 + AGENT], event[2 + PATIENT], spell))
+
+    def submit_many(self, speakers, verbs, agents, patients, spell=True)->None:
+        """Queues a batch of acts given as arrays; spell is one bool or one per act."""
+        speakers = np.asarray(speakers, dtype=np.int32)
+        acts = np.empty((len(speakers), 5), dtype=np.int32)
+        acts[:, 0] = speakers
+        acts[:, 1] = verbs
+        acts[:, 2] = agents
+        acts[:, 3] = patients
+        acts[:, 4] = spell
+        self._batches.append(acts)
+
+    def _collect(self)->np.ndarray:
+        batches = self._batches
+        if self._pending:
+            batches.append(np.array(self._pending, dtype=np.int32).reshape(-1, 5))
+        acts = np.concatenate(batches) if batches else np.zeros((0, 5), dtype=np.int32)
+        self._pending = []
+        self._batches = []
+        return acts
+
+    def _verb_index(self, verb_ids: np.ndarray)->np.ndarray:
+        known = (verb_ids >= 0) & (verb_ids < len(self.verb_table))
+        verbs = np.full(len(verb_ids), -1, dtype=np.int8)
+        verbs[known] = self.verb_table[verb_ids[known]]
+        return verbs
+
+    def _resolve(self, candidates, agent, verb, patient)->tuple[np.ndarray, np.ndarray]:
+        # Per target the best verb wins, then the best caster for exclusive verbs. Returns (winners, losers).
+        power = self.store.columns['power'][agent[candidates]]
+        rank = self.store.columns['rank'][agent[candidates]]
+        v, p = verb[candidates], patient[candidates]
+        order = np.lexsort((agent[candidates], rank, -power, v, p))
+        p_sorted, v_sorted = p[order], v[order]
+        first_of_target = np.diff(p_sorted, prepend=-1) != 0
+        top_verb = np.repeat(v_sorted[first_of_target], np.diff(np.r_[np.flatnonzero(first_of_target), len(order)]))
+        wins = v_sorted == top_verb
+        wins &= first_of_target | ~self.exclusive[v_sorted]
+        return candidates[order[wins]], candidates[order[~wins]]
+
+    def _by_caster(self, acts, agent, verb, patient)->np.ndarray:
+        # acts sorted by caster, then verb, then target: one packed key instead of a lexsort (rows fit in 31 bits)
+        key = (agent[acts].astype(np.uint64) << np.uint64(33)) | (verb[acts].astype(np.uint64) << np.uint64(31)) \
+              | patient[acts].astype(np.uint64)
+        return acts[np.argsort(key, kind='stable')]
+
+    def _pay(self, winners, agent, verb, patient, mana)->tuple[np.ndarray, np.ndarray]:
+        # Each caster pays for their spells in priority order, then by target row, skipping any that no
+        # longer fit in what's left. Returns (paid in commit order, refused).
+        winners = self._by_caster(winners, agent, verb, patient)
+        caster, cost = agent[winners], self.cost[verb[winners]]
+        group_start = np.flatnonzero(np.diff(caster, prepend=-1) != 0)
+        spells = np.diff(np.r_[group_start, len(winners)])
+        budget = mana[caster[group_start]].astype(np.float64) + 1e-6
+        # Most casters can pay for everything; only the rest are paid for one spell at a time
+        total = np.add.reduceat(cost.astype(np.float64), group_start) if len(winners) else budget
+        paid = np.repeat(total <= budget, spells)
+        short = np.flatnonzero(total > budget)
+        left = budget[short]
+        for k in range(spells[short].max(initial=0)):
+            has = spells[short] > k
+            i = group_start[short[has]] + k
+            fits = cost[i] <= left[has]
+            paid[i] = fits
+            left[has] -= np.where(fits, cost[i], 0.0)
+        return winners[paid], winners[~paid]
+
+    def tick(self)->TickResult:
+        store = self.store
+        acts = self._collect()
+        speaker, agent, patient = acts[:, 0], acts[:, 2], acts[:, 3]
+        spell = acts[:, 4] != 0
+        verb = self._verb_index(acts[:, 1])
+        n = len(acts)
+        outcome = np.full(n, INVALID, dtype=np.int8)
+        outcome[~spell] = STATEMENT
+
+        # 1. Validate against the world at the start of the tick
+        in_world = (agent >= 0) & (agent < len(store)) & (patient >= 0) & (patient < len(store)) & (verb >= 0)
+        flags = np.zeros(n, dtype=np.uint8)
+        target_flags = np.zeros(n, dtype=np.uint8)
+        flags[in_world] = store.flags[agent[in_world]]
+        target_flags[in_world] = store.flags[patient[in_world]]
+        able = (flags & (ALIVE | CONSCIOUS)) == (ALIVE | CONSCIOUS)
+        target_alive = (target_flags & ALIVE) != 0
+        target_conscious = (target_flags & CONSCIOUS) != 0
+        kill, stun, wake, heal = (verb == WORLD_VERBS.index(v) for v in WORLD_VERBS)
+        possible = in_world & able & (
+            (kill & target_alive)
+            | (stun & target_alive & target_conscious)
+            | (wake & target_alive & ~target_conscious)
+            | (heal & target_alive))
+        # A statement says the verb happened; it's true if the patient is in the state the verb leaves
+        true = in_world & (
+            (kill & ~target_alive)
+            | (stun & ~target_conscious)
+            | (wake & target_conscious)
+            | (heal & target_alive))
+
+        mana = store.columns['mana']
+        candidates = np.flatnonzero(spell & possible)
+        # A spell that costs more than all the caster's mana can't be paid for, so it can't win a target either
+        in_reach = self.cost[verb[candidates]] <= mana[agent[candidates]] + 1e-6
+        outcome[candidates[~in_reach]] = NO_MANA
+        candidates = candidates[in_reach]
+        # 2-3. Conflicts, then payment. Winners their casters can't pay for are refused, and their targets
+        # go to the next best of the remaining spells on them, which only their casters pay for again.
+        winners, _ = self._resolve(candidates, agent, verb, patient)
+        paid, refused = self._pay(winners, agent, verb, patient, mana)
+        live = np.zeros(n, dtype=bool)
+        live[candidates] = True
+        rounds = 0
+        while len(refused):
+            rounds += 1
+            outcome[refused] = NO_MANA
+            live[refused] = False
+            freed = np.zeros(len(store), dtype=bool)
+            freed[patient[refused]] = True
+            candidates = np.flatnonzero(live)
+            promoted, _ = self._resolve(candidates[freed[patient[candidates]]], agent, verb, patient)
+            winners = np.concatenate((winners[~freed[patient[winners]]], promoted))
+            repay = np.zeros(len(store), dtype=bool)
+            repay[agent[promoted]] = True
+            newly_paid, refused = self._pay(winners[repay[agent[winners]]], agent, verb, patient, mana)
+            paid = np.concatenate((paid[~repay[agent[paid]]], newly_paid))
+        outcome[live] = CONFLICT
+        if rounds:
+            # Commit order follows the world, not submission order
+            paid = self._by_caster(paid, agent, verb, patient)
+        accepted = paid
+        outcome[accepted] = ACCEPTED
+
+        # 4. Commit everything at once
+        v_acc, p_acc, a_acc = verb[accepted], patient[accepted], agent[accepted]
+        np.subtract.at(store.columns['mana'], a_acc, self.cost[v_acc])
+        store.die(p_acc[v_acc == WORLD_VERBS.index('kill')])
+        store.pass_out(p_acc[v_acc == WORLD_VERBS.index('stun')])
+        store.wake_up(p_acc[v_acc == WORLD_VERBS.index('wake')])
+        healed = v_acc == WORLD_VERBS.index('heal')
+        health = store.columns['health']
+        np.add.at(health, p_acc[healed], HEAL_PER_POWER * store.columns['power'][a_acc[healed]])
+        targets = np.unique(p_acc[healed])
+        health[targets] = np.minimum(health[targets], store.columns['vitality'][targets])
+
+        return TickResult(outcome=outcome, true=true, acts=np.column_stack((speaker, verb.astype(np.int32), agent, patient)),
+                          applied=accepted)
+
+
+def battle_store(count: int, seed=123)->EntityStore:
+    rng = np.random.default_rng(seed)
+    store = EntityStore(count)
+    store.spawn('wizard', count, health=1.0, vitality=1.0, mana=rng.random(count).astype(np.float32),
+                power=rng.random(count).astype(np.float32), rank=rng.permutation(count) + 1)
+    # Battle wizards can fall, unlike the immortal ones in action_classes
+    store.set_flag(None, entity_store.MORTAL, True)
+    return store
+
+
+def random_acts(store: EntityStore, count: int, verb_ids: dict = None, statement_share=0.3, seed=123):
+    rng = np.random.default_rng(seed)
+    ids = np.array([(verb_ids or DEFAULT_VERB_IDS)[v] for v in WORLD_VERBS])
+    speakers = rng.integers(0, len(store), count)
+    verbs = ids[rng.choice(len(ids), count, p=[0.3, 0.2, 0.1, 0.4])]
+    patients = rng.integers(0, len(store), count)
+    spell = rng.random(count) >= statement_share
+    return speakers, verbs, speakers, patients, spell
+
+
+def benchmark_updater(acts_per_tick=(1000, 10000, 100000), wizards=100000, seed=123)->list[dict]:
+    results = []
+    for count in acts_per_tick:
+        store = battle_store(wizards, seed)
+        updater = Updater(store)
+        acts = random_acts(store, count, seed=seed)
+        updater.submit_many(*acts)
+        started = time.perf_counter()
+        result = updater.tick()
+        seconds = time.perf_counter() - started
+
+        # Same acts submitted in another order: same world afterwards
+        other = battle_store(wizards, seed)
+        shuffled = Updater(other)
+        order = np.random.default_rng(seed + 1).permutation(count)
+        shuffled.submit_many(*(a[order] for a in acts))
+        shuffled_result = shuffled.tick()
+        assert all(np.array_equal(store.columns[c][:len(store)], other.columns[c][:len(other)]) for c in store.columns)
+        assert np.array_equal(store.flags, other.flags)
+        assert np.array_equal(result.outcome[order], shuffled_result.outcome)
+
+        counts = result.counts()
+        results.append({'acts': count, 'seconds': seconds, **counts})
+        print(f"{count:,} acts over {wizards:,} wizards: tick {seconds * 1000:.1f} ms ({seconds / count * 1e6:.2f} us/act),",
+              ', '.join(f"{k} {v}" for k, v in counts.items()))
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_updater()